@@ -1,12 +1,46 @@
-from abc import ABC, abstractmethod
-from typing import Any, Dict
+from abc import ABC
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+from app.core.llm import get_chat_model
+from app.core.telemetry import span
+from app.services.admission import chat_gate
+from app.services.context_packer import context_packer
+from app.services.summaries import document_summarizer
 
 class BaseAgent(ABC):
-    def __init__(self, name: str, description: str):
-        self.name = name
-        self.description = description
+    """
+    Subclasses set `name` and `description` as class attributes and
+    `self.prompt` (a PromptTemplate over "context" and "query"); `run` and
+    `stream` answer with it and `self.llm`, a chat model shared through the
+    client pool and created on first use (assign `llm` to override it).
+    """
+
+    name: str = ""
+    description: str = ""
+    model = "gemini-1.5-pro"
+    temperature = 0.7
+    # Chunks the agent grounds its answer in; the orchestrator prefetches the largest k any agent needs.
+    retrieval_k = 4
+    # Prompt token budget for those chunks once packed (None = CONTEXT_TOKEN_BUDGET).
+    context_budget: Optional[int] = None
+    # Put the precomputed summaries of the papers the chunks come from above the chunks.
+    use_summaries = False
+    # Sections the agent searches (e.g. ("Method",)); papers with no chunk there are searched whole.
+    retrieval_sections: Optional[Tuple[str, ...]] = None
+
+    def __init__(self, name: str = None, description: str = None):
+        self.name = name or type(self).name
+        self.description = description or type(self).description
+        self._llm = None
+
+    @property
+    def llm(self):
+        return self._llm if self._llm is not None else get_chat_model(self.model, self.temperature)
+
+    @llm.setter
+    def llm(self, llm):
+        self._llm = llm
 
-    @abstractmethod
     async def run(self, query: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
         """
         Execute the agent's logic.
@@ -14,4 +48,156 @@ class BaseAgent(ABC):
         :param context: Additional context (e.g., file paths, history).
         :return: A dictionary containing the result.
         """
-        pass
+        docs = self._documents(query, context)
+        with span("prompt"):
+            docs, packing = self.pack(docs)
+            inputs = self.prompt_inputs(query, docs)
+        chain = self.prompt | self.llm
+        async with chat_gate:
+            with span("generate"):
+                response = await chain.ainvoke(inputs)
+        return self.result(docs, response.content, packing)
+
+    async def stream(self, query: str, context: Dict[str, Any] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Streaming variant of `run`. Yields ("sources", [...]) once the chunks are
+        retrieved, ("token", text) for each piece of the answer as the LLM
+        produces it, and finally ("done", result) with the dict `run` returns.
+        """
+        docs = self._documents(query, context)
+        with span("prompt"):
+            docs, packing = self.pack(docs)
+            inputs = self.prompt_inputs(query, docs)
+        yield "sources", self.sources(docs)
+        chain = self.prompt | self.llm
+        parts = []
+        async with chat_gate:
+            with span("generate"):
+                async for chunk in chain.astream(inputs):
+                    if chunk.content:
+                        parts.append(chunk.content)
+                        yield "token", chunk.content
+        yield "done", self.result(docs, "".join(parts), packing)
+
+    def retrieve(self, query: str, context: Dict[str, Any] = None) -> List[Document]:
+        """
+        Retrieves the chunks to ground the answer in.
+        :param context: May carry "documents" already retrieved for this query (best first,
+            at least `retrieval_k` deep), used instead of searching again, and the
+            search options of `retrieve_documents`.
+        """
+        context = context or {}
+        if self.retrieval_sections and not context.get("sections"):
+            return self._retrieve_sections(query, context)
+        if context.get("documents") is not None:
+            return context["documents"][:self.retrieval_k]
+        return retrieve_documents(query, self.retrieval_k, context)
+
+    def _documents(self, query: str, context: Dict[str, Any] = None) -> List[Document]:
+        """
+        The chunks `run` and `stream` answer from: context["documents"] when the
+        orchestrator already ran `retrieve` for this agent (context["retrieved_for"]),
+        else `retrieve`.
+        """
+        if context and context.get("retrieved_for") == self.name and context.get("documents") is not None:
+            return context["documents"][:self.retrieval_k]
+        return self.retrieve(query, context)
+
+    def _retrieve_sections(self, query: str, context: Dict[str, Any]) -> List[Document]:
+        """
+        Chunks from `retrieval_sections`: those among the documents already
+        retrieved if there are enough, else a search restricted to the sections,
+        else (no chunk in them) the unrestricted results.
+        """
+        shared = context.get("documents")
+        if shared is not None:
+            docs = [d for d in shared if d.metadata.get("section") in self.retrieval_sections]
+            if len(docs) >= self.retrieval_k:
+                return docs[:self.retrieval_k]
+        docs = retrieve_documents(query, self.retrieval_k, dict(context, sections=list(self.retrieval_sections)))
+        if docs:
+            return docs
+        if shared is not None:
+            return shared[:self.retrieval_k]
+        return retrieve_documents(query, self.retrieval_k, context)
+
+    def pack(self, docs: List[Document]) -> Tuple[List[Document], Dict[str, int]]:
+        """Merges, dedupes and trims the retrieved chunks to the agent's token budget; returns (passages, stats)."""
+        return context_packer.pack(docs, budget_tokens=self.context_budget)
+
+    def prompt_inputs(self, query: str, docs: List[Document]) -> Dict[str, str]:
+        passages = [d.page_content for d in docs]
+        if self.use_summaries:
+            passages = document_summarizer.context(docs) + passages
+        return {"context": "\n\n".join(passages), "query": query}
+
+    @staticmethod
+    def sources(docs: List[Document]) -> List[str]:
+        return [d.metadata.get("source") for d in docs]
+
+    def result(self, docs: List[Document], response: str, packing: Dict[str, int] = None) -> Dict[str, Any]:
+        result = {
+            "agent": self.name,
+            "response": response,
+            "sources": self.sources(docs)
+        }
+        if packing is not None:
+            result["context_stats"] = packing
+        return result
+
+
+def retrieve_documents(query: str, k: int, context: Dict[str, Any], rag=None) -> List[Document]:
+    """
+    Searches the shared RAGService as the request asks.
+    :param context: May carry "retrieval_mode" ("vector", "lexical" or "hybrid"),
+        "doc_ids" to search only those documents, "per_document" to spread
+        the k chunks evenly over them (`RAGService.search_per_document`), and
+        "sections" to search only chunks in those sections (e.g. ["Method"]).
+    """
+    with span("retrieve"):
+        return _retrieve_documents(query, k, context, rag)
+
+
+def _retrieve_documents(query: str, k: int, context: Dict[str, Any], rag=None) -> List[Document]:
+    if rag is None:
+        from app.services.rag import get_rag_service
+
+        rag = get_rag_service()
+    doc_ids = context.get("doc_ids")
+    if doc_ids is not None and not doc_ids:
+        return []
+    if doc_ids is not None and context.get("per_document"):
+        return rag.search_per_document(
+            query, doc_ids, k=k, mode=context.get("retrieval_mode"), where=_where(context, doc_ids=False)
+        )
+    where = _where(context)
+    if where is None:
+        return rag.similarity_search(query, k=k, mode=context.get("retrieval_mode"))
+    return rag.similarity_search(query, k=k, where=where, mode=context.get("retrieval_mode"))
+
+
+def _where(context: Dict[str, Any], doc_ids: bool = True):
+    """The metadata filter for the request's "doc_ids" (unless doc_ids=False) and "sections"."""
+    where = {}
+    if doc_ids and context.get("doc_ids") is not None:
+        where["doc_id"] = list(context["doc_ids"])
+    if context.get("sections"):
+        where["section"] = list(context["sections"])
+    return where or None
+
+
+def retrieve_documents_many(queries: List[str], k: int, context: Dict[str, Any], rag=None) -> List[List[Document]]:
+    """
+    `retrieve_documents` for a batch of queries sharing one context: the queries
+    are embedded in one call and searched in one pass (per-document retrieval
+    still searches query by query). Returns one result list per query.
+    """
+    with span("retrieve"):
+        if rag is None:
+            from app.services.rag import get_rag_service
+
+            rag = get_rag_service()
+        doc_ids = context.get("doc_ids")
+        if doc_ids is not None and (not doc_ids or context.get("per_document")):
+            return [_retrieve_documents(query, k, context, rag) for query in queries]
+        return rag.similarity_search_many(queries, k=k, where=_where(context), mode=context.get("retrieval_mode"))
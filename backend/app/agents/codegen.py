@@ -1,27 +1,14 @@
-from typing import Any, Dict
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
 from app.agents.base import BaseAgent
-from app.services.rag import rag_service
-from app.core.config import settings
 
 class CodeGeneratorAgent(BaseAgent):
-    def __init__(self):
-        super().__init__(
-            name="Code Generator",
-            description="Generates Python code for EDA, ML models, and data processing."
-        )
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-pro",
-            google_api_key=settings.GOOGLE_API_KEY,
-            temperature=0.7
-        )
+    name = "Code Generator"
+    description = "Generates Python code for EDA, ML models, and data processing."
+    retrieval_sections = ("Method",)
 
-    async def run(self, query: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
-        docs = rag_service.similarity_search(query)
-        context_text = "\n\n".join([d.page_content for d in docs])
-
-        prompt = PromptTemplate(
+    def __init__(self):
+        super().__init__()
+        self.prompt = PromptTemplate(
             input_variables=["context", "query"],
             template="""
             You are an expert Machine Learning Engineer. Generate Python code based on the research paper's methodology or the user's request.
@@ -38,12 +25,3 @@ class CodeGeneratorAgent(BaseAgent):
             - Use standard libraries (pandas, numpy, sklearn, matplotlib, torch/tensorflow).
             """
         )
-        
-        chain = prompt | self.llm
-        response = await chain.ainvoke({"context": context_text, "query": query})
-        
-        return {
-            "agent": self.name,
-            "response": response.content,
-            "sources": [d.metadata.get("source") for d in docs]
-        }
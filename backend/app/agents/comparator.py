@@ -1,28 +1,24 @@
-from typing import Any, Dict
-from langchain_google_genai import ChatGoogleGenerativeAI
+import math
+from collections import Counter
+from typing import Any, Dict, List
+from langchain_core.documents import Document
 from langchain_core.prompts import PromptTemplate
-from app.agents.base import BaseAgent
-from app.services.rag import rag_service
-from app.core.config import settings
+from app.agents.base import BaseAgent, _where
+from app.services.documents import document_registry
 
 class PaperComparisonAgent(BaseAgent):
-    def __init__(self):
-        super().__init__(
-            name="Paper Comparator",
-            description="Compares multiple papers on methodology, results, and metrics."
-        )
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-pro",
-            google_api_key=settings.GOOGLE_API_KEY,
-            temperature=0.7
-        )
+    name = "Paper Comparator"
+    description = "Compares multiple papers on methodology, results, and metrics."
 
-    async def run(self, query: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
-        # For comparison, we might need to retrieve more documents or specific ones
-        docs = rag_service.similarity_search(query, k=6) 
-        context_text = "\n\n".join([d.page_content for d in docs])
+    # For comparison, we need chunks from more than one paper
+    retrieval_k = 6
+    context_budget = 3000
+    # Papers compared when the request names none: those the top-ranked chunks come from.
+    max_papers = 3
 
-        prompt = PromptTemplate(
+    def __init__(self):
+        super().__init__()
+        self.prompt = PromptTemplate(
             input_variables=["context", "query"],
             template="""
             You are a meticulous reviewer. Compare the research papers discussed in the context.
@@ -41,12 +37,43 @@ class PaperComparisonAgent(BaseAgent):
             Provide a comparison table (Markdown) and a narrative summary.
             """
         )
-        
-        chain = prompt | self.llm
-        response = await chain.ainvoke({"context": context_text, "query": query})
-        
-        return {
-            "agent": self.name,
-            "response": response.content,
-            "sources": [d.metadata.get("source") for d in docs]
-        }
+
+    def retrieve(self, query: str, context: Dict[str, Any] = None) -> List[Document]:
+        """
+        Gives every paper being compared an equal share of the chunks, so one
+        verbose paper cannot crowd out the others.
+        """
+        context = context or {}
+        doc_ids = self.papers(query, context)
+        if len(doc_ids) < 2:
+            return super().retrieve(query, context)
+        docs = (context.get("documents") or [])[:self.retrieval_k]
+        if _balanced(docs, doc_ids, self.retrieval_k):
+            return docs
+        from app.services.rag import get_rag_service
+
+        return get_rag_service().search_per_document(
+            query, doc_ids, k=self.retrieval_k, mode=context.get("retrieval_mode"), where=_where(context, doc_ids=False)
+        )
+
+    def papers(self, query: str, context: Dict[str, Any]) -> List[str]:
+        """
+        Ids of the papers to compare: the documents the request is filtered to,
+        else the ones named in the query, else those of the top-ranked chunks.
+        """
+        ranked = [d.metadata.get("doc_id") for d in context.get("documents") or []]
+        if context.get("doc_ids") is not None:
+            # Papers with relevant chunks first, in case there are more than slots.
+            allowed = set(context["doc_ids"])
+            ordered = [i for i in ranked if i in allowed] + list(context["doc_ids"])
+            return list(dict.fromkeys(ordered))[:self.retrieval_k]
+        named = [document["id"] for document in document_registry.named_in(query)]
+        if len(named) >= 2:
+            return named[:self.retrieval_k]
+        return list(dict.fromkeys(i for i in ranked if i))[:self.max_papers]
+
+
+def _balanced(docs: List[Document], doc_ids: List[str], k: int) -> bool:
+    """Whether the chunks cover exactly these documents, none with more than its share of k."""
+    counts = Counter(d.metadata.get("doc_id") for d in docs)
+    return set(counts) == set(doc_ids) and max(counts.values()) <= math.ceil(k / len(doc_ids))
@@ -1,27 +1,14 @@
-from typing import Any, Dict
-from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
 from app.agents.base import BaseAgent
-from app.services.rag import rag_service
-from app.core.config import settings
 
 class DashboardPlannerAgent(BaseAgent):
-    def __init__(self):
-        super().__init__(
-            name="Dashboard Planner",
-            description="Suggests KPIs, charts, and layout for visualizing research data."
-        )
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-pro",
-            google_api_key=settings.GOOGLE_API_KEY,
-            temperature=0.7
-        )
+    name = "Dashboard Planner"
+    description = "Suggests KPIs, charts, and layout for visualizing research data."
+    retrieval_sections = ("Experiments", "Results")
 
-    async def run(self, query: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
-        docs = rag_service.similarity_search(query)
-        context_text = "\n\n".join([d.page_content for d in docs])
-
-        prompt = PromptTemplate(
+    def __init__(self):
+        super().__init__()
+        self.prompt = PromptTemplate(
             input_variables=["context", "query"],
             template="""
             You are a Data Visualization Expert. Plan a dashboard to visualize the findings or data from the research paper.
@@ -39,12 +26,3 @@ class DashboardPlannerAgent(BaseAgent):
             4. Titles and Descriptions
             """
         )
-        
-        chain = prompt | self.llm
-        response = await chain.ainvoke({"context": context_text, "query": query})
-        
-        return {
-            "agent": self.name,
-            "response": response.content,
-            "sources": [d.metadata.get("source") for d in docs]
-        }
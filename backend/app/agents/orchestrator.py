@@ -1,10 +1,23 @@
-from typing import Any, Dict
-from langchain_google_genai import ChatGoogleGenerativeAI
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections.abc import Mapping
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple, Type
 from langchain_core.prompts import PromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
 
 from app.core.config import settings
+from app.core.llm import get_chat_model
+from app.core.telemetry import metrics, span
+from app.services.admission import Overloaded, chat_gate, query_flight
+from app.services.answer_cache import answer_cache
+from app.services.documents import document_registry
+from app.services.summaries import SUMMARY_REQUEST, document_summarizer
+from app.agents.router import local_router
+from app.agents.base import BaseAgent, retrieve_documents, retrieve_documents_many
 from app.agents.analyzer import PaperAnalyzerAgent
 from app.agents.insight import InsightGeneratorAgent
 from app.agents.comparator import PaperComparisonAgent
@@ -12,29 +25,105 @@ from app.agents.codegen import CodeGeneratorAgent
 from app.agents.dashboard import DashboardPlannerAgent
 from app.agents.writer import DocumentationWriterAgent
 
+logger = logging.getLogger(__name__)
+
+AGENT_CLASSES: List[Type[BaseAgent]] = [
+    PaperAnalyzerAgent,
+    InsightGeneratorAgent,
+    PaperComparisonAgent,
+    CodeGeneratorAgent,
+    DashboardPlannerAgent,
+    DocumentationWriterAgent,
+]
+
 class AgentSelection(BaseModel):
     agent_name: str = Field(description="The name of the agent to select.")
     reason: str = Field(description="The reason for selecting this agent.")
 
+class LazyAgents(Mapping):
+    """
+    Agent name -> agent, constructing each agent the first time it is looked
+    up. Names, descriptions and retrieval depths come from the classes, so
+    routing and retrieval never build an agent that is not used.
+    """
+
+    def __init__(self, classes: List[Type[BaseAgent]]):
+        self.classes = {cls.name: cls for cls in classes}
+        self._instances: Dict[str, BaseAgent] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> BaseAgent:
+        agent = self._instances.get(name)
+        if agent is None:
+            cls = self.classes[name]
+            with self._lock:
+                agent = self._instances.get(name)
+                if agent is None:
+                    agent = self._instances[name] = cls()
+        return agent
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.classes)
+
+    def __len__(self) -> int:
+        return len(self.classes)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self.classes
+
+    def descriptions(self) -> Dict[str, str]:
+        return {name: cls.description for name, cls in self.classes.items()}
+
+    def max_retrieval_k(self) -> int:
+        return max(cls.retrieval_k for cls in self.classes.values())
+
+    def loaded(self) -> List[str]:
+        """Names of the agents constructed so far."""
+        return list(self._instances)
+
 class OrchestratorAgent:
+    model = "gemini-1.5-pro"
+    temperature = 0.3
+
     def __init__(self):
-        self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-pro",
-            google_api_key=settings.GOOGLE_API_KEY,
-            temperature=0.3
-        )
-        self.agents = {
-            "Paper Analyzer": PaperAnalyzerAgent(),
-            "Insight Generator": InsightGeneratorAgent(),
-            "Paper Comparator": PaperComparisonAgent(),
-            "Code Generator": CodeGeneratorAgent(),
-            "Dashboard Planner": DashboardPlannerAgent(),
-            "Documentation Writer": DocumentationWriterAgent(),
-        }
+        self._llm = None
+        self.agents = LazyAgents(AGENT_CLASSES)
         self.parser = PydanticOutputParser(pydantic_object=AgentSelection)
+        self.router = local_router
+        self.router.fit(self.agents.descriptions())
+        self.answer_cache = answer_cache
+
+    @property
+    def llm(self):
+        return self._llm if self._llm is not None else get_chat_model(self.model, self.temperature)
+
+    @llm.setter
+    def llm(self, llm):
+        self._llm = llm
+
+    @property
+    def rag(self):
+        """The shared RAGService; built on first use, when it also starts feeding the answer cache."""
+        from app.services.rag import get_rag_service
+
+        rag_service = get_rag_service()
+        if self.answer_cache.invalidate_document not in rag_service.change_listeners:
+            rag_service.change_listeners.append(self.answer_cache.invalidate_document)
+        return rag_service
 
     async def route_query(self, query: str) -> str:
-        agent_descriptions = "\n".join([f"- {name}: {agent.description}" for name, agent in self.agents.items()])
+        with span("route"):
+            return await self._route(query)
+
+    async def _route(self, query: str) -> str:
+        # Obvious requests are routed locally; the LLM only decides when the local router is unsure.
+        local = settings.ROUTING_MODE == "local"
+        if local:
+            agent_name = self.router.route(query)
+            if agent_name in self.agents:
+                return agent_name
+
+        agent_descriptions = "\n".join([f"- {name}: {description}" for name, description in self.agents.descriptions().items()])
         
         prompt = PromptTemplate(
             input_variables=["query", "agent_descriptions"],
@@ -54,41 +143,449 @@ class OrchestratorAgent:
         )
         
         chain = prompt | self.llm | self.parser
+        start = time.perf_counter()
         try:
-            selection = await chain.ainvoke({"query": query, "agent_descriptions": agent_descriptions})
-            return selection.agent_name
+            async with chat_gate:
+                selection = await chain.ainvoke({"query": query, "agent_descriptions": agent_descriptions})
+            agent_name = selection.agent_name
         except Exception as e:
-            print(f"Routing error: {e}. Defaulting to Paper Analyzer.")
-            return "Paper Analyzer"
+            logger.warning("Routing error: %s. Defaulting to Paper Analyzer.", e)
+            agent_name = None
+        if local:
+            known = agent_name if agent_name in self.agents else None
+            self.router.record_llm(query, known, time.perf_counter() - start)
+        return agent_name or "Paper Analyzer"
+
+    async def _retrieve(self, query: str, context: Dict[str, Any]):
+        k = self.agents.max_retrieval_k()
+        return await asyncio.to_thread(retrieve_documents, query, k, context, self.rag)
+
+    def _query_vector(self, query: str, context: Dict[str, Any]) -> Optional[List[float]]:
+        """Query embedding for the answer cache; already cached locally unless retrieval was lexical-only."""
+        if (context.get("retrieval_mode") or settings.RETRIEVAL_MODE) == "lexical":
+            return None
+        try:
+            return self.rag.embeddings.embed_query(query)
+        except Exception as e:
+            logger.warning("Answer cache falls back to exact query matching: %s", e)
+            return None
+
+    async def _prepare(
+        self, query: str, context: Dict[str, Any], timings: Dict[str, float], agent_name: str = None
+    ):
+        """
+        Routes and retrieves concurrently, then checks the answer cache.
+        Returns (agent, cache key, cached answer or None); fills in context["documents"],
+        and context["doc_ids"] when the request has "filters" (see DocumentRegistry.find).
+        Documents already in the context (retrieved for a whole batch) are only routed for,
+        and a query already routed to `agent_name` (see `_precomputed`) is only retrieved for.
+        """
+        await self._resolve_filters(context)
+        if context.get("documents") is not None:
+            if agent_name is None:
+                agent_name = await _timed(timings, "routing", self.route_query(query))
+        elif agent_name is not None:
+            try:
+                context["documents"] = await _timed(timings, "retrieval", self._retrieve(query, context))
+            except Exception as e:
+                # The agent retrieves on its own (and reports the error) instead.
+                logger.warning("Shared retrieval failed: %s", e)
+        else:
+            # 1. Route, and speculatively retrieve for whichever agent is picked:
+            #    every agent searches the same query, so retrieval need not wait for routing.
+            start = time.perf_counter()
+            agent_name, documents = await asyncio.gather(
+                _timed(timings, "routing", self.route_query(query)),
+                _timed(timings, "retrieval", self._retrieve(query, context)),
+                return_exceptions=True,
+            )
+            parallel_ms = (time.perf_counter() - start) * 1000
+            timings["saved_ms"] = round(max(0.0, timings["routing_ms"] + timings["retrieval_ms"] - parallel_ms), 1)
+            if isinstance(agent_name, BaseException):
+                raise agent_name
+            if isinstance(documents, BaseException):
+                # The agent retrieves on its own (and reports the error) instead.
+                logger.warning("Speculative retrieval failed: %s", documents)
+            else:
+                context["documents"] = documents
 
-    async def process_query(self, query: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
-        # 1. Route
-        agent_name = await self.route_query(query)
-        
         # 2. Select Agent
         agent = self.agents.get(agent_name)
         if not agent:
             agent = self.agents["Paper Analyzer"] # Fallback
-            
-        # 3. Execute
+
+        # 3. Reuse the answer to the same (or a near-identical) query over the same chunks
+        cache_key, cached = await self._lookup(agent, query, context)
+        return agent, cache_key, cached
+
+    async def _precomputed(
+        self, query: str, context: Dict[str, Any], timings: Dict[str, float]
+    ) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        The stored summary, when the request is a plain summary request about one
+        document that the Paper Analyzer would answer (see DocumentSummarizer.answer).
+        "bypass_cache" asks for a generated answer instead. Returns (stored answer
+        or None, the agent the query was routed to or None): a query is only routed
+        here when a summary is stored, and `_prepare` reuses the decision.
+        """
+        if context.get("bypass_cache") or not SUMMARY_REQUEST.search(query):
+            return None, None
+        await self._resolve_filters(context)
+        answer = await asyncio.to_thread(document_summarizer.answer, query, context.get("doc_ids"))
+        if answer is None:
+            return None, None
+        agent_name = await _timed(timings, "routing", self.route_query(query))
+        return (answer if agent_name == "Paper Analyzer" else None), agent_name
+
+    async def _resolve_filters(self, context: Dict[str, Any]):
+        if context.get("filters") and "doc_ids" not in context:
+            matching = await asyncio.to_thread(document_registry.find, **context["filters"])
+            context["doc_ids"] = [document["id"] for document in matching]
+
+    async def _lookup(self, agent: BaseAgent, query: str, context: Dict[str, Any]):
+        """Returns (cache key, cached answer or None) for the agent's chunks in context["documents"]."""
+        if "documents" not in context:
+            return None, None
+        # The agent may search again (the comparator spreads chunks over papers);
+        # its `run` then answers from these chunks instead of searching once more.
         try:
-            result = await agent.run(query, context)
-            return result
+            context["documents"] = await asyncio.to_thread(agent.retrieve, query, context)
+            context["retrieved_for"] = agent.name
         except Exception as e:
-            error_msg = str(e)
-            if "429" in error_msg or "quota" in error_msg.lower():
-                print(f"Quota exceeded during agent execution: {e}")
-                return {
-                    "answer": "I apologize, but I've hit the usage limits for the Google Gemini API (Free Tier). Please try again in a minute or check your quota.",
-                    "agent": agent_name,
-                    "status": "error_quota_exceeded"
-                }
-            else:
-                print(f"Error during agent execution: {e}")
-                return {
-                    "answer": f"I encountered an error while processing your request: {str(e)}",
-                    "agent": agent_name,
-                    "status": "error"
+            logger.warning("%s retrieval failed, using the shared results: %s", agent.name, e)
+        docs = context["documents"][:agent.retrieval_k]
+        vector = await asyncio.to_thread(self._query_vector, query, context)
+        cache_key = (agent.name, query, vector, [d.id for d in docs])
+        cached = None if context.get("bypass_cache") else self.answer_cache.get(*cache_key)
+        return cache_key, cached
+
+    def plan(self, query: str) -> List[Tuple[BaseAgent, str]]:
+        """
+        (agent, task) pairs for a compound request that asks several agents for
+        something (see LocalRouter.split); [] when one agent should answer.
+        """
+        if settings.FANOUT_MAX_AGENTS < 2:
+            return []
+        steps = [
+            (self.agents[name], task)
+            for name, task in self.router.split(query, settings.FANOUT_MAX_AGENTS)
+            if name in self.agents
+        ]
+        return steps if len(steps) > 1 else []
+
+    async def _fan_out_start(self, query: str, context: Dict[str, Any], timings: Dict[str, float]):
+        """One retrieval pass shared by every agent of a compound request."""
+        await self._resolve_filters(context)
+        if context.get("documents") is not None:
+            return
+        try:
+            context["documents"] = await _timed(timings, "retrieval", self._retrieve(query, context))
+        except Exception as e:
+            # Each agent retrieves on its own (and reports the error) instead.
+            logger.warning("Shared retrieval failed: %s", e)
+
+    async def _run_part(self, agent: BaseAgent, task: str, query: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Answers one task of the compound request `query`, within AGENT_TIMEOUT;
+        failures become error parts. The agent is asked the whole request with
+        its task (see `part_request`); the task alone labels the part.
+        """
+        context = dict(context)
+        start = time.perf_counter()
+        request = part_request(query, task)
+        cache_key, cached = await self._lookup(agent, request, context)
+        if cached is not None:
+            result, is_cached = cached, True
+        else:
+            is_cached = False
+            try:
+                result = await asyncio.wait_for(agent.run(request, context), timeout=settings.AGENT_TIMEOUT)
+                self._remember(agent, cache_key, context, result)
+            except asyncio.TimeoutError:
+                logger.warning("%s timed out after %gs", agent.name, settings.AGENT_TIMEOUT)
+                result = {
+                    "answer": f"{agent.name} did not answer within {settings.AGENT_TIMEOUT:g} seconds.",
+                    "agent": agent.name,
+                    "status": "error_timeout",
                 }
+            except Exception as e:
+                result = _error_result(agent.name, e)
+        elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+        return {**result, "task": task, "cached": is_cached, "elapsed_ms": elapsed_ms}
+
+    async def _fan_out(
+        self, query: str, plan: List[Tuple[BaseAgent, str]], context: Dict[str, Any]
+    ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """Runs every part of `query` concurrently; yields (index in plan, part) as each finishes."""
+        async def indexed(i: int, agent: BaseAgent, task: str):
+            return i, await self._run_part(agent, task, query, context)
+
+        tasks = [asyncio.ensure_future(indexed(i, agent, task)) for i, (agent, task) in enumerate(plan)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _remember(self, agent, cache_key, context: Dict[str, Any], result: Dict[str, Any]):
+        if cache_key is not None:
+            docs = context["documents"][:agent.retrieval_k]
+            doc_ids = {d.metadata.get("doc_id") for d in docs} - {None}
+            self.answer_cache.put(*cache_key, doc_ids, result)
+
+    async def process_query(self, query: str, context: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        :param context: Optional "retrieval_mode", "filters" (keyword arguments of
+            DocumentRegistry.find) with "per_document" to spread chunks over the
+            matching documents, and "bypass_cache" to skip the answer cache lookup
+            (the fresh answer still replaces the cached one).
+
+        A compound request (see `plan`) is answered by several agents at once;
+        the result is then merged as described in `merge_parts`.
+
+        Identical requests (same query and context) that arrive while one is
+        being answered share its answer, marked "coalesced": true. Raises
+        Overloaded when the chat LLM's queue is full.
+        """
+        context = dict(context or {})
+        return await self._coalesced(query, context, lambda: self._answer(query, context))
+
+    async def process_batch(
+        self, queries: List[str], context: Dict[str, Any] = None
+    ) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+        """
+        Answers many queries sharing one context (the options of `process_query`);
+        yields (index in queries, result) as each answer is ready.
+
+        All queries are embedded in one batched call and searched in one pass
+        before any agent runs; then at most BATCH_MAX_CONCURRENCY answers are
+        generated at once. A query that fails gets an error result instead of
+        ending the batch.
+        """
+        context = dict(context or {})
+        shared = dict(context)
+        await self._resolve_filters(shared)
+        k = self.agents.max_retrieval_k()
+        try:
+            documents = await asyncio.to_thread(retrieve_documents_many, queries, k, shared, self.rag)
+        except Exception as e:
+            # Each query retrieves on its own (and reports the error) instead.
+            logger.warning("Batch retrieval failed: %s", e)
+            documents = None
+        limit = asyncio.Semaphore(max(1, settings.BATCH_MAX_CONCURRENCY))
+
+        async def answer(i: int, query: str):
+            own = dict(shared, documents=documents[i]) if documents is not None else dict(shared)
+            async with limit:
+                try:
+                    return i, await self._coalesced(query, context, lambda: self._answer(query, own))
+                except Exception as e:
+                    return i, _error_result("Orchestrator", e)
+
+        tasks = [asyncio.ensure_future(answer(i, query)) for i, query in enumerate(queries)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _coalesced(self, query: str, context: Dict[str, Any], answer) -> Dict[str, Any]:
+        """Runs `answer()`, or joins an identical request (same query and context) already in flight."""
+        if not settings.SINGLE_FLIGHT:
+            return await answer()
+        key = (" ".join(query.split()), json.dumps(context, sort_keys=True, default=str))
+        result, shared = await query_flight.do(key, answer)
+        return {**result, "coalesced": True} if shared else result
+
+    async def _answer(self, query: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        timings: Dict[str, float] = {}
+        start = time.perf_counter()
+        plan = self.plan(query)
+        if plan:
+            await self._fan_out_start(query, context, timings)
+            parts: List[Optional[Dict[str, Any]]] = [None] * len(plan)
+            agent_start = time.perf_counter()
+            async for i, part in self._fan_out(query, plan, context):
+                parts[i] = part
+            _fan_out_timings(timings, parts, agent_start, start)
+            return {**merge_parts(parts), "cached": False, "timings": timings}
+
+        precomputed, agent_name = await self._precomputed(query, context, timings)
+        if precomputed is not None:
+            timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            return {**precomputed, "cached": False, "timings": timings}
+
+        agent, cache_key, cached = await self._prepare(query, context, timings, agent_name)
+        if cached is not None:
+            timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            return {**cached, "cached": True, "timings": timings}
+
+        # 4. Execute
+        try:
+            result = await _timed(timings, "agent", agent.run(query, context))
+            self._remember(agent, cache_key, context, result)
+        except Overloaded:
+            raise
+        except Exception as e:
+            result = _error_result(agent.name, e)
+        timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return {**result, "cached": False, "timings": timings}
+
+    async def stream_query(self, query: str, context: Dict[str, Any] = None) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Streaming variant of `process_query`. Yields ("route", {"agent": name}),
+        ("sources", [...]), ("token", text) as the answer is generated, and
+        finally ("done", result) with the dict `process_query` returns, or
+        ("error", error result) if the agent fails midway.
+
+        Compound requests are streamed by `_stream_fan_out`.
+        """
+        context = dict(context or {})
+        timings: Dict[str, float] = {}
+        start = time.perf_counter()
+        plan = self.plan(query)
+        if plan:
+            async for event in self._stream_fan_out(query, plan, context, timings, start):
+                yield event
+            return
+
+        precomputed, agent_name = await self._precomputed(query, context, timings)
+        if precomputed is not None:
+            yield "route", {"agent": precomputed["agent"]}
+            yield "sources", precomputed["sources"]
+            yield "token", precomputed["response"]
+            timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            yield "done", {**precomputed, "cached": False, "timings": timings}
+            return
+
+        agent, cache_key, cached = await self._prepare(query, context, timings, agent_name)
+        yield "route", {"agent": agent.name}
+        if cached is not None:
+            yield "sources", cached.get("sources", [])
+            yield "token", cached.get("response", "")
+            timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+            yield "done", {**cached, "cached": True, "timings": timings}
+            return
+
+        agent_start = time.perf_counter()
+        try:
+            async for event, data in agent.stream(query, context):
+                if event == "token" and "first_token_ms" not in timings:
+                    timings["first_token_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                if event == "done":
+                    self._remember(agent, cache_key, context, data)
+                    timings["agent_ms"] = round((time.perf_counter() - agent_start) * 1000, 1)
+                    timings["total_ms"] = round((time.perf_counter() - start) * 1000, 1)
+                    data = {**data, "cached": False, "timings": timings}
+                yield event, data
+        except Exception as e:
+            yield "error", {**_error_result(agent.name, e), "timings": timings}
+
+
+    async def _stream_fan_out(
+        self,
+        query: str,
+        plan: List[Tuple[BaseAgent, str]],
+        context: Dict[str, Any],
+        timings: Dict[str, float],
+        start: float,
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        `stream_query` for a compound request: ("route", {"agent", "agents"}), ("sources", [...])
+        of the shared retrieval, ("part", part) as each agent finishes, ("token", section) for
+        each section of the merged answer in plan order, then ("done", merged result).
+        """
+        names = [agent.name for agent, _ in plan]
+        yield "route", {"agent": " + ".join(names), "agents": names}
+        await self._fan_out_start(query, context, timings)
+        yield "sources", BaseAgent.sources(context.get("documents") or [])
+        parts: List[Optional[Dict[str, Any]]] = [None] * len(plan)
+        released = 0
+        agent_start = time.perf_counter()
+        async for i, part in self._fan_out(query, plan, context):
+            parts[i] = part
+            yield "part", part
+            # Sections go out in plan order, so the tokens add up to the merged response.
+            while released < len(parts) and parts[released] is not None:
+                timings.setdefault("first_token_ms", round((time.perf_counter() - start) * 1000, 1))
+                yield "token", ("\n\n" if released else "") + part_section(parts[released])
+                released += 1
+        _fan_out_timings(timings, parts, agent_start, start)
+        yield "done", {**merge_parts(parts), "cached": False, "timings": timings}
+
+
+def part_request(query: str, task: str) -> str:
+    """What one agent of a compound request is asked: the whole request, for context, and its own part."""
+    return f"Request: {query}\nYour part: {task}"
+
+
+def part_section(part: Dict[str, Any]) -> str:
+    body = part["response"] if "response" in part else f"_{part.get('answer', 'No answer.')}_"
+    return f"## {part['agent']}\n\n{body}"
+
+
+def merge_parts(parts: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    One response for a compound request: a section per agent in plan order,
+    the sources of the answered parts, and every part as it was returned.
+    "status" is "partial" if some agents failed and "error" if all did.
+    """
+    answered = [part for part in parts if "response" in part]
+    names = [part["agent"] for part in parts]
+    merged = {
+        "agent": " + ".join(names),
+        "agents": names,
+        "response": "\n\n".join(part_section(part) for part in parts),
+        "sources": list(dict.fromkeys(s for part in answered for s in part.get("sources", []))),
+        "parts": parts,
+    }
+    if len(answered) < len(parts):
+        merged["status"] = "partial" if answered else "error"
+    if not answered:
+        merged["answer"] = merged["response"]
+    return merged
+
+
+def _fan_out_timings(timings: Dict[str, float], parts: List[Dict[str, Any]], agent_start: float, start: float):
+    """`agent_ms` is the wall time of the concurrent agents; `saved_ms` what running them in turn would add."""
+    now = time.perf_counter()
+    timings["agent_ms"] = round((now - agent_start) * 1000, 1)
+    timings["saved_ms"] = round(max(0.0, sum(part["elapsed_ms"] for part in parts) - timings["agent_ms"]), 1)
+    timings["total_ms"] = round((now - start) * 1000, 1)
+
+
+async def _timed(timings: Dict[str, float], stage: str, coro):
+    start = time.perf_counter()
+    try:
+        return await coro
+    finally:
+        timings[f"{stage}_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def _error_result(agent_name: str, e: Exception) -> Dict[str, Any]:
+    if isinstance(e, Overloaded):
+        logger.warning("%s shed: %s", agent_name, e)
+        return {
+            "answer": "Too many requests are waiting for the language model right now. Please try again in a moment.",
+            "agent": agent_name,
+            "status": "error_overloaded"
+        }
+    error_msg = str(e)
+    if "429" in error_msg or "quota" in error_msg.lower():
+        logger.warning("Quota exceeded during agent execution: %s", e)
+        metrics.inc("researchmate_quota_errors_total", source="agent")
+        return {
+            "answer": "I apologize, but I've hit the usage limits for the Google Gemini API (Free Tier). Please try again in a minute or check your quota.",
+            "agent": agent_name,
+            "status": "error_quota_exceeded"
+        }
+    logger.error("Error during agent execution: %s", e, exc_info=e)
+    return {
+        "answer": f"I encountered an error while processing your request: {str(e)}",
+        "agent": agent_name,
+        "status": "error"
+    }
 
 orchestrator = OrchestratorAgent()
@@ -0,0 +1,239 @@
+import math
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Dict, List, Optional, Tuple
+from app.services.lexical import tokenize
+
+# High-precision phrases per agent. A rule routes only when one agent matches more phrases than any other.
+KEYWORD_RULES: Dict[str, List[str]] = {
+    "Paper Analyzer": [
+        r"\bsummar", r"\boverview\b", r"\bkey findings\b", r"\btl;?dr\b", r"\babstract\b", r"\bexplain\b",
+        r"\bbreak down\b", r"\bwhat problem\b",
+    ],
+    "Insight Generator": [
+        r"\bresearch gaps?\b", r"\bfuture (work|directions?|scope)\b", r"\blimitations?\b", r"\bnovel\b",
+        r"\bideas?\b", r"\bopen problems?\b", r"\binnovat", r"\bbrainstorm", r"\bhypothes", r"\bfollow-up\b",
+        r"\bunexplored\b", r"\bwhat should come next\b",
+    ],
+    "Paper Comparator": [
+        r"\bcompar", r"\bcontrast\b", r"\bdiffer(s|ence|ences)?\b", r"\bvs\.?\b", r"\bversus\b", r"\bside-by-side\b",
+        r"\bwhich of these papers\b", r"\brank the papers\b", r"\btwo (papers|approaches)\b",
+    ],
+    "Code Generator": [
+        r"\bcode\b", r"\bpython\b", r"\bpytorch\b", r"\btensorflow\b", r"\bscikit", r"\bsklearn\b",
+        r"\bpandas\b", r"\bnumpy\b", r"\bscript\b", r"\bimplement", r"\bfunction\b", r"\bnotebook\b",
+        r"\btraining loop\b",
+    ],
+    "Dashboard Planner": [
+        r"\bdashboards?\b", r"\bkpis?\b", r"\bcharts?\b", r"\bplots?\b", r"\bvisuali[sz]", r"\btableau\b",
+        r"\bpower ?bi\b", r"\bwidgets?\b", r"\blay ?out\b", r"\bgraphs\b",
+    ],
+    "Documentation Writer": [
+        r"\breadme\b", r"\bdocumentation\b", r"\bdocs\b", r"\breport\b", r"\bblog\b", r"\buser guide\b",
+        r"\brelease notes\b", r"\bproposal\b", r"\bbrief\b", r"\bmarkdown\b",
+    ],
+}
+
+# Phrasings per agent for the nearest-centroid tier, on top of the agents' own descriptions.
+AGENT_EXAMPLES: Dict[str, List[str]] = {
+    "Paper Analyzer": [
+        "summarize the paper", "what are the main contributions", "describe the method and results",
+        "what dataset and model did the authors use", "how does the proposed approach work",
+    ],
+    "Insight Generator": [
+        "what research gaps remain", "suggest future research directions", "weaknesses and possible improvements",
+        "new ideas and open questions", "innovation opportunities",
+    ],
+    "Paper Comparator": [
+        "compare the papers", "differences between the two approaches", "which paper performs better",
+        "contrast methodology results and metrics", "similarities between the models",
+    ],
+    "Code Generator": [
+        "write python code", "implement the model in pytorch", "data processing script",
+        "machine learning pipeline code", "exploratory data analysis with pandas",
+    ],
+    "Dashboard Planner": [
+        "design a dashboard", "which charts and kpis to show", "visualize the results",
+        "layout for the metrics page", "plots for the experiments",
+    ],
+    "Documentation Writer": [
+        "write a readme", "draft a report", "create documentation", "write a blog post",
+        "technical write-up for the project",
+    ],
+}
+
+
+# Clause boundaries of compound requests ("summarize it, list its limitations and give me code").
+CLAUSE_SPLIT = re.compile(r"\s*(?:[;,.!?]+\s|[;,!?]+|\b(?:and then|and also|as well as|then|also|plus|and)\b)\s*", re.I)
+
+
+def routing_terms(text: str) -> List[str]:
+    # Crude stemming: the first six characters group most inflections
+    # ("visualize"/"visualization", "compare"/"comparison").
+    return [token[:6] for token in tokenize(text)]
+
+
+class LocalRouter:
+    """
+    Routes queries without an LLM call when it is confident, in three tiers:
+    a cache of past decisions, keyword rules, and a nearest-centroid
+    classifier over TF-IDF vectors of each agent's description and example
+    phrasings. `route` returns None when unsure; the caller then asks the LLM
+    and reports its answer through `record_llm`, which also caches it.
+    """
+
+    def __init__(self, min_similarity: float = 0.3, min_margin: float = 0.15, cache_size: int = 4096):
+        self.min_similarity = min_similarity
+        self.min_margin = min_margin
+        self.cache_size = cache_size
+        self.rules = {agent: [re.compile(p) for p in patterns] for agent, patterns in KEYWORD_RULES.items()}
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        self._local_seconds = 0.0
+        self._llm_seconds = 0.0
+        self.fit({})
+
+    def fit(self, descriptions: Dict[str, str]):
+        """Builds the centroids from agent descriptions plus AGENT_EXAMPLES."""
+        texts = {
+            agent: [descriptions.get(agent, "")] + AGENT_EXAMPLES.get(agent, [])
+            for agent in set(AGENT_EXAMPLES) | set(descriptions)
+        }
+        docs = [set(routing_terms(t)) for phrases in texts.values() for t in phrases if t]
+        df = Counter(term for doc in docs for term in doc)
+        self.idf = {term: math.log(1 + len(docs) / count) for term, count in df.items()}
+        self.centroids = {}
+        for agent, phrases in texts.items():
+            centroid = Counter()
+            for phrase in phrases:
+                for term, weight in self._vector(phrase).items():
+                    centroid[term] += weight
+            self.centroids[agent] = self._normalize(centroid)
+
+    def _vector(self, text: str) -> Dict[str, float]:
+        counts = Counter(t for t in routing_terms(text) if t in self.idf)
+        return self._normalize({term: tf * self.idf[term] for term, tf in counts.items()})
+
+    @staticmethod
+    def _normalize(vector: Dict[str, float]) -> Dict[str, float]:
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        return {term: w / norm for term, w in vector.items()} if norm else {}
+
+    @staticmethod
+    def _key(query: str) -> str:
+        return " ".join(tokenize(query))
+
+    def match_rules(self, query: str) -> Optional[str]:
+        text = query.lower()
+        hits = sorted(
+            ((sum(1 for p in patterns if p.search(text)), agent) for agent, patterns in self.rules.items()),
+            reverse=True,
+        )
+        (best, agent), (second, _) = hits[0], hits[1]
+        return agent if best > second else None
+
+    def classify(self, query: str) -> Tuple[Optional[str], float, float]:
+        """Nearest centroid: (agent, similarity, margin over the runner-up)."""
+        vector = self._vector(query)
+        scores = sorted(
+            ((sum(w * centroid.get(t, 0.0) for t, w in vector.items()), agent)
+             for agent, centroid in self.centroids.items()),
+            reverse=True,
+        )
+        if not scores or not vector:
+            return None, 0.0, 0.0
+        margin = scores[0][0] - (scores[1][0] if len(scores) > 1 else 0.0)
+        return scores[0][1], scores[0][0], margin
+
+    def route(self, query: str) -> Optional[str]:
+        """The agent for `query`, or None if the LLM should decide."""
+        start = time.perf_counter()
+        key = self._key(query)
+        with self._lock:
+            agent = self._cache.get(key)
+            if agent is not None:
+                self._cache.move_to_end(key)
+        tier = "cache_hits"
+        if agent is None:
+            agent, tier = self.match_rules(query), "rule_hits"
+        if agent is None:
+            candidate, similarity, margin = self.classify(query)
+            if similarity >= self.min_similarity and margin >= self.min_margin:
+                agent, tier = candidate, "centroid_hits"
+        with self._lock:
+            self._counts["queries"] += 1
+            self._local_seconds += time.perf_counter() - start
+            if agent is not None:
+                self._counts[tier] += 1
+                self._remember(key, agent)
+        return agent
+
+    def split(self, query: str, max_agents: int = 3) -> List[Tuple[str, str]]:
+        """
+        Splits a compound request into (agent, task) pairs when its clauses
+        match the keyword rules of two or more agents; returns [] otherwise.
+        Clauses matching no agent, or the same agent as the clause before,
+        stay with the preceding task (a leading one joins the first task).
+        """
+        parts: List[List[str]] = []
+        leading = []
+        for clause in CLAUSE_SPLIT.split(query):
+            clause = clause.strip()
+            if not clause:
+                continue
+            agent = self.match_rules(clause)
+            if parts and (agent is None or agent == parts[-1][0]):
+                parts[-1][1] += " " + clause
+            elif agent is None:
+                leading.append(clause)
+            else:
+                parts.append([agent, " ".join(leading + [clause])])
+                leading = []
+        agents = list(dict.fromkeys(agent for agent, _ in parts))
+        if len(agents) < 2 or max_agents < 2:
+            return []
+        # The same agent asked twice, apart ("summarize, code, then summarize results"): one task each.
+        tasks: Dict[str, str] = {}
+        for agent, task in parts:
+            tasks[agent] = f"{tasks[agent]}; {task}" if agent in tasks else task
+        with self._lock:
+            self._counts["fanouts"] += 1
+        return [(agent, tasks[agent]) for agent in agents[:max_agents]]
+
+    def record_llm(self, query: str, agent: Optional[str], seconds: float):
+        """Reports an LLM routing decision (agent None if the call failed)."""
+        with self._lock:
+            self._counts["llm_fallbacks"] += 1
+            self._llm_seconds += seconds
+            if agent is not None:
+                self._remember(self._key(query), agent)
+
+    def _remember(self, key: str, agent: str):
+        self._cache[key] = agent
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            queries = self._counts["queries"]
+            fallbacks = self._counts["llm_fallbacks"]
+            local = queries - fallbacks
+            return {
+                "queries": queries,
+                "cache_hits": self._counts["cache_hits"],
+                "rule_hits": self._counts["rule_hits"],
+                "centroid_hits": self._counts["centroid_hits"],
+                "llm_fallbacks": fallbacks,
+                "fanouts": self._counts["fanouts"],
+                "local_hit_rate": round(local / queries, 4) if queries else 0.0,
+                "fallback_rate": round(fallbacks / queries, 4) if queries else 0.0,
+                "local_ms_avg": round(self._local_seconds * 1000 / queries, 3) if queries else 0.0,
+                "llm_ms_avg": round(self._llm_seconds * 1000 / fallbacks, 1) if fallbacks else 0.0,
+            }
+
+
+local_router = LocalRouter()
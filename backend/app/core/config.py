@@ -1,4 +1,5 @@
 import os
+from typing import List, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,6 +9,106 @@ class Settings:
     PROJECT_VERSION: str = "1.0.0"
     API_PREFIX: str = "/api/v1"
     GOOGLE_API_KEY: str = os.getenv("GOOGLE_API_KEY", "")
-    DATA_DIR: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+    DATA_DIR: str = os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "data"))
+    # "google" (Gemini) or "fake" (local stand-in from app.services.fakes, for benchmarks)
+    LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "google")
+    # "google" or "fake" (hashed bag-of-words embeddings, no API calls)
+    EMBEDDING_PROVIDER: str = os.getenv("EMBEDDING_PROVIDER", "google")
+    # Fake providers: simulated latency (seconds) and the share of calls failing with a 500 / 429
+    FAKE_LLM_TOKENS: int = int(os.getenv("FAKE_LLM_TOKENS", "50"))
+    FAKE_LLM_FIRST_TOKEN_LATENCY: float = float(os.getenv("FAKE_LLM_FIRST_TOKEN_LATENCY", "0"))
+    FAKE_LLM_TOKEN_LATENCY: float = float(os.getenv("FAKE_LLM_TOKEN_LATENCY", "0"))
+    FAKE_EMBEDDING_LATENCY: float = float(os.getenv("FAKE_EMBEDDING_LATENCY", "0"))
+    FAKE_ERROR_RATE: float = float(os.getenv("FAKE_ERROR_RATE", "0"))
+    FAKE_RATE_LIMIT_RATE: float = float(os.getenv("FAKE_RATE_LIMIT_RATE", "0"))
+    FAKE_SEED: int = int(os.getenv("FAKE_SEED", "0"))
+
+    # PDF extraction process pool (0 workers = extract in a thread instead)
+    EXTRACTION_WORKERS: int = int(os.getenv("EXTRACTION_WORKERS", "2"))
+    EXTRACTION_QUEUE_SIZE: int = int(os.getenv("EXTRACTION_QUEUE_SIZE", "16"))
+    EXTRACTION_PAGES_PER_TASK: int = int(os.getenv("EXTRACTION_PAGES_PER_TASK", "25"))
+    # "auto" (pypdf, pdfplumber for pages that look wrong), "pypdf" or "pdfplumber"
+    EXTRACTION_BACKEND: str = os.getenv("EXTRACTION_BACKEND", "auto")
+    # Extracted text cached per file content hash (documents, LRU-evicted)
+    EXTRACTION_CACHE_SIZE: int = int(os.getenv("EXTRACTION_CACHE_SIZE", "1000"))
+
+    # Background ingestion jobs
+    INGESTION_WORKERS: int = int(os.getenv("INGESTION_WORKERS", "2"))
+    # Precomputed summaries: summarize each document in the background once it is indexed, with
+    # this model, at most this many summarization calls at once, sections of at most this many
+    # tokens per call and summaries of at most this many words
+    SUMMARIZE_ON_INGEST: bool = os.getenv("SUMMARIZE_ON_INGEST", "false").lower() in ("1", "true", "yes")
+    SUMMARY_MODEL: str = os.getenv("SUMMARY_MODEL", "gemini-1.5-flash")
+    SUMMARY_MAX_CONCURRENCY: int = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "2"))
+    SUMMARY_SECTION_TOKENS: int = int(os.getenv("SUMMARY_SECTION_TOKENS", "3000"))
+    SUMMARY_MAX_WORDS: int = int(os.getenv("SUMMARY_MAX_WORDS", "250"))
+
+    # Embeddings
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "models/embedding-001")
+    EMBEDDING_CACHE_SIZE: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "200000"))
+    EMBEDDING_BATCH_SIZE: int = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+    EMBEDDING_REQUESTS_PER_MINUTE: float = float(os.getenv("EMBEDDING_REQUESTS_PER_MINUTE", "150"))
+    EMBEDDING_TOKENS_PER_MINUTE: float = float(os.getenv("EMBEDDING_TOKENS_PER_MINUTE", "1000000"))
+    EMBEDDING_MAX_IN_FLIGHT: int = int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", "4"))
+    EMBEDDING_MAX_RETRIES: int = int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))
+
+    # Chunking: "sections" (research-paper structure; no chunk crosses a section heading, tables and
+    # equations stay whole) or "recursive" (plain character splitting)
+    CHUNKER: str = os.getenv("CHUNKER", "sections")
+    # Near-duplicate chunks (MinHash estimate of word 5-gram Jaccard >= threshold) are linked, not indexed
+    CHUNK_DEDUP: bool = os.getenv("CHUNK_DEDUP", "true").lower() in ("1", "true", "yes")
+    CHUNK_DEDUP_THRESHOLD: float = float(os.getenv("CHUNK_DEDUP_THRESHOLD", "0.85"))
+
+    # Vector index: "chroma", "numpy" (in-process exact search over a memory-mapped matrix)
+    # or "numpy-int8" (int8 scan, exact re-rank of the top k * VECTOR_RERANK_FACTOR candidates)
+    VECTOR_BACKEND: str = os.getenv("VECTOR_BACKEND", "chroma")
+    VECTOR_RERANK_FACTOR: int = int(os.getenv("VECTOR_RERANK_FACTOR", "4"))
+
+    # Default retrieval: "vector", "lexical" (BM25 only, no embedding call) or "hybrid" (both, fused)
+    RETRIEVAL_MODE: str = os.getenv("RETRIEVAL_MODE", "hybrid")
+    # Sections left out of retrieval unless a search asks for them (comma-separated)
+    RETRIEVAL_EXCLUDED_SECTIONS: List[str] = [
+        s.strip() for s in os.getenv("RETRIEVAL_EXCLUDED_SECTIONS", "References").split(",") if s.strip()
+    ]
+
+    # Agent routing: "local" (keyword/centroid/cache router, LLM only when unsure) or "llm" (always ask the LLM)
+    ROUTING_MODE: str = os.getenv("ROUTING_MODE", "local")
+    # Compound requests ("summarize it and write code") run up to this many agents concurrently; 1 disables
+    FANOUT_MAX_AGENTS: int = int(os.getenv("FANOUT_MAX_AGENTS", "3"))
+    # Seconds an agent may take on its part of a compound request before it is reported as timed out
+    AGENT_TIMEOUT: float = float(os.getenv("AGENT_TIMEOUT", "60"))
+
+    # /query/batch: answers generated at once per batch, and the most queries one batch may carry
+    BATCH_MAX_CONCURRENCY: int = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+    BATCH_MAX_QUERIES: int = int(os.getenv("BATCH_MAX_QUERIES", "500"))
+
+    # Upstream admission control: calls in flight per upstream, callers allowed to wait for a slot
+    # (more are shed with a 503) and how long a caller waits (ingestion waits without limit)
+    CHAT_MAX_CONCURRENCY: int = int(os.getenv("CHAT_MAX_CONCURRENCY", "8"))
+    CHAT_MAX_QUEUE: int = int(os.getenv("CHAT_MAX_QUEUE", "32"))
+    EMBEDDING_MAX_CONCURRENCY: int = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "8"))
+    EMBEDDING_MAX_QUEUE: int = int(os.getenv("EMBEDDING_MAX_QUEUE", "64"))
+    ADMISSION_QUEUE_TIMEOUT: float = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "30"))
+    # Identical in-flight /query requests and query embeddings share one upstream call
+    SINGLE_FLIGHT: bool = os.getenv("SINGLE_FLIGHT", "true").lower() in ("1", "true", "yes")
+
+    # Answer cache: reuse answers to (near-)identical queries over the same chunks
+    ANSWER_CACHE_SIZE: int = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+    ANSWER_CACHE_TTL: float = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+    ANSWER_CACHE_SIMILARITY: float = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.95"))
+
+    # Context packing: prompt token budget per agent (agents may set their own), near-duplicate
+    # cutoff, and the MMR diversity trade-off (unset = keep retrieval order)
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+    CONTEXT_DEDUPE_THRESHOLD: float = float(os.getenv("CONTEXT_DEDUPE_THRESHOLD", "0.9"))
+    CONTEXT_MMR_LAMBDA: Optional[float] = float(os.environ["CONTEXT_MMR_LAMBDA"]) if os.getenv("CONTEXT_MMR_LAMBDA") else None
+
+    # Logging level of the app's loggers
+    LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+    # Sampling profiler: requests slower than this (ms) have their stacks written to PROFILE_DIR
+    # as collapsed flame-graph data; unset = off
+    PROFILE_SLOW_REQUESTS_MS: Optional[float] = float(os.environ["PROFILE_SLOW_REQUESTS_MS"]) if os.getenv("PROFILE_SLOW_REQUESTS_MS") else None
+    PROFILE_INTERVAL_MS: float = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", os.path.join(DATA_DIR, "profiles"))
 
 settings = Settings()
@@ -0,0 +1,55 @@
+import threading
+from typing import Dict, Tuple
+from app.core.config import settings
+
+_pool: Dict[Tuple[str, float], object] = {}
+_lock = threading.Lock()
+
+
+def get_chat_model(model: str = "gemini-1.5-pro", temperature: float = 0.7):
+    """
+    Shared chat model client per (model, temperature), created on first use.
+    Agents with the same settings reuse one client and its HTTP connections;
+    the Gemini SDK is only imported when the first client is built.
+    """
+    key = (model, temperature)
+    client = _pool.get(key)
+    if client is None:
+        with _lock:
+            client = _pool.get(key)
+            if client is None:
+                client = _pool[key] = _build_chat_model(model, temperature)
+    return client
+
+
+def _build_chat_model(model: str, temperature: float):
+    if settings.LLM_PROVIDER == "fake":
+        from app.services.fakes import FakeChatModel
+
+        return FakeChatModel(
+            tokens=settings.FAKE_LLM_TOKENS,
+            first_token_latency=settings.FAKE_LLM_FIRST_TOKEN_LATENCY,
+            token_latency=settings.FAKE_LLM_TOKEN_LATENCY,
+            error_rate=settings.FAKE_ERROR_RATE,
+            rate_limit_rate=settings.FAKE_RATE_LIMIT_RATE,
+            seed=settings.FAKE_SEED,
+        )
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(model=model, google_api_key=settings.GOOGLE_API_KEY, temperature=temperature)
+
+
+def build_embeddings():
+    """Embedding client for EMBEDDING_PROVIDER; the SDK is only imported for "google"."""
+    if settings.EMBEDDING_PROVIDER == "fake":
+        from app.services.fakes import FakeEmbeddings
+
+        return FakeEmbeddings(
+            latency=settings.FAKE_EMBEDDING_LATENCY,
+            error_rate=settings.FAKE_ERROR_RATE,
+            rate_limit_rate=settings.FAKE_RATE_LIMIT_RATE,
+            seed=settings.FAKE_SEED,
+        )
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+
+    return GoogleGenerativeAIEmbeddings(model=settings.EMBEDDING_MODEL, google_api_key=settings.GOOGLE_API_KEY)
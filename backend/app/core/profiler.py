@@ -0,0 +1,94 @@
+"""
+Sampling profiler for slow requests.
+
+While at least one request is being recorded, a background thread samples
+the stack of every thread each `interval` seconds. A request that turns out
+slower than the threshold has its samples written as collapsed stacks
+("frame;frame;frame count" per line), the input format of flamegraph.pl,
+speedscope and inferno. Requests share the event loop thread, so a slow
+request's profile also shows whatever ran concurrently with it.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+
+class Recording:
+    def __init__(self):
+        self.samples: Counter = Counter()
+        self.started = time.time()
+
+
+class SamplingProfiler:
+    """
+    :param interval: Seconds between samples.
+    :param output_dir: Where `dump` writes `.folded` files.
+    :param max_depth: Innermost frames kept per stack.
+    """
+
+    def __init__(self, interval: float = 0.005, output_dir: str = ".", max_depth: int = 64):
+        self.interval = interval
+        self.output_dir = output_dir
+        self.max_depth = max_depth
+        self.dumps = 0
+        self._recordings = set()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> Recording:
+        recording = Recording()
+        with self._lock:
+            self._recordings.add(recording)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+        return recording
+
+    def stop(self, recording: Recording):
+        with self._lock:
+            self._recordings.discard(recording)
+
+    def _run(self):
+        own = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = [
+                self._fold(names.get(ident, str(ident)), frame)
+                for ident, frame in sys._current_frames().items() if ident != own
+            ]
+            with self._lock:
+                if not self._recordings:
+                    self._thread = None
+                    return
+                for recording in self._recordings:
+                    recording.samples.update(stacks)
+
+    def _fold(self, thread_name: str, frame) -> str:
+        frames = []
+        while frame is not None and len(frames) < self.max_depth:
+            code = frame.f_code
+            frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        frames.append(thread_name)
+        return ";".join(reversed(frames))
+
+    def dump(self, recording: Recording, label: str) -> str:
+        """Writes the recording's collapsed stacks; returns the file path."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(recording.started))
+        name = re.sub(r"[^A-Za-z0-9_.-]+", "_", label).strip("_")
+        with self._lock:
+            self.dumps += 1
+            path = os.path.join(self.output_dir, f"{stamp}-{self.dumps}-{name}.folded")
+        with open(path, "w") as f:
+            for stack, count in recording.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        return path
+
+    def stats(self) -> Dict[str, object]:
+        return {"interval": self.interval, "recording": len(self._recordings), "dumps": self.dumps}
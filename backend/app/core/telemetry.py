@@ -0,0 +1,205 @@
+"""
+Timing spans and Prometheus metrics.
+
+`span("retrieve")` times a pipeline stage: the duration goes into the
+`researchmate_stage_seconds` histogram and, inside an HTTP request, into the
+request's timings, which the middleware in app.main sends back as a
+`Server-Timing` header. Counters and histograms are rendered in the
+Prometheus text format by `metrics.render()` (GET /metrics).
+"""
+import bisect
+import contextvars
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Seconds; covers a cache hit (~1 ms) up to a slow LLM answer.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, Dict[str, str], float]
+
+_request_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "request_timings", default=None
+)
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels: Labels, extra: Labels = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, as Prometheus expects."""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Labels, List[float]] = {}
+
+    def observe(self, labels: Labels, value: float):
+        series = self._series.get(labels)
+        if series is None:
+            # One count per bucket, then +Inf, sum.
+            series = self._series[labels] = [0.0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def samples(self, name: str) -> List[str]:
+        lines = []
+        for labels, series in sorted(self._series.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = (("le", "+Inf" if bound == float("inf") else repr(bound)),)
+                lines.append(f"{name}_bucket{_format_labels(labels, le)} {_format_value(cumulative)}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(round(series[-1], 6))}")
+            lines.append(f"{name}_count{_format_labels(labels)} {_format_value(cumulative)}")
+        return lines
+
+
+class Metrics:
+    """
+    In-process counters and histograms. Values kept elsewhere (cache hit
+    counts, scheduler retries) are read at render time from collectors:
+    callables returning (name, labels, value) samples.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[Labels, float]] = defaultdict(lambda: defaultdict(float))
+        self._histograms: Dict[str, Histogram] = {}
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def describe(self, name: str, kind: str, help_text: str):
+        """:param kind: "counter", "gauge" or "histogram"."""
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, amount: float = 1.0, **labels):
+        with self._lock:
+            self._counters[name][_labels(labels)] += amount
+
+    def observe(self, name: str, value: float, **labels):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(_labels(labels), value)
+
+    def add_collector(self, collector: Callable[[], Iterable[Sample]]):
+        self._collectors.append(collector)
+
+    def value(self, name: str, **labels) -> float:
+        """Current value of a counter (0 if never incremented)."""
+        with self._lock:
+            return self._counters.get(name, {}).get(_labels(labels), 0.0)
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format (version 0.0.4)."""
+        collected: Dict[str, Dict[Labels, float]] = defaultdict(dict)
+        for collector in self._collectors:
+            for name, labels, value in collector():
+                collected[name][_labels(labels)] = value
+        lines = []
+        with self._lock:
+            families = {name: dict(series) for name, series in self._counters.items()}
+            for name, series in collected.items():
+                families.setdefault(name, {}).update(series)
+            for name in sorted(set(families) | set(self._histograms)):
+                kind, help_text = self._help.get(name, ("histogram" if name in self._histograms else "counter", ""))
+                if help_text:
+                    lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                if name in self._histograms:
+                    lines.extend(self._histograms[name].samples(name))
+                for labels, value in sorted(families.get(name, {}).items()):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+metrics.describe("researchmate_stage_seconds", "histogram", "Time spent per pipeline stage.")
+metrics.describe("researchmate_request_seconds", "histogram", "HTTP request latency by route.")
+metrics.describe("researchmate_quota_errors_total", "counter", "429/quota errors by where they surfaced.")
+metrics.describe("researchmate_cache_hits_total", "counter", "Cache hits by cache.")
+metrics.describe("researchmate_cache_misses_total", "counter", "Cache misses by cache.")
+metrics.describe("researchmate_ingested_bytes_total", "counter", "Bytes of uploaded files saved.")
+metrics.describe("researchmate_ingested_pages_total", "counter", "PDF pages extracted.")
+metrics.describe("researchmate_upstream_in_flight", "gauge", "Calls in flight per upstream API.")
+metrics.describe("researchmate_upstream_queue_depth", "gauge", "Callers waiting for an upstream slot.")
+metrics.describe("researchmate_upstream_shed_total", "counter", "Calls rejected with a 503 (queue full or wait timed out).")
+metrics.describe("researchmate_coalesced_total", "counter", "Calls that joined an identical in-flight call.")
+for source in ("agent", "ingestion", "retrieval"):
+    metrics.inc("researchmate_quota_errors_total", 0, source=source)
+metrics.inc("researchmate_ingested_bytes_total", 0)
+metrics.inc("researchmate_ingested_pages_total", 0)
+
+
+class span:
+    """
+    Times a stage (`with span("embed"):`) into researchmate_stage_seconds
+    and the current request's Server-Timing entries, if any.
+    """
+
+    __slots__ = ("stage", "_start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self._start
+        metrics.observe("researchmate_stage_seconds", elapsed, stage=self.stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings.append((self.stage, elapsed))
+        return False
+
+
+def start_request() -> contextvars.Token:
+    """Collects the spans of the current request (and the tasks/threads it starts) until `end_request`."""
+    return _request_timings.set([])
+
+
+def end_request(token: contextvars.Token) -> List[Tuple[str, float]]:
+    timings = _request_timings.get() or []
+    _request_timings.reset(token)
+    return timings
+
+
+def server_timing(timings: List[Tuple[str, float]], total: Optional[float] = None) -> str:
+    """
+    `Server-Timing` header value: one entry per stage with its summed
+    duration in ms (concurrent spans overlap, so stages may add up to more
+    than the total), and the number of spans when a stage ran more than once.
+    """
+    summed: Dict[str, List[float]] = {}
+    for stage, seconds in timings:
+        entry = summed.setdefault(stage, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+    parts = []
+    for stage, (seconds, count) in summed.items():
+        name = re.sub(r"[^A-Za-z0-9_-]", "_", stage)
+        parts.append(f"{name};dur={seconds * 1000:.1f}" + (f';desc="{count}x"' if count > 1 else ""))
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
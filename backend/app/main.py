@@ -1,13 +1,43 @@
-from fastapi import FastAPI, UploadFile, File
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Literal, Optional
+from pydantic import BaseModel
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from app.core.config import settings
+from app.core.profiler import SamplingProfiler
+from app.core.telemetry import end_request, metrics, server_timing, start_request
+from app.services.admission import Overloaded, chat_gate, embedding_flight, embedding_gate, query_flight
+from app.services.documents import document_registry
 from app.services.ingestion import ingestion_service
+from app.services.jobs import job_manager, job_status
+from app.services.summaries import document_summarizer
+
+logging.basicConfig(format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+logging.getLogger("app").setLevel(settings.LOG_LEVEL)
+logger = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Resumes ingestion jobs left unfinished by the previous process.
+    await job_manager.start()
+    document_summarizer.resume()
+    yield
+    await job_manager.stop()
+    from app.services.extraction import extraction_pool
+    extraction_pool.shutdown()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.PROJECT_VERSION,
     openapi_url=f"{settings.API_PREFIX}/openapi.json",
     docs_url=f"{settings.API_PREFIX}/docs",
+    lifespan=lifespan,
 )
 
 # CORS
@@ -17,28 +47,285 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
+)
+
+profiler = (
+    SamplingProfiler(settings.PROFILE_INTERVAL_MS / 1000, settings.PROFILE_DIR)
+    if settings.PROFILE_SLOW_REQUESTS_MS is not None else None
 )
 
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    """
+    Times every request: stage spans (route, retrieve, prompt, generate,
+    extract, chunk, embed) go back in a `Server-Timing` header and the total
+    into the request histogram. Streamed responses only carry the stages that
+    finished before the first byte. With PROFILE_SLOW_REQUESTS_MS set, slow
+    requests have their sampled stacks written to PROFILE_DIR.
+    """
+    token = start_request()
+    recording = profiler.start() if profiler else None
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        elapsed = time.perf_counter() - start
+        timings = end_request(token)
+        if recording is not None:
+            profiler.stop(recording)
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    metrics.observe("researchmate_request_seconds", elapsed, method=request.method, route=route)
+    response.headers["Server-Timing"] = server_timing(timings, elapsed)
+    if recording is not None and elapsed * 1000 >= settings.PROFILE_SLOW_REQUESTS_MS:
+        path = await asyncio.to_thread(profiler.dump, recording, f"{request.method} {route}")
+        logger.warning("%s %s took %.0f ms; profile written to %s", request.method, route, elapsed * 1000, path)
+    return response
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    # Shed before calling an API that would only answer with 429s; clients retry after a pause.
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
+def split_tags(tags: Optional[str]) -> List[str]:
+    return [tag.strip() for tag in (tags or "").split(",") if tag.strip()]
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to ResearchMate AI API"}
 
-@app.post(f"{settings.API_PREFIX}/upload")
-async def upload_document(file: UploadFile = File(...)):
-    result = await ingestion_service.process_document(file)
+@app.post(f"{settings.API_PREFIX}/upload", status_code=202)
+async def upload_document(file: UploadFile = File(...), tags: Optional[str] = Form(None)):
+    # Save now, then extract/chunk/embed in the background; poll /jobs/{job_id}.
+    # Re-uploading identical content re-uses the document and only fills in missing chunks.
+    # `tags` is a comma-separated list, usable as a query filter.
+    document = await ingestion_service.register_upload(file, tags=split_tags(tags))
+    job = await job_manager.submit(document)
+    return job_status(job)
+
+@app.get(f"{settings.API_PREFIX}/documents")
+async def list_documents():
+    return {"documents": document_registry.list()}
+
+@app.put(f"{settings.API_PREFIX}/documents/{{doc_id}}", status_code=202)
+async def replace_document(doc_id: str, file: UploadFile = File(...)):
+    document = await ingestion_service.replace_document(doc_id, file)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    job = await job_manager.submit(document)
+    return job_status(job)
+
+class TagsRequest(BaseModel):
+    tags: List[str]
+
+@app.put(f"{settings.API_PREFIX}/documents/{{doc_id}}/tags")
+async def set_document_tags(doc_id: str, request: TagsRequest):
+    if not document_registry.get(doc_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    document_registry.set_tags(doc_id, request.tags)
+    return document_registry.get(doc_id)
+
+@app.delete(f"{settings.API_PREFIX}/documents/{{doc_id}}")
+async def delete_document(doc_id: str):
+    result = await ingestion_service.delete_document(doc_id)
+    if not result:
+        raise HTTPException(status_code=404, detail="Document not found")
     return result
 
-from pydantic import BaseModel
+@app.get(f"{settings.API_PREFIX}/documents/{{doc_id}}/summary")
+async def get_document_summary(doc_id: str):
+    """The precomputed summary and section digests; "status" is pending, running, ready, failed or missing."""
+    document = document_registry.get(doc_id)
+    if not document:
+        raise HTTPException(status_code=404, detail="Document not found")
+    summary = document_summarizer.store.get(doc_id)
+    if summary is None or summary["content_hash"] != document["content_hash"]:
+        return {"doc_id": doc_id, "status": "missing"}
+    return {key: summary[key] for key in ("doc_id", "status", "summary", "sections", "llm_calls", "error", "updated_at")}
+
+@app.post(f"{settings.API_PREFIX}/documents/{{doc_id}}/summary", status_code=202)
+async def build_document_summary(doc_id: str):
+    # (Re)builds the summary in the background, also when SUMMARIZE_ON_INGEST is off.
+    if not document_summarizer.schedule(doc_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return await get_document_summary(doc_id)
+
+@app.get(f"{settings.API_PREFIX}/documents/{{doc_id}}/sections")
+async def get_document_sections(doc_id: str):
+    """The document's sections (Abstract, Method, References, ...) in text order, with their chunk counts."""
+    from app.services.rag import rag_service
+    if not document_registry.get(doc_id):
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"doc_id": doc_id, "sections": await asyncio.to_thread(rag_service.document_sections, doc_id)}
+
+@app.get(f"{settings.API_PREFIX}/jobs/{{job_id}}")
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job_status(job)
+
+@app.get(f"{settings.API_PREFIX}/stats")
+async def get_stats():
+    from app.agents.router import local_router
+    from app.services.answer_cache import answer_cache
+    from app.services.context_packer import context_packer
+    from app.services.extraction import extraction_pool
+    from app.services.rag import rag_service
+    return {
+        "extraction": extraction_pool.stats(),
+        "embedding_cache": rag_service.embedding_cache.stats(),
+        "embedding_scheduler": rag_service.scheduler.stats(),
+        "lexical_index": rag_service.lexical_index.stats(),
+        "dedup": rag_service.dedup_index.stats() if rag_service.dedup_index else None,
+        "router": local_router.stats(),
+        "answer_cache": answer_cache.stats(),
+        "context_packer": context_packer.stats(),
+        "summaries": document_summarizer.stats(),
+        "admission": admission_stats(),
+    }
+
+def admission_stats() -> Dict[str, Any]:
+    return {
+        "chat": chat_gate.stats(),
+        "embeddings": embedding_gate.stats(),
+        "single_flight": {"queries": query_flight.stats(), "embeddings": embedding_flight.stats()},
+    }
 
-class QueryRequest(BaseModel):
+def stats_samples():
+    """Counters and gauges kept by the caches, the embedding scheduler and the admission gates, for /metrics."""
+    from app.services.answer_cache import answer_cache
+    from app.services.extraction import extraction_pool
+    from app.services.rag import rag_service
+    caches = {
+        "answer": answer_cache.stats(),
+        "embedding": rag_service.embedding_cache.stats(),
+        "extraction": extraction_pool.stats()["cache"],
+    }
+    for cache, stats in caches.items():
+        if stats:
+            yield "researchmate_cache_hits_total", {"cache": cache}, stats["hits"]
+            yield "researchmate_cache_misses_total", {"cache": cache}, stats["misses"]
+    yield "researchmate_quota_errors_total", {"source": "embedding"}, rag_service.scheduler.stats()["rate_limited"]
+    for upstream, gate in (("chat", chat_gate), ("embeddings", embedding_gate)):
+        stats = gate.stats()
+        yield "researchmate_upstream_in_flight", {"upstream": upstream}, stats["in_flight"]
+        yield "researchmate_upstream_queue_depth", {"upstream": upstream}, stats["queue_depth"]
+        yield "researchmate_upstream_shed_total", {"upstream": upstream}, stats["shed"] + stats["timed_out"]
+    for kind, flight in (("query", query_flight), ("embedding", embedding_flight)):
+        yield "researchmate_coalesced_total", {"kind": kind}, flight.coalesced
+
+metrics.add_collector(stats_samples)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus text format: stage and request latency histograms, cache, quota and ingestion counters."""
+    text = await asyncio.to_thread(metrics.render)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+class QueryFilters(BaseModel):
+    # A document must pass every filter given; list filters match any of their values.
+    doc_ids: Optional[List[str]] = None
+    sources: Optional[List[str]] = None
+    tags: Optional[List[str]] = None
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
+
+    def find_arguments(self) -> Dict[str, Any]:
+        """Keyword arguments of DocumentRegistry.find."""
+        arguments = self.model_dump(exclude_none=True)
+        for name in ("uploaded_after", "uploaded_before"):
+            if name in arguments:
+                arguments[name] = arguments[name].timestamp()
+        return arguments
+
+class QueryOptions(BaseModel):
+    # Overrides RETRIEVAL_MODE for this request; "lexical" skips the embedding API.
+    retrieval_mode: Optional[Literal["vector", "lexical", "hybrid"]] = None
+    # Search only the documents matching these filters.
+    filters: Optional[QueryFilters] = None
+    # Spread the retrieved chunks evenly over the filtered documents.
+    per_document: bool = False
+    # Search only chunks in these sections (e.g. ["Method"]); also lifts the default exclusion of References.
+    sections: Optional[List[str]] = None
+    # Skip the answer cache and regenerate.
+    bypass_cache: bool = False
+
+    def context(self) -> Dict[str, Any]:
+        return {
+            "retrieval_mode": self.retrieval_mode,
+            "filters": self.filters.find_arguments() if self.filters else None,
+            "per_document": self.per_document,
+            "sections": self.sections,
+            "bypass_cache": self.bypass_cache,
+        }
+
+class QueryRequest(QueryOptions):
     query: str
 
+class BatchQueryRequest(QueryOptions):
+    queries: List[str]
+
 @app.post(f"{settings.API_PREFIX}/query")
 async def query_agent(request: QueryRequest):
     from app.agents.orchestrator import orchestrator
-    result = await orchestrator.process_query(request.query)
+    result = await orchestrator.process_query(request.query, request.context())
     return result
 
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post(f"{settings.API_PREFIX}/query/stream")
+async def query_agent_stream(request: QueryRequest):
+    """
+    Server-Sent Events: `route`, `sources`, one `token` event per piece of the
+    answer, then `done` with the full result (or `error`).
+    """
+    from app.agents.orchestrator import orchestrator
+
+    async def events():
+        async for event, data in orchestrator.stream_query(request.query, request.context()):
+            yield sse_event(event, data)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post(f"{settings.API_PREFIX}/query/batch")
+async def query_agent_batch(request: BatchQueryRequest):
+    """
+    Newline-delimited JSON: one line per query as its answer is ready (in
+    completion order, with "index" and "query"), then a line with "done": true
+    and the batch totals. The options apply to every query.
+    """
+    from app.agents.orchestrator import orchestrator
+
+    if not request.queries:
+        raise HTTPException(status_code=400, detail="No queries given")
+    if len(request.queries) > settings.BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=413, detail=f"At most {settings.BATCH_MAX_QUERIES} queries per batch"
+        )
+
+    async def lines():
+        start = time.perf_counter()
+        errors = 0
+        async for i, result in orchestrator.process_batch(request.queries, request.context()):
+            errors += "status" in result
+            yield json.dumps({"index": i, "query": request.queries[i], **result}) + "\n"
+        elapsed = time.perf_counter() - start
+        yield json.dumps({
+            "done": True,
+            "queries": len(request.queries),
+            "errors": errors,
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "queries_per_minute": round(len(request.queries) / elapsed * 60, 1) if elapsed else None,
+        }) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,251 @@
+"""
+Admission control and single-flight coalescing for the upstream APIs.
+
+An AdmissionGate bounds the calls in flight to one upstream (the chat LLM,
+the embedding API). Callers beyond the limit wait in a FIFO queue; once
+`max_queue` callers are waiting, or a caller has waited `queue_timeout`
+seconds, further callers are shed with `Overloaded` (a 503) instead of
+piling onto an API that would answer with 429s. Background work (ingestion)
+may wait without being shed.
+
+SingleFlight / AsyncSingleFlight coalesce identical concurrent calls: the
+first caller runs the call, later callers with the same key wait for it and
+share its result (or error).
+"""
+import asyncio
+import threading
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from app.core.config import settings
+
+
+class Overloaded(Exception):
+    def __init__(self, upstream: str):
+        super().__init__(f"503 {upstream} is at capacity, retry shortly")
+        self.upstream = upstream
+
+
+class _Waiter:
+    """A queued caller; `grant` hands it a slot (called with the gate's lock held)."""
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.loop = loop
+        self.granted = False
+        self.abandoned = False
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def grant(self) -> bool:
+        if self.abandoned:
+            return False
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._wake)
+        return True
+
+    def _wake(self):
+        if not self.future.done():
+            self.future.set_result(None)
+
+
+class AdmissionGate:
+    """
+    At most `max_concurrent` calls in flight (<= 0: unlimited). Use
+    `with gate:` from threads and `async with gate:` from the event loop;
+    both shed when the queue is full. `acquire(shed=False)` / `release()`
+    wait for a slot however long the queue is.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, queue_timeout: Optional[float] = None):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self.timed_out = 0
+        self.peak_queue = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def _enter(self, shed: bool, loop: Optional[asyncio.AbstractEventLoop] = None) -> Optional[_Waiter]:
+        """Takes a free slot (returns None) or queues a waiter; raises Overloaded if the queue is full."""
+        with self._lock:
+            if self.max_concurrent <= 0 or (self.in_flight < self.max_concurrent and not self._waiters):
+                self.in_flight += 1
+                self.admitted += 1
+                return None
+            if shed and len(self._waiters) >= self.max_queue:
+                self.shed += 1
+                raise Overloaded(self.name)
+            waiter = _Waiter(loop)
+            self._waiters.append(waiter)
+            self.queued += 1
+            self.peak_queue = max(self.peak_queue, len(self._waiters))
+            return waiter
+
+    def _give_up(self, waiter: _Waiter) -> bool:
+        """Leaves the queue; returns True if the slot was granted meanwhile (the caller now holds it)."""
+        with self._lock:
+            if waiter.granted:
+                return True
+            waiter.abandoned = True
+            self._waiters.remove(waiter)
+            return False
+
+    def _timeout(self, shed: bool) -> Optional[float]:
+        return self.queue_timeout if shed else None
+
+    def acquire(self, shed: bool = True):
+        waiter = self._enter(shed)
+        if waiter is None or waiter.event.wait(self._timeout(shed)):
+            return
+        if self._give_up(waiter):
+            return
+        with self._lock:
+            self.timed_out += 1
+        raise Overloaded(self.name)
+
+    async def aacquire(self, shed: bool = True):
+        waiter = self._enter(shed, asyncio.get_running_loop())
+        if waiter is None:
+            return
+        try:
+            await asyncio.wait_for(waiter.future, self._timeout(shed))
+        except asyncio.TimeoutError:
+            if self._give_up(waiter):
+                return
+            with self._lock:
+                self.timed_out += 1
+            raise Overloaded(self.name) from None
+        except asyncio.CancelledError:
+            if self._give_up(waiter):
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            if self.max_concurrent > 0:
+                while self._waiters:
+                    waiter = self._waiters.popleft()
+                    if waiter.grant():
+                        # The slot passes straight to the next caller in line.
+                        self.admitted += 1
+                        return
+            self.in_flight -= 1
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+        return False
+
+    async def __aenter__(self):
+        await self.aacquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "in_flight": self.in_flight,
+                "queue_depth": len(self._waiters),
+                "peak_queue_depth": self.peak_queue,
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "shed": self.shed,
+                "timed_out": self.timed_out,
+            }
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Coalesces identical concurrent blocking calls (from threads)."""
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._inflight: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def call(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+                self.calls += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            call.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._inflight)}
+
+
+class AsyncSingleFlight:
+    """
+    Coalesces identical concurrent coroutine calls. The call runs as its own
+    task, so a caller that disconnects does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Returns (result, shared): `shared` is True when another caller's call was joined."""
+        task = self._inflight.get(key)
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            self.coalesced += 1
+            return await asyncio.shield(task), True
+        task = asyncio.ensure_future(fn())
+        self._inflight[key] = task
+        self.calls += 1
+        task.add_done_callback(lambda done: self._inflight.pop(key) if self._inflight.get(key) is done else None)
+        return await asyncio.shield(task), False
+
+    def stats(self) -> Dict[str, int]:
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._inflight)}
+
+
+chat_gate = AdmissionGate(
+    "chat LLM", settings.CHAT_MAX_CONCURRENCY, settings.CHAT_MAX_QUEUE, settings.ADMISSION_QUEUE_TIMEOUT
+)
+embedding_gate = AdmissionGate(
+    "embedding API", settings.EMBEDDING_MAX_CONCURRENCY, settings.EMBEDDING_MAX_QUEUE, settings.ADMISSION_QUEUE_TIMEOUT
+)
+query_flight = AsyncSingleFlight()
+embedding_flight = SingleFlight()
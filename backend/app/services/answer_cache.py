@@ -0,0 +1,150 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+from app.services.lexical import tokenize
+
+
+class AnswerCache:
+    """
+    In-memory cache of agent answers, so repeated and near-duplicate questions
+    about the same chunks skip the LLM.
+
+    An entry is reused when the agent is the same, the retrieved chunk ids are
+    the same set, and the query either normalizes to the same text or its
+    embedding has cosine similarity >= `similarity` with the cached one.
+    Entries expire after `ttl` seconds, the least recently used are evicted
+    beyond `max_entries`, and `invalidate_document` drops every entry built on
+    a document's chunks (called when a document is re-ingested or deleted).
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 3600, similarity: float = 0.95, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._lock = threading.Lock()
+        # (agent, chunk ids) -> {entry id: entry}; entry ids are kept in LRU order in `_order`.
+        self._buckets: Dict[Tuple[str, FrozenSet[str]], Dict[int, dict]] = {}
+        self._order: "OrderedDict[int, Tuple[str, FrozenSet[str]]]" = OrderedDict()
+        self._by_doc: Dict[str, set] = {}
+        self._next_id = 0
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        return " ".join(tokenize(query))
+
+    def get(
+        self, agent: str, query: str, vector: Optional[List[float]], chunk_ids: Iterable[str]
+    ) -> Optional[Dict[str, Any]]:
+        key = (agent, frozenset(chunk_ids))
+        text = self.normalize_query(query)
+        unit = _unit(vector)
+        now = self.clock()
+        with self._lock:
+            best, best_score = None, -1.0
+            for entry_id, entry in list(self._buckets.get(key, {}).items()):
+                if now - entry["created_at"] > self.ttl:
+                    self._remove(entry_id)
+                    self.evictions += 1
+                    continue
+                if entry["text"] == text:
+                    score = 1.0
+                elif unit is not None and entry["vector"] is not None:
+                    score = float(unit @ entry["vector"])
+                else:
+                    continue
+                if score >= self.similarity and score > best_score:
+                    best, best_score = entry_id, score
+            if best is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._order.move_to_end(best)
+            return self._buckets[key][best]["answer"]
+
+    def put(
+        self,
+        agent: str,
+        query: str,
+        vector: Optional[List[float]],
+        chunk_ids: Iterable[str],
+        doc_ids: Iterable[str],
+        answer: Dict[str, Any],
+    ):
+        key = (agent, frozenset(chunk_ids))
+        doc_ids = set(doc_ids)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._buckets.setdefault(key, {})[entry_id] = {
+                "text": self.normalize_query(query),
+                "vector": _unit(vector),
+                "doc_ids": doc_ids,
+                "answer": answer,
+                "created_at": self.clock(),
+            }
+            self._order[entry_id] = key
+            for doc_id in doc_ids:
+                self._by_doc.setdefault(doc_id, set()).add(entry_id)
+            while len(self._order) > self.max_entries:
+                self._remove(next(iter(self._order)))
+                self.evictions += 1
+
+    def invalidate_document(self, doc_id: str):
+        with self._lock:
+            for entry_id in list(self._by_doc.pop(doc_id, ())):
+                if entry_id in self._order:
+                    self._remove(entry_id)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+            self._order.clear()
+            self._by_doc.clear()
+
+    def _remove(self, entry_id: int):
+        key = self._order.pop(entry_id)
+        entry = self._buckets[key].pop(entry_id)
+        if not self._buckets[key]:
+            del self._buckets[key]
+        for doc_id in entry["doc_ids"]:
+            entries = self._by_doc.get(doc_id)
+            if entries is not None:
+                entries.discard(entry_id)
+                if not entries:
+                    del self._by_doc[doc_id]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._order),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def _unit(vector: Optional[List[float]]) -> Optional[np.ndarray]:
+    if vector is None:
+        return None
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else None
+
+
+answer_cache = AnswerCache(
+    max_entries=settings.ANSWER_CACHE_SIZE,
+    ttl=settings.ANSWER_CACHE_TTL,
+    similarity=settings.ANSWER_CACHE_SIMILARITY,
+)
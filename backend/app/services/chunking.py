@@ -0,0 +1,299 @@
+import re
+from bisect import bisect_right
+from typing import List, Optional, Tuple
+from langchain_text_splitters import TextSplitter
+
+# Canonical section names, by the heading titles that open them (matched case-insensitively).
+SECTION_TITLES = {
+    "Abstract": ("abstract",),
+    "Introduction": ("introduction",),
+    "Related Work": ("related work", "related works", "background", "prior work", "literature review",
+                     "background and related work"),
+    "Method": ("method", "methods", "methodology", "approach", "our approach", "proposed method",
+               "proposed approach", "materials and methods", "model architecture"),
+    "Experiments": ("experiments", "experiment", "experimental setup", "experimental settings", "evaluation",
+                    "experiments and results"),
+    "Results": ("results", "experimental results", "results and discussion", "findings", "main results"),
+    "Discussion": ("discussion", "analysis", "limitations"),
+    "Conclusion": ("conclusion", "conclusions", "concluding remarks", "conclusion and future work",
+                   "conclusions and future work", "future work"),
+    "Acknowledgments": ("acknowledgments", "acknowledgements", "acknowledgment", "acknowledgement"),
+    "References": ("references", "bibliography", "works cited", "literature cited"),
+    "Appendix": ("appendix", "appendices", "supplementary material", "supplementary materials"),
+}
+SECTION_OF_TITLE = {title: section for section, titles in SECTION_TITLES.items() for title in titles}
+# Text before the first recognized heading (title, authors, affiliations).
+FRONT_MATTER = "Front matter"
+# A line holding only a heading, optionally numbered ("3", "3.", "III", "A"); subsections ("3.1") never match.
+HEADING = re.compile(r"^(?:(?:\d{1,2}|[IVX]{1,4}|[A-H])\.?\s+)?([A-Za-z][A-Za-z ,&\-]{2,60}?)[\s.:]*$")
+# "Abstract" running into its first sentence, as pdfplumber often extracts it.
+INLINE_ABSTRACT = re.compile(r"^abstract\s*[:.\u2014\u2013-]", re.IGNORECASE)
+# "Appendix", "Appendix B: Proofs", "A Appendix"
+APPENDIX = re.compile(r"^(?:[A-H]\.?\s+)?appendix\b.{0,60}$", re.IGNORECASE)
+LINE = re.compile(r"[^\n]+")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+# Table cells ("28.4", "(1)", "-3.2%") and equation symbols.
+NUMBER = re.compile(r"(?<!\S)[-+\u2212\u00b1(]*\d[\d.,]*[%)]*(?!\S)")
+MATH_SYMBOL = re.compile("[=+<>^_|\u2211\u220f\u222b\u221a\u2264\u2265\u2248\u2208\u2200\u2202\u2207\u00b1\u00d7\u00b7\u2212]")
+WORD = re.compile(r"(?<!\S)[A-Za-z]{4,}(?!\S)")
+
+
+def section_heading(line: str) -> Optional[str]:
+    """The canonical section a heading line opens, or None if the line is not a heading."""
+    line = line.strip()
+    if INLINE_ABSTRACT.match(line):
+        return "Abstract"
+    if APPENDIX.match(line):
+        return "Appendix"
+    match = HEADING.match(line)
+    if not match:
+        return None
+    return SECTION_OF_TITLE.get(" ".join(match.group(1).lower().replace("&", "and").split()))
+
+
+def is_structured(line: str) -> bool:
+    """Whether a line looks like a table row (mostly numbers) or an equation (mostly symbols)."""
+    symbols = len(MATH_SYMBOL.findall(line))
+    numbers = len(NUMBER.findall(line))
+    if symbols < 2 and numbers < 2:
+        return False
+    tokens = len(line.split())
+    if tokens >= 3 and 2 * numbers >= tokens:
+        return True
+    return symbols >= 2 and len(WORD.findall(line)) <= 3
+
+
+class StreamingChunker:
+    """
+    Splits text that arrives in pieces (e.g. PDF pages) with `splitter`,
+    holding at most about `window` characters instead of the whole text.
+
+    Pieces are joined with `separator` (empty pieces are skipped), and every
+    chunk is returned with its offset in that joined text, so chunks that
+    cross a page boundary are cut and numbered as if the text had been
+    split at once. Only chunks ending at least one chunk length before the
+    end of the buffer are released; the rest wait for more text.
+    """
+
+    def __init__(self, splitter: TextSplitter, separator: str = "\n", window: int = None):
+        self.splitter = splitter
+        self.separator = separator
+        self.chunk_size = splitter._chunk_size
+        self.window = window or 8 * self.chunk_size
+        self._buffer = ""
+        self._offset = 0
+        self._started = False
+
+    def feed(self, text: str) -> List[Tuple[int, str]]:
+        """Adds the next piece; returns the (offset, chunk) pairs that are final."""
+        if not text:
+            return []
+        if self._started:
+            text = self.separator + text
+        self._started = True
+        self._buffer += text
+        if len(self._buffer) < self.window:
+            return []
+        return self._release(final=False)
+
+    def finish(self) -> List[Tuple[int, str]]:
+        """Returns the remaining chunks."""
+        return self._release(final=True)
+
+    def section_at(self, offset: int) -> Optional[str]:
+        """Plain splitting knows no sections."""
+        return None
+
+    def _release(self, final: bool) -> List[Tuple[int, str]]:
+        chunks = [
+            (doc.metadata["start_index"], doc.page_content)
+            for doc in self.splitter.create_documents([self._buffer])
+        ]
+        if final:
+            ready, keep_from = chunks, len(self._buffer)
+        else:
+            safe_end = len(self._buffer) - self.chunk_size
+            ready = []
+            for start, text in chunks:
+                if start + len(text) > safe_end:
+                    break
+                ready.append((start, text))
+            if len(ready) == len(chunks):
+                return []
+            # The first held-back chunk starts inside the last released one when they
+            # overlap, so re-splitting from there reproduces the overlap.
+            keep_from = chunks[len(ready)][0]
+        released = [(self._offset + start, text) for start, text in ready]
+        self._buffer = self._buffer[keep_from:]
+        self._offset += keep_from
+        return released
+
+
+class SectionChunker:
+    """
+    Chunker for research papers, with StreamingChunker's interface: text is
+    fed in pieces and chunks come back with their offsets in the joined text.
+
+    Lines that open a section ("2 Related Work", "ABSTRACT", "References")
+    split the text into sections, and no chunk crosses a section boundary;
+    `section_at` names the section a chunk starts in. Within a section,
+    lines are packed into chunks of at most `chunk_size` characters, with
+    about `chunk_overlap` characters of running text repeated between
+    neighbours. Runs of table rows or equation lines are kept whole, up to
+    twice the chunk size; long lines are split at sentence ends, then at
+    spaces.
+    """
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200, separator: str = "\n", window: int = None):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separator = separator
+        self.window = window or 8 * chunk_size
+        self._buffer = ""
+        self._offset = 0
+        self._started = False
+        # Offsets where sections start in the joined text, and their names.
+        self._starts = [0]
+        self._names = [FRONT_MATTER]
+
+    def feed(self, text: str) -> List[Tuple[int, str]]:
+        """Adds the next piece; returns the (offset, chunk) pairs that are final."""
+        if not text:
+            return []
+        if self._started:
+            text = self.separator + text
+        self._started = True
+        self._buffer += text
+        if len(self._buffer) < self.window:
+            return []
+        return self._release(final=False)
+
+    def finish(self) -> List[Tuple[int, str]]:
+        """Returns the remaining chunks."""
+        return self._release(final=True)
+
+    def section_at(self, offset: int) -> str:
+        """The section the text at `offset` belongs to (of the text released so far)."""
+        return self._names[bisect_right(self._starts, offset) - 1]
+
+    def _release(self, final: bool) -> List[Tuple[int, str]]:
+        spans = self._sections()
+        released = []
+        keep_from = len(self._buffer)
+        for i, (start, end) in enumerate(spans):
+            chunks = self._pack(start, end)
+            if final or i < len(spans) - 1:
+                released += chunks
+                continue
+            # The open section: release chunks ending at least a chunk length before the end
+            # of the buffer, and pack the rest again from the first one held back.
+            safe_end = len(self._buffer) - self.chunk_size
+            ready = 0
+            while ready < len(chunks) and chunks[ready][0] + len(chunks[ready][1]) <= safe_end:
+                ready += 1
+            released += chunks[:ready]
+            if ready < len(chunks):
+                keep_from = chunks[ready][0]
+        self._buffer = self._buffer[keep_from:]
+        self._offset += keep_from
+        return [(self._offset - keep_from + start, text) for start, text in released]
+
+    def _sections(self) -> List[Tuple[int, int]]:
+        """(start, end) of the sections in the buffer; records the headings found."""
+        spans = []
+        start = 0
+        for line in LINE.finditer(self._buffer):
+            name = section_heading(line.group())
+            if name is None:
+                continue
+            if line.start() > start:
+                spans.append((start, line.start()))
+            start = line.start()
+            offset = self._offset + start
+            # Text held back from the last release is scanned again; its headings are known.
+            if offset > self._starts[-1]:
+                self._starts.append(offset)
+                self._names.append(name)
+            elif offset == self._starts[-1]:
+                self._names[-1] = name
+        spans.append((start, len(self._buffer)))
+        return spans
+
+    def _pack(self, start: int, end: int) -> List[Tuple[int, str]]:
+        """Greedily packs the units of buffer[start:end] into chunks."""
+        chunks = []
+        current: List[Tuple[int, int, bool]] = []
+        for unit in self._units(start, end):
+            if current and unit[1] - current[0][0] > self.chunk_size:
+                chunks.append(current)
+                current = self._overlap(current)
+                if current and unit[1] - current[0][0] > self.chunk_size:
+                    current = []
+            current.append(unit)
+        if current:
+            chunks.append(current)
+        return [(units[0][0], self._buffer[units[0][0]:units[-1][1]]) for units in chunks]
+
+    def _overlap(self, units: List[Tuple[int, int, bool]]) -> List[Tuple[int, int, bool]]:
+        """The trailing running-text units of a chunk (within chunk_overlap) that open the next one."""
+        keep = []
+        for unit in reversed(units[1:]):
+            if unit[2] or units[-1][1] - unit[0] > self.chunk_overlap:
+                break
+            keep.insert(0, unit)
+        return keep
+
+    def _units(self, start: int, end: int) -> List[Tuple[int, int, bool]]:
+        """(start, end, atomic) pieces of buffer[start:end]: sentences and table/equation blocks."""
+        units = []
+        block: List[Tuple[int, int]] = []
+        for line in LINE.finditer(self._buffer, start, end):
+            text = line.group()
+            if not text.strip():
+                continue
+            s = line.start() + len(text) - len(text.lstrip())
+            e = line.end() - (len(text) - len(text.rstrip()))
+            if is_structured(text):
+                block.append((s, e))
+                continue
+            units += self._block(block)
+            block = []
+            units += self._sentences(s, e)
+        return units + self._block(block)
+
+    def _block(self, lines: List[Tuple[int, int]]) -> List[Tuple[int, int, bool]]:
+        """A run of table or equation lines as one unit, or as chunk-size groups of lines if too long."""
+        if not lines:
+            return []
+        if lines[-1][1] - lines[0][0] <= 2 * self.chunk_size:
+            return [(lines[0][0], lines[-1][1], True)]
+        groups = []
+        for s, e in lines:
+            if groups and e - groups[-1][0] <= self.chunk_size:
+                groups[-1] = (groups[-1][0], e, True)
+            else:
+                groups += [(s, e, True)] if e - s <= self.chunk_size else self._sentences(s, e)
+        return groups
+
+    def _sentences(self, start: int, end: int) -> List[Tuple[int, int, bool]]:
+        """A line split at sentence ends; sentences longer than a chunk are cut at spaces."""
+        units = []
+        s = start
+        for match in SENTENCE_END.finditer(self._buffer, start, end):
+            units += self._words(s, match.start())
+            s = match.end()
+        return units + self._words(s, end)
+
+    def _words(self, start: int, end: int) -> List[Tuple[int, int, bool]]:
+        units = []
+        while end - start > self.chunk_size:
+            cut = self._buffer.rfind(" ", start + 1, start + self.chunk_size + 1)
+            if cut == -1:
+                cut = start + self.chunk_size
+            units.append((start, cut, False))
+            start = cut
+            while start < end and self._buffer[start] == " ":
+                start += 1
+        if end > start:
+            units.append((start, end, False))
+        return units
@@ -0,0 +1,193 @@
+import math
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+from app.core.config import settings
+from app.services.embedding_scheduler import estimate_tokens
+from app.services.lexical import tokenize
+
+
+class ContextPacker:
+    """
+    Turns retrieved chunks (best first) into the context an agent sends to
+    the LLM, spending as few prompt tokens as possible:
+
+    1. near-duplicates (term-vector cosine >= `dedupe_threshold` with a
+       better-ranked chunk) are dropped;
+    2. with `mmr_lambda` set, chunks are re-ranked by maximal marginal
+       relevance, trading rank for novelty against the chunks already picked;
+    3. chunks are taken in order while they fit in the token budget, where a
+       chunk overlapping one already taken (same document, overlapping
+       `start_index` range) only costs its new characters;
+    4. overlapping or adjacent chunks of the same document are merged into a
+       single passage, so the shared overlap is sent once.
+
+    Token counts use the same ~4 characters per token estimate as embedding
+    budgeting.
+    """
+
+    def __init__(self, budget_tokens: int = 2000, dedupe_threshold: float = 0.9, mmr_lambda: Optional[float] = None):
+        self.budget_tokens = budget_tokens
+        self.dedupe_threshold = dedupe_threshold
+        self.mmr_lambda = mmr_lambda
+        self._lock = threading.Lock()
+        self._totals = Counter()
+
+    def pack(self, docs: List[Document], budget_tokens: int = None) -> Tuple[List[Document], Dict[str, int]]:
+        """
+        :param budget_tokens: Overrides the default budget (agents set their own).
+        :return: (passages to put in the prompt, in rank order; per-request stats)
+        """
+        budget = budget_tokens or self.budget_tokens
+        vectors = [_term_vector(d.page_content) for d in docs]
+        order = self._dedupe(vectors)
+        duplicates = len(docs) - len(order)
+        if self.mmr_lambda is not None:
+            order = self._mmr(order, vectors)
+
+        selected: List[int] = []
+        used = 0
+        for i in order:
+            cost = estimate_tokens(_new_text(docs[i], [docs[j] for j in selected]))
+            if used + cost > budget and selected:
+                continue
+            selected.append(i)
+            used += cost
+        passages = _merge(docs, selected)
+        if passages and estimate_tokens(passages[0].page_content) > budget:
+            # A single chunk larger than the whole budget is cut rather than dropped.
+            first = passages[0]
+            passages = [Document(page_content=first.page_content[:budget * 4], metadata=first.metadata, id=first.id)]
+
+        tokens_in = sum(estimate_tokens(d.page_content) for d in docs)
+        tokens_used = sum(estimate_tokens(d.page_content) for d in passages)
+        stats = {
+            "chunks_in": len(docs),
+            "duplicates_dropped": duplicates,
+            "chunks_used": len(selected),
+            "passages": len(passages),
+            "tokens_in": tokens_in,
+            "tokens_used": tokens_used,
+            "tokens_saved": max(0, tokens_in - tokens_used),
+        }
+        with self._lock:
+            self._totals["requests"] += 1
+            self._totals.update({k: stats[k] for k in ("tokens_in", "tokens_used", "tokens_saved")})
+        return passages, stats
+
+    def _dedupe(self, vectors: List[Dict[str, float]]) -> List[int]:
+        kept: List[int] = []
+        for i, vector in enumerate(vectors):
+            if all(_cosine(vector, vectors[j]) < self.dedupe_threshold for j in kept):
+                kept.append(i)
+        return kept
+
+    def _mmr(self, order: List[int], vectors: List[Dict[str, float]]) -> List[int]:
+        # Retrieval already ranked the chunks (possibly by fusing two rankings), so relevance is rank-based.
+        relevance = {i: 1.0 - rank / len(order) for rank, i in enumerate(order)}
+        remaining, ranked = list(order), []
+        while remaining:
+            best = max(
+                remaining,
+                key=lambda i: self.mmr_lambda * relevance[i]
+                - (1 - self.mmr_lambda) * max((_cosine(vectors[i], vectors[j]) for j in ranked), default=0.0),
+            )
+            ranked.append(best)
+            remaining.remove(best)
+        return ranked
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests = self._totals["requests"]
+            return {
+                "requests": requests,
+                "tokens_in": self._totals["tokens_in"],
+                "tokens_used": self._totals["tokens_used"],
+                "tokens_saved": self._totals["tokens_saved"],
+                "tokens_saved_avg": round(self._totals["tokens_saved"] / requests, 1) if requests else 0.0,
+            }
+
+
+def _term_vector(text: str) -> Dict[str, float]:
+    counts = Counter(tokenize(text))
+    norm = math.sqrt(sum(c * c for c in counts.values()))
+    return {term: c / norm for term, c in counts.items()} if norm else {}
+
+
+def _cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(w * b.get(term, 0.0) for term, w in a.items())
+
+
+def _span(doc: Document) -> Optional[Tuple[Any, int, int]]:
+    """(document key, start, end) of a chunk, if it carries its offset."""
+    key = doc.metadata.get("doc_id") or doc.metadata.get("source")
+    start = doc.metadata.get("start_index")
+    if key is None or start is None:
+        return None
+    return key, start, start + len(doc.page_content)
+
+
+def _new_text(doc: Document, taken: List[Document]) -> str:
+    """The part of `doc` not already covered by an overlapping chunk in `taken`."""
+    span = _span(doc)
+    if span is None:
+        return doc.page_content
+    key, start, end = span
+    covered = sorted(
+        (s, e) for s, e in ((t[1], t[2]) for t in map(_span, taken) if t is not None and t[0] == key)
+        if s < end and e > start
+    )
+    parts, cursor = [], start
+    for s, e in covered:
+        if s > cursor:
+            parts.append(doc.page_content[cursor - start:s - start])
+        cursor = max(cursor, e)
+    parts.append(doc.page_content[cursor - start:])
+    return "".join(parts)
+
+
+def _merge(docs: List[Document], selected: List[int]) -> List[Document]:
+    """Merges overlapping or adjacent chunks of one document; passages keep the rank of their best chunk."""
+    passages: List[Tuple[int, Document]] = []
+    groups: Dict[Any, List[Tuple[int, int, int]]] = {}
+    for rank, i in enumerate(selected):
+        span = _span(docs[i])
+        if span is None:
+            passages.append((rank, docs[i]))
+        else:
+            groups.setdefault(span[0], []).append((span[1], span[2], i))
+    rank_of = {i: rank for rank, i in enumerate(selected)}
+    for spans in groups.values():
+        spans.sort()
+        run = [spans[0]]
+        for span in spans[1:]:
+            if span[0] <= max(e for _, e, _ in run):
+                run.append(span)
+            else:
+                passages.append(_join(docs, run, rank_of))
+                run = [span]
+        passages.append(_join(docs, run, rank_of))
+    return [doc for _, doc in sorted(passages, key=lambda p: p[0])]
+
+
+def _join(docs: List[Document], run: List[Tuple[int, int, int]], rank_of: Dict[int, int]) -> Tuple[int, Document]:
+    start = run[0][0]
+    text, end = "", start
+    for s, e, i in run:
+        if e > end:
+            text += docs[i].page_content[end - s:]
+            end = e
+    best = min(rank_of[i] for _, _, i in run)
+    first = docs[run[0][2]]
+    metadata = dict(first.metadata, start_index=start)
+    return best, Document(page_content=text, metadata=metadata, id=first.id if len(run) == 1 else None)
+
+
+context_packer = ContextPacker(
+    budget_tokens=settings.CONTEXT_TOKEN_BUDGET,
+    dedupe_threshold=settings.CONTEXT_DEDUPE_THRESHOLD,
+    mmr_lambda=settings.CONTEXT_MMR_LAMBDA,
+)
@@ -0,0 +1,299 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from app.services.embedding_scheduler import estimate_tokens
+from app.services.lexical import tokenize
+
+# Mersenne prime 2^61 - 1 for the universal hash family of the MinHash permutations.
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def shingles(text: str, size: int = 5) -> set:
+    """Word `size`-grams of the normalized text (the whole text if shorter)."""
+    tokens = tokenize(text)
+    if len(tokens) <= size:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+class MinHasher:
+    """MinHash signatures: the fraction of equal positions estimates the Jaccard similarity of shingle sets."""
+
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        self.a = rng.randint(1, _MAX_HASH, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, _MAX_HASH, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        items = shingles(text)
+        if not items:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in items],
+            dtype=np.uint64,
+        )
+        # (a * x + b) mod p, truncated to 32 bits; a, x < 2^32 so the product fits in 64 bits.
+        permuted = (np.outer(hashes, self.a) + self.b) % _PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint64)
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        return float(np.mean(a == b))
+
+
+class DuplicateIndex:
+    """
+    Corpus-wide near-duplicate detector for chunks, persisted in SQLite.
+
+    Each canonical chunk's MinHash signature is split into `bands` bands;
+    chunks sharing any band bucket are candidates, confirmed when their
+    estimated Jaccard similarity is >= `threshold`. A chunk that matches a
+    canonical chunk is linked to it (with its text and metadata, so it can
+    take over if the canonical one is deleted) instead of being indexed.
+    """
+
+    def __init__(self, db_path: str, threshold: float = 0.85, num_perm: int = 64, bands: int = 16):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.db_path = db_path
+        self.threshold = threshold
+        self.bands = bands
+        self.hasher = MinHasher(num_perm)
+        self._lock = threading.Lock()
+        self._counts = Counter()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS canonical (
+                    chunk_id TEXT PRIMARY KEY,
+                    doc_id TEXT,
+                    signature BLOB NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (band INTEGER, key INTEGER, chunk_id TEXT)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_buckets ON buckets (band, key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_buckets_chunk ON buckets (chunk_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_canonical_doc ON canonical (doc_id)")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS duplicates (
+                    chunk_id TEXT PRIMARY KEY,
+                    doc_id TEXT,
+                    canonical_id TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    metadata TEXT NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_duplicates_canonical ON duplicates (canonical_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_duplicates_doc ON duplicates (doc_id)")
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _band_keys(self, signature: np.ndarray) -> List[Tuple[int, int]]:
+        rows = len(signature) // self.bands
+        return [
+            (band, int.from_bytes(
+                hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).digest(),
+                "little", signed=True,
+            ))
+            for band in range(self.bands)
+        ]
+
+    def dedupe(self, chunks: List[Tuple[str, str, str, Dict[str, Any]]]) -> List[Optional[str]]:
+        """
+        Checks (chunk_id, doc_id, text, metadata) items in order against the
+        corpus and each other. New originals are registered as canonical;
+        duplicates are linked. Returns the canonical id per item (None if the
+        item is itself canonical).
+        """
+        results: List[Optional[str]] = []
+        with self._lock, self._connect() as conn:
+            for chunk_id, doc_id, text, metadata in chunks:
+                signature = self.hasher.signature(text)
+                keys = self._band_keys(signature)
+                canonical_id = self._match(conn, chunk_id, signature, keys)
+                self._counts["chunks"] += 1
+                if canonical_id is None:
+                    conn.execute("DELETE FROM duplicates WHERE chunk_id = ?", (chunk_id,))
+                    conn.execute("DELETE FROM buckets WHERE chunk_id = ?", (chunk_id,))
+                    conn.execute(
+                        "INSERT OR REPLACE INTO canonical (chunk_id, doc_id, signature) VALUES (?, ?, ?)",
+                        (chunk_id, doc_id, signature.tobytes()),
+                    )
+                    conn.executemany(
+                        "INSERT INTO buckets (band, key, chunk_id) VALUES (?, ?, ?)",
+                        [(band, key, chunk_id) for band, key in keys],
+                    )
+                else:
+                    # A chunk that used to be canonical hands its own duplicates over.
+                    conn.execute("UPDATE duplicates SET canonical_id = ? WHERE canonical_id = ?", (canonical_id, chunk_id))
+                    conn.execute("DELETE FROM canonical WHERE chunk_id = ?", (chunk_id,))
+                    conn.execute("DELETE FROM buckets WHERE chunk_id = ?", (chunk_id,))
+                    conn.execute(
+                        "INSERT OR REPLACE INTO duplicates (chunk_id, doc_id, canonical_id, text, metadata) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        (chunk_id, doc_id, canonical_id, text, json.dumps(metadata)),
+                    )
+                    self._counts["duplicates"] += 1
+                    self._counts["tokens_skipped"] += estimate_tokens(text)
+                results.append(canonical_id)
+        return results
+
+    def _match(self, conn, chunk_id: str, signature: np.ndarray, keys: List[Tuple[int, int]]) -> Optional[str]:
+        clause = " OR ".join(["(band = ? AND key = ?)"] * len(keys))
+        candidates = conn.execute(
+            f"SELECT DISTINCT c.chunk_id, c.signature FROM buckets b JOIN canonical c ON c.chunk_id = b.chunk_id "
+            f"WHERE ({clause}) AND b.chunk_id != ?",
+            (*[v for key in keys for v in key], chunk_id),
+        ).fetchall()
+        best, best_score = None, self.threshold
+        for candidate_id, blob in candidates:
+            score = self.hasher.similarity(signature, np.frombuffer(blob, dtype=np.uint64))
+            if score >= best_score:
+                best, best_score = candidate_id, score
+        return best
+
+    def remove(self, chunk_ids: List[str]) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """
+        Forgets chunks (canonical or duplicate). Returns the duplicates of removed
+        canonical chunks as (chunk_id, text, metadata), unlinked, so the caller
+        can index them in their place.
+        """
+        if not chunk_ids:
+            return []
+        removed = set(chunk_ids)
+        orphans = []
+        with self._lock, self._connect() as conn:
+            for i in range(0, len(chunk_ids), 500):
+                batch = chunk_ids[i:i + 500]
+                marks = ",".join("?" * len(batch))
+                conn.execute(f"DELETE FROM canonical WHERE chunk_id IN ({marks})", batch)
+                conn.execute(f"DELETE FROM buckets WHERE chunk_id IN ({marks})", batch)
+                conn.execute(f"DELETE FROM duplicates WHERE chunk_id IN ({marks})", batch)
+                rows = conn.execute(
+                    f"SELECT chunk_id, text, metadata FROM duplicates WHERE canonical_id IN ({marks})", batch
+                ).fetchall()
+                orphans += [(cid, text, json.loads(meta)) for cid, text, meta in rows if cid not in removed]
+            conn.executemany("DELETE FROM duplicates WHERE chunk_id = ?", [(cid,) for cid, _, _ in orphans])
+        return orphans
+
+    def document_ids(self, doc_id: str) -> List[str]:
+        """Chunk ids of a document known to the index, canonical or duplicate."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT chunk_id FROM canonical WHERE doc_id = ? UNION SELECT chunk_id FROM duplicates WHERE doc_id = ?",
+                (doc_id, doc_id),
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def duplicates(self, doc_id: str) -> List[Tuple[str, str, Dict[str, Any]]]:
+        """A document's duplicate chunks as (chunk_id, text, metadata)."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT chunk_id, text, metadata FROM duplicates WHERE doc_id = ?", (doc_id,)).fetchall()
+        return [(chunk_id, text, json.loads(metadata)) for chunk_id, text, metadata in rows]
+
+    def links(self, doc_ids: List[str]) -> List[Tuple[str, str, str, str, Dict[str, Any]]]:
+        """
+        The duplicate chunks of these documents as (chunk_id, canonical_id,
+        canonical doc_id, text, metadata).
+        """
+        if not doc_ids:
+            return []
+        marks = ",".join("?" * len(doc_ids))
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT d.chunk_id, d.canonical_id, c.doc_id, d.text, d.metadata FROM duplicates d "
+                f"JOIN canonical c ON c.chunk_id = d.canonical_id WHERE d.doc_id IN ({marks})",
+                list(doc_ids),
+            ).fetchall()
+        return [(cid, canonical_id, doc_id, text, json.loads(meta)) for cid, canonical_id, doc_id, text, meta in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._connect() as conn:
+            canonical = conn.execute("SELECT COUNT(*) FROM canonical").fetchone()[0]
+            duplicates = conn.execute("SELECT COUNT(*) FROM duplicates").fetchone()[0]
+        seen = self._counts["chunks"]
+        return {
+            "canonical_chunks": canonical,
+            "duplicate_chunks": duplicates,
+            "index_reduction": round(duplicates / (canonical + duplicates), 4) if canonical + duplicates else 0.0,
+            "chunks_checked": seen,
+            "duplicates_found": self._counts["duplicates"],
+            "embedding_tokens_skipped": self._counts["tokens_skipped"],
+        }
+
+
+class RepeatedLineStripper:
+    """
+    Removes running headers and footers from pages as they stream by: lines
+    among the first and last `edge_lines` of a page that, with digits masked
+    (so "Page 3" matches "Page 4"), recur at the same position on at least
+    `min_share` of the pages seen and on at least `min_pages` pages. The first `warmup` pages are held
+    back until there is enough evidence; later pages are judged on arrival.
+    """
+
+    def __init__(self, edge_lines: int = 2, min_pages: int = 3, min_share: float = 0.5, warmup: int = 8):
+        self.edge_lines = edge_lines
+        self.min_pages = min_pages
+        self.min_share = min_share
+        self.warmup = warmup
+        self.lines_stripped = 0
+        self._counts = Counter()
+        self._pages_seen = 0
+        self._held: List[str] = []
+
+    @staticmethod
+    def _key(line: str) -> str:
+        return re.sub(r"\d+", "#", " ".join(line.lower().split()))
+
+    def _edges(self, lines: List[str]) -> set:
+        """(position, key) of the first and last `edge_lines` non-empty lines; positions from the bottom are negative."""
+        content = [line for line in lines if line.strip()]
+        top = content[:self.edge_lines]
+        bottom = content[len(top):][-self.edge_lines:]
+        return {(i, self._key(line)) for i, line in enumerate(top)} | {
+            (i - len(bottom), self._key(line)) for i, line in enumerate(bottom)
+        }
+
+    def _repeated(self, position: int, line: str) -> bool:
+        return self._counts[(position, self._key(line))] >= max(self.min_pages, self.min_share * self._pages_seen)
+
+    def _strip(self, page: str) -> str:
+        lines = page.splitlines()
+        content = [i for i, line in enumerate(lines) if line.strip()]
+        drop = set()
+        for position, i in enumerate(content[:self.edge_lines]):
+            if not self._repeated(position, lines[i]):
+                break
+            drop.add(i)
+        rest = content[self.edge_lines:]
+        for position, i in zip(range(-1, -self.edge_lines - 1, -1), reversed(rest[-self.edge_lines:])):
+            if not self._repeated(position, lines[i]):
+                break
+            drop.add(i)
+        self.lines_stripped += len(drop)
+        return "\n".join(line for i, line in enumerate(lines) if i not in drop)
+
+    def feed(self, page: str) -> List[str]:
+        """Adds the next page; returns the pages ready to index, stripped."""
+        self._pages_seen += 1
+        self._counts.update(self._edges(page.splitlines()))
+        self._held.append(page)
+        if self._pages_seen < self.warmup:
+            return []
+        held, self._held = self._held, []
+        return [self._strip(p) for p in held]
+
+    def finish(self) -> List[str]:
+        held, self._held = self._held, []
+        return [self._strip(p) for p in held]
@@ -0,0 +1,185 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+from app.core.config import settings
+
+
+class DocumentRegistry:
+    """
+    SQLite table of ingested documents. A document keeps its id across
+    replacements; `content_hash` identifies the file version currently indexed.
+
+    Filename, upload time and tags are indexed, so retrieval filters on them
+    (see `find`) resolve to document ids without scanning any chunks.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS documents (
+                    id TEXT PRIMARY KEY,
+                    filename TEXT NOT NULL,
+                    file_path TEXT NOT NULL,
+                    content_hash TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    chunk_count INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_hash ON documents (content_hash)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_filename ON documents (filename)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_created ON documents (created_at)")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS document_tags (
+                    doc_id TEXT NOT NULL,
+                    tag TEXT NOT NULL,
+                    PRIMARY KEY (doc_id, tag)
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_document_tags_tag ON document_tags (tag)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _with_tags(conn: sqlite3.Connection, rows: List[sqlite3.Row]) -> List[Dict[str, Any]]:
+        documents = [dict(row, tags=[]) for row in rows]
+        by_id = {document["id"]: document for document in documents}
+        for i in range(0, len(documents), 500):
+            ids = [document["id"] for document in documents[i:i + 500]]
+            marks = ",".join("?" * len(ids))
+            for doc_id, tag in conn.execute(
+                f"SELECT doc_id, tag FROM document_tags WHERE doc_id IN ({marks}) ORDER BY tag", ids
+            ):
+                by_id[doc_id]["tags"].append(tag)
+        return documents
+
+    def create(self, filename: str, file_path: str, content_hash: str, tags: Iterable[str] = ()) -> Dict[str, Any]:
+        now = time.time()
+        doc_id = uuid.uuid4().hex[:16]
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO documents (id, filename, file_path, content_hash, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (doc_id, filename, file_path, content_hash, "pending", now, now),
+            )
+        if tags:
+            self.set_tags(doc_id, tags)
+        return self.get(doc_id)
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM documents WHERE id = ?", (doc_id,)).fetchall()
+            documents = self._with_tags(conn, rows)
+        return documents[0] if documents else None
+
+    def find_by_hash(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM documents WHERE content_hash = ? ORDER BY created_at LIMIT 1", (content_hash,)
+            ).fetchall()
+            documents = self._with_tags(conn, rows)
+        return documents[0] if documents else None
+
+    def list(self) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM documents ORDER BY created_at").fetchall()
+            return self._with_tags(conn, rows)
+
+    def find(
+        self,
+        doc_ids: Optional[Iterable[str]] = None,
+        sources: Optional[Iterable[str]] = None,
+        tags: Optional[Iterable[str]] = None,
+        uploaded_after: Optional[float] = None,
+        uploaded_before: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Documents matching every given filter, oldest first.
+        :param sources: Filenames; a document matches any of them.
+        :param tags: A document matches if it has any of them.
+        :param uploaded_after: Unix time; compared with the first upload (`created_at`).
+        """
+        clauses, params = [], []
+        for column, values in (("id", doc_ids), ("filename", sources)):
+            if values is not None:
+                values = list(values)
+                clauses.append(f"{column} IN ({','.join('?' * len(values))})" if values else "0")
+                params += values
+        if tags is not None:
+            tags = [normalize_tag(tag) for tag in tags]
+            clauses.append(f"id IN (SELECT doc_id FROM document_tags WHERE tag IN ({','.join('?' * len(tags))}))" if tags else "0")
+            params += tags
+        if uploaded_after is not None:
+            clauses.append("created_at >= ?")
+            params.append(uploaded_after)
+        if uploaded_before is not None:
+            clauses.append("created_at < ?")
+            params.append(uploaded_before)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._connect() as conn:
+            rows = conn.execute(f"SELECT * FROM documents {where} ORDER BY created_at", params).fetchall()
+            return self._with_tags(conn, rows)
+
+    def named_in(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Documents whose filename, with or without extension, appears in the text
+        (case and punctuation ignored, so "bert_base.pdf" matches "BERT base"),
+        in order of first mention.
+        """
+        haystack = f" {_name_key(text)} "
+        found = []
+        for document in self.list():
+            stem = os.path.splitext(document["filename"])[0]
+            positions = [haystack.find(f" {key} ") for key in {_name_key(document["filename"]), _name_key(stem)} if key]
+            positions = [p for p in positions if p >= 0]
+            if positions:
+                found.append((min(positions), document))
+        return [document for _, document in sorted(found, key=lambda item: item[0])]
+
+    def set_tags(self, doc_id: str, tags: Iterable[str]):
+        """Replaces a document's tags."""
+        tags = sorted({normalize_tag(tag) for tag in tags} - {""})
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM document_tags WHERE doc_id = ?", (doc_id,))
+            conn.executemany("INSERT INTO document_tags (doc_id, tag) VALUES (?, ?)", [(doc_id, tag) for tag in tags])
+
+    def update(self, doc_id: str, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._connect() as conn:
+            conn.execute(f"UPDATE documents SET {assignments} WHERE id = ?", (*fields.values(), doc_id))
+
+    def delete(self, doc_id: str):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+            conn.execute("DELETE FROM document_tags WHERE doc_id = ?", (doc_id,))
+
+    def is_file_referenced(self, file_path: str) -> bool:
+        with self._connect() as conn:
+            row = conn.execute("SELECT 1 FROM documents WHERE file_path = ? LIMIT 1", (file_path,)).fetchone()
+        return row is not None
+
+
+def normalize_tag(tag: str) -> str:
+    return " ".join(tag.lower().split())
+
+
+def _name_key(text: str) -> str:
+    return " ".join(re.findall(r"[^\W_]+", text.lower()))
+
+
+document_registry = DocumentRegistry(os.path.join(settings.DATA_DIR, "documents.db"))
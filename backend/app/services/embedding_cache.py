@@ -0,0 +1,190 @@
+import hashlib
+import inspect
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Tuple
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from app.core.telemetry import span
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding store keyed by (model name, sha256 of the text).
+
+    Vectors are stored as float32 blobs in SQLite. Every hit bumps the entry's
+    access stamp; once the cache holds more than `max_entries` vectors the
+    least recently used ones are evicted.
+    """
+
+    def __init__(self, db_path: str, max_entries: int = 100_000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    model TEXT NOT NULL,
+                    text_hash TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_used INTEGER NOT NULL,
+                    PRIMARY KEY (model, text_hash)
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)")
+            self._clock = conn.execute("SELECT COALESCE(MAX(last_used), 0) FROM embeddings").fetchone()[0]
+            self._size = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _tick(self) -> int:
+        self._clock += 1
+        return self._clock
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock, self._connect() as conn:
+            # Stay well below SQLite's bound-parameter limit.
+            for i in range(0, len(unique), 500):
+                batch = unique[i:i + 500]
+                rows = conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                    (model, *batch),
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if found:
+                stamp = self._tick()
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(stamp, model, h) for h in found],
+                )
+            self.hits += sum(1 for h in hashes if h in found)
+            self.misses += sum(1 for h in hashes if h not in found)
+        return found
+
+    def put_many(self, model: str, items: Iterable[Tuple[str, List[float]]]):
+        with self._lock, self._connect() as conn:
+            stamp = self._tick()
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                [(model, h, np.asarray(v, dtype=np.float32).tobytes(), stamp) for h, v in items],
+            )
+            self._size += conn.total_changes - before
+            if self._size > self.max_entries:
+                excess = self._size - self.max_entries
+                conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN "
+                    "(SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                )
+                self._size -= excess
+                self.evictions += excess
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._size,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps any LangChain embeddings backend with an EmbeddingCache, so chunks
+    that were embedded before (re-uploads, re-indexing) cost no API calls.
+
+    :param gate: Optional AdmissionGate bounding the calls that reach the
+        backend; query embeddings are shed when its queue is full, document
+        batches wait for a slot.
+    :param flight: Optional SingleFlight coalescing identical concurrent
+        query embeddings into one call.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str, cache: EmbeddingCache, gate=None, flight=None):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.cache = cache
+        self.gate = gate
+        self.flight = flight
+
+    def _embed(self, namespace: str, texts: List[str], embed_fn) -> List[List[float]]:
+        hashes = [text_hash(t) for t in texts]
+        found = self.cache.get_many(namespace, hashes)
+        missing = {h: t for h, t in zip(hashes, texts) if h not in found}
+        if missing:
+            vectors = embed_fn(list(missing.values()))
+            computed = dict(zip(missing.keys(), vectors))
+            self.cache.put_many(namespace, computed.items())
+            found.update(computed)
+        return [found[h] for h in hashes]
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        if self.gate is None:
+            return self.embeddings.embed_documents(texts)
+        self.gate.acquire(shed=False)
+        try:
+            return self.embeddings.embed_documents(texts)
+        finally:
+            self.gate.release()
+
+    def _embed_one(self, text: str) -> List[float]:
+        if self.gate is None:
+            return self.embeddings.embed_query(text)
+        with self.gate:
+            return self.embeddings.embed_query(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with span("embed"):
+            return self._embed(self.model_name, texts, self._embed_batch)
+
+    def _embed_queries(self, texts: List[str]) -> List[List[float]]:
+        # Task-typed backends (Gemini) embed a batch of queries in one call; others one at a time.
+        if "task_type" in inspect.signature(self.embeddings.embed_documents).parameters:
+            embed = lambda: self.embeddings.embed_documents(texts, task_type="RETRIEVAL_QUERY")
+        else:
+            embed = lambda: [self.embeddings.embed_query(text) for text in texts]
+        if self.gate is None:
+            return embed()
+        self.gate.acquire(shed=False)
+        try:
+            return embed()
+        finally:
+            self.gate.release()
+
+    def embed_query(self, text: str) -> List[float]:
+        # Query and document embeddings differ for task-typed models, so cache them apart.
+        namespace = self.query_namespace
+
+        def embed(texts: List[str]) -> List[List[float]]:
+            if self.flight is None:
+                return [self._embed_one(texts[0])]
+            return [self.flight.call((namespace, texts[0]), lambda: self._embed_one(texts[0]))]
+
+        with span("embed"):
+            return self._embed(namespace, [text], embed)[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Embeds many queries at once: cached ones are looked up, the rest go out as one batch."""
+        with span("embed"):
+            return self._embed(self.query_namespace, texts, self._embed_queries)
+
+    @property
+    def query_namespace(self) -> str:
+        return f"{self.model_name}#query"
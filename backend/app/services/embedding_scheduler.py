@@ -0,0 +1,161 @@
+import random
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional, Sequence, TypeVar
+from app.core.config import settings
+
+T = TypeVar("T")
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    message = str(error)
+    return "429" in message or "quota" in message.lower() or "resource exhausted" in message.lower()
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English prose; good enough for budgeting.
+    return max(1, len(text) // 4)
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled at `rate_per_minute`.
+
+    The effective rate can be lowered after a 429 (`throttle`) and creeps back
+    to the configured rate as requests succeed (`recover`).
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: float = None, clock=time.monotonic, sleep=time.sleep):
+        self.max_rate = rate_per_minute / 60.0
+        self.rate = self.max_rate
+        self.capacity = capacity or max(1.0, rate_per_minute / 6.0)  # at most a 10s burst
+        self.tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, amount: float = 1.0):
+        # A single request larger than the bucket is let through once the bucket is full.
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait_for = (amount - self.tokens) / self.rate
+            self._sleep(wait_for)
+
+    def throttle(self, factor: float = 0.5, floor: float = 0.05):
+        with self._lock:
+            self.rate = max(self.max_rate * floor, self.rate * factor)
+            self.tokens = 0.0
+
+    def recover(self, factor: float = 1.1):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate * factor)
+
+
+class EmbeddingScheduler:
+    """
+    Feeds items to an embedding handler in batches, as fast as the quota allows.
+
+    Requests and tokens per minute are limited by token buckets, up to
+    `max_in_flight` batches run in parallel, and 429/quota errors are retried
+    with exponential backoff (the shared rate is halved on each one).
+    """
+
+    def __init__(
+        self,
+        batch_size: int = None,
+        requests_per_minute: float = None,
+        tokens_per_minute: float = None,
+        max_in_flight: int = None,
+        max_retries: int = None,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        sleep=time.sleep,
+    ):
+        self.batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        self.max_in_flight = max_in_flight or settings.EMBEDDING_MAX_IN_FLIGHT
+        self.max_retries = settings.EMBEDDING_MAX_RETRIES if max_retries is None else max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+        self.requests = TokenBucket(requests_per_minute or settings.EMBEDDING_REQUESTS_PER_MINUTE, sleep=sleep)
+        self.tokens = TokenBucket(tokens_per_minute or settings.EMBEDDING_TOKENS_PER_MINUTE, sleep=sleep)
+        self.rate_limited = 0
+        self.retries = 0
+
+    def batches(self, items: Sequence[T]) -> List[List[T]]:
+        return [list(items[i:i + self.batch_size]) for i in range(0, len(items), self.batch_size)]
+
+    def _run_batch(self, batch: List[T], handler: Callable[[List[T]], None], cost: Callable[[T], int]):
+        attempt = 0
+        while True:
+            self.requests.acquire()
+            self.tokens.acquire(sum(cost(item) for item in batch))
+            try:
+                handler(batch)
+                self.requests.recover()
+                return
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    raise
+                self.rate_limited += 1
+                self.retries += 1
+                self.requests.throttle()
+                delay = min(self.max_delay, self.base_delay * 2 ** attempt)
+                self._sleep(delay * random.uniform(0.5, 1.0))
+                attempt += 1
+
+    def run(
+        self,
+        items: Sequence[T],
+        handler: Callable[[List[T]], None],
+        cost: Callable[[T], int] = lambda item: 1,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> int:
+        """
+        Passes every batch of `items` to `handler` and returns the number of
+        batches run. Raises the first non-retryable error (or a 429 that
+        outlived its retries) once the in-flight batches have settled.
+        :param progress: Called with (items_done, items_total) after each batch.
+        """
+        batches = self.batches(items)
+        items_done = 0
+        lock = threading.Lock()
+
+        def run_one(index: int):
+            nonlocal items_done
+            self._run_batch(batches[index], handler, cost)
+            with lock:
+                items_done += len(batches[index])
+                if progress:
+                    progress(items_done, len(items))
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            futures = [executor.submit(run_one, i) for i in range(len(batches))]
+            finished, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+            for future in not_done:
+                future.cancel()
+        for future in futures:
+            if not future.cancelled() and future.exception():
+                raise future.exception()
+        return len(batches)
+
+    def stats(self) -> dict:
+        return {
+            "batch_size": self.batch_size,
+            "max_in_flight": self.max_in_flight,
+            "requests_per_minute": round(self.requests.rate * 60, 1),
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+        }
@@ -0,0 +1,289 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+import unicodedata
+from collections import Counter, deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import islice
+from typing import AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.telemetry import metrics, span
+from app.services.extraction_cache import ExtractionCache, file_sha256
+
+logger = logging.getLogger(__name__)
+
+# "auto": pypdf first, pdfplumber for the pages that fail `text_looks_wrong`.
+EXTRACTION_BACKENDS = ("auto", "pypdf", "pdfplumber")
+
+
+def count_pages(file_path: str) -> int:
+    try:
+        from pypdf import PdfReader
+
+        return len(PdfReader(file_path).pages)
+    except Exception:
+        import pdfplumber
+        with pdfplumber.open(file_path) as pdf:
+            return len(pdf.pages)
+
+
+def text_looks_wrong(text: Optional[str]) -> bool:
+    """
+    Quality check for fast-path page text: empty, garbled (replacement,
+    control or private-use characters, or few letters), words run together
+    (missing spaces) or mostly one- and two-character lines, which is what a
+    broken reading order across columns tends to produce.
+    """
+    stripped = (text or "").strip()
+    if not stripped:
+        return True
+    chars = [c for c in stripped if not c.isspace()]
+    odd = sum(1 for c in chars if c == "\ufffd" or unicodedata.category(c) in ("Cc", "Co", "Cn"))
+    if odd > 0.02 * len(chars):
+        return True
+    if len(chars) >= 40 and sum(c.isalpha() for c in chars) < 0.4 * len(chars):
+        return True
+    words = stripped.split()
+    if len(chars) / len(words) > 15:
+        return True
+    lines = [line.strip() for line in stripped.splitlines() if line.strip()]
+    return len(lines) >= 10 and sum(len(line) <= 2 for line in lines) > 0.3 * len(lines)
+
+
+def extract_range_with_stats(
+    file_path: str, start: int = 0, end: Optional[int] = None, backend: str = "auto"
+) -> Tuple[List[str], Dict[str, float]]:
+    """
+    Extracts the text of pages [start, end) with `backend` and returns
+    (texts, stats): pages and seconds per backend and pages re-extracted by
+    the fallback. Runs inside a worker process, so it must stay a picklable
+    module-level function.
+    """
+    if backend not in EXTRACTION_BACKENDS:
+        raise ValueError(f"Unknown extraction backend '{backend}'")
+    stats = Counter()
+    texts: List[Optional[str]] = []
+    if backend != "pdfplumber":
+        began = time.perf_counter()
+        try:
+            from pypdf import PdfReader
+
+            pages = PdfReader(file_path).pages
+            for i in range(start, len(pages) if end is None else end):
+                try:
+                    texts.append(pages[i].extract_text() or "")
+                except Exception:
+                    texts.append(None)
+        except Exception as e:
+            if backend == "pypdf":
+                raise
+            logger.warning("pypdf could not read %s, using pdfplumber: %s", file_path, e)
+        stats["pypdf_pages"] += len(texts)
+        stats["pypdf_seconds"] += time.perf_counter() - began
+        if backend == "pypdf":
+            return [text or "" for text in texts], dict(stats)
+
+    retry = [i for i, text in enumerate(texts) if text_looks_wrong(text)] if texts else None
+    if retry is None or retry:
+        import pdfplumber
+
+        began = time.perf_counter()
+        with pdfplumber.open(file_path) as pdf:
+            if retry is None:
+                texts = [page.extract_text() or "" for page in pdf.pages[start:end]]
+                stats["pdfplumber_pages"] += len(texts)
+            else:
+                for i in retry:
+                    texts[i] = pdf.pages[start + i].extract_text() or ""
+                stats["pdfplumber_pages"] += len(retry)
+                stats["fallback_pages"] += len(retry)
+        stats["pdfplumber_seconds"] += time.perf_counter() - began
+    return [text or "" for text in texts], dict(stats)
+
+
+def extract_page_range(file_path: str, start: int = 0, end: Optional[int] = None, backend: str = None) -> List[str]:
+    """Extracts the text of pages [start, end), or to the last page when end is None."""
+    return extract_range_with_stats(file_path, start, end, backend or settings.EXTRACTION_BACKEND)[0]
+
+
+def split_pages(num_pages: int, pages_per_task: int) -> List[Tuple[int, int]]:
+    pages_per_task = max(1, pages_per_task)
+    return [(start, min(start + pages_per_task, num_pages)) for start in range(0, num_pages, pages_per_task)]
+
+
+class ExtractionPool:
+    """
+    Runs CPU-bound PDF extraction in a process pool so it never blocks the event loop.
+
+    Large PDFs are split into page ranges that are extracted in parallel and
+    reassembled in page order. At most `max_workers + max_queue` ranges are
+    outstanding at once; further submissions wait for a free slot.
+
+    With a `cache`, extracted pages are stored under the file's content hash
+    and identical files are served from it instead of being extracted again.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = None,
+        max_queue: int = None,
+        pages_per_task: int = None,
+        backend: str = None,
+        cache: Optional[ExtractionCache] = None,
+    ):
+        self.max_workers = settings.EXTRACTION_WORKERS if max_workers is None else max_workers
+        self.max_queue = settings.EXTRACTION_QUEUE_SIZE if max_queue is None else max_queue
+        self.pages_per_task = pages_per_task or settings.EXTRACTION_PAGES_PER_TASK
+        self.backend = backend or settings.EXTRACTION_BACKEND
+        if self.backend not in EXTRACTION_BACKENDS:
+            raise ValueError(f"Unknown extraction backend '{self.backend}'")
+        self.cache = cache
+        self._counts = Counter()
+        self._executor: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._slots_loop = None
+
+    def _get_executor(self) -> Optional[Executor]:
+        if self._executor is None and self.max_workers > 0:
+            try:
+                # spawn: forking a process that already runs uvicorn threads is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            except (OSError, NotImplementedError) as e:
+                # e.g. serverless runtimes without /dev/shm semaphores
+                logger.warning("Process pool unavailable, extracting in threads: %s", e)
+                self.max_workers = 0
+        return self._executor
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(max(1, self.max_workers) + self.max_queue)
+            self._slots_loop = loop
+        return self._slots
+
+    async def _submit(self, fn, *args):
+        async with self._get_slots():
+            executor = self._get_executor()
+            if executor is None:
+                return await asyncio.to_thread(fn, *args)
+            return await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+
+    async def _extract_range(self, file_path: str, start: int, end: int) -> List[str]:
+        with span("extract"):
+            texts, stats = await self._submit(extract_range_with_stats, file_path, start, end, self.backend)
+        self._counts.update(stats)
+        metrics.inc("researchmate_ingested_pages_total", len(texts))
+        return texts
+
+    async def extract_pages(
+        self,
+        file_path: str,
+        progress: Optional[Callable[[int, int], None]] = None,
+        content_hash: str = None,
+    ) -> List[str]:
+        """
+        Returns the text of every page, in page order.
+        :param progress: Called with (pages_done, pages_total) as page ranges finish.
+        """
+        # Every range may run at once; the pool's slots are the only limit.
+        lookahead = max(1, self.max_workers) + self.max_queue
+        return [text async for text in self.iter_pages(file_path, progress, lookahead, content_hash)]
+
+    async def iter_pages(
+        self,
+        file_path: str,
+        progress: Optional[Callable[[int, int], None]] = None,
+        lookahead: int = None,
+        content_hash: str = None,
+    ) -> AsyncIterator[str]:
+        """
+        Yields the text of every page, in page order, as page ranges finish.
+        At most `lookahead` ranges (default: workers + 1) are extracted ahead of
+        the consumer, so memory stays bounded however long the PDF is.
+        :param progress: Called with (pages_done, pages_total) as page ranges finish.
+        :param content_hash: sha256 of the file, if known; the cache key (hashed here otherwise).
+        """
+        if self.cache is not None:
+            content_hash = content_hash or await asyncio.to_thread(file_sha256, file_path)
+            num_pages = await asyncio.to_thread(self.cache.lookup, content_hash, self.backend)
+            if num_pages is not None:
+                for start, end in split_pages(num_pages, self.pages_per_task):
+                    texts = await asyncio.to_thread(self.cache.get_pages, content_hash, self.backend, start, end)
+                    if progress:
+                        progress(end, num_pages)
+                    for text in texts:
+                        yield text
+                return
+
+        num_pages = await self._submit(count_pages, file_path)
+        ranges = iter(split_pages(num_pages, self.pages_per_task))
+        lookahead = lookahead or max(1, self.max_workers) + 1
+        tasks: Deque[Tuple[int, asyncio.Future]] = deque()
+        done = 0
+
+        def schedule():
+            for start, end in islice(ranges, lookahead - len(tasks)):
+                tasks.append((start, asyncio.ensure_future(self._extract_range(file_path, start, end))))
+
+        try:
+            schedule()
+            while tasks:
+                start, task = tasks.popleft()
+                texts = await task
+                done += len(texts)
+                if progress:
+                    progress(done, num_pages)
+                schedule()
+                if self.cache is not None:
+                    await asyncio.to_thread(self.cache.put_pages, content_hash, self.backend, start, texts)
+                for text in texts:
+                    yield text
+        finally:
+            for _, task in tasks:
+                task.cancel()
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.complete, content_hash, self.backend, num_pages)
+
+    async def extract_text(
+        self,
+        file_path: str,
+        progress: Optional[Callable[[int, int], None]] = None,
+        content_hash: str = None,
+    ) -> str:
+        pages = await self.extract_pages(file_path, progress, content_hash)
+        return "\n".join(text for text in pages if text)
+
+    def stats(self) -> Dict[str, object]:
+        counts = self._counts
+        backends = {}
+        for name in ("pypdf", "pdfplumber"):
+            pages, seconds = counts[f"{name}_pages"], counts[f"{name}_seconds"]
+            backends[name] = {
+                "pages": pages,
+                "seconds": round(seconds, 3),
+                "pages_per_second": round(pages / seconds, 1) if seconds else 0.0,
+            }
+        return {
+            "backend": self.backend,
+            **backends,
+            "fallback_pages": counts["fallback_pages"],
+            "fallback_rate": round(counts["fallback_pages"] / counts["pypdf_pages"], 4) if counts["pypdf_pages"] else 0.0,
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+extraction_pool = ExtractionPool(
+    cache=ExtractionCache(
+        os.path.join(settings.DATA_DIR, "extraction_cache.db"), max_documents=settings.EXTRACTION_CACHE_SIZE
+    )
+)
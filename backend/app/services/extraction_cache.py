@@ -0,0 +1,127 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+
+def file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Persistent extracted page text keyed by (sha256 of the PDF file, backend),
+    so identical files are never extracted twice.
+
+    Pages are stored as ranges finish; a document is served from the cache
+    only once `complete` recorded its page count. Every hit bumps the
+    document's access stamp; beyond `max_documents` the least recently used
+    documents are evicted with their pages.
+    """
+
+    def __init__(self, db_path: str, max_documents: int = 1000):
+        self.db_path = db_path
+        self.max_documents = max_documents
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS documents (
+                    content_hash TEXT NOT NULL,
+                    backend TEXT NOT NULL,
+                    num_pages INTEGER NOT NULL,
+                    last_used INTEGER NOT NULL,
+                    PRIMARY KEY (content_hash, backend)
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pages (
+                    content_hash TEXT NOT NULL,
+                    backend TEXT NOT NULL,
+                    page INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    PRIMARY KEY (content_hash, backend, page)
+                )
+                """
+            )
+            self._clock = conn.execute("SELECT COALESCE(MAX(last_used), 0) FROM documents").fetchone()[0]
+            self._size = conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def lookup(self, content_hash: str, backend: str) -> Optional[int]:
+        """Page count of a fully cached document (counted as a hit), or None (a miss)."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute(
+                "SELECT num_pages FROM documents WHERE content_hash = ? AND backend = ?", (content_hash, backend)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._clock += 1
+            conn.execute(
+                "UPDATE documents SET last_used = ? WHERE content_hash = ? AND backend = ?",
+                (self._clock, content_hash, backend),
+            )
+            self.hits += 1
+            return row[0]
+
+    def get_pages(self, content_hash: str, backend: str, start: int, end: int) -> List[str]:
+        """Text of pages [start, end) of a cached document."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT page, text FROM pages WHERE content_hash = ? AND backend = ? AND page >= ? AND page < ?",
+                (content_hash, backend, start, end),
+            ).fetchall()
+        texts = dict(rows)
+        return [texts.get(page, "") for page in range(start, end)]
+
+    def put_pages(self, content_hash: str, backend: str, start: int, texts: List[str]):
+        with self._lock, self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO pages (content_hash, backend, page, text) VALUES (?, ?, ?, ?)",
+                [(content_hash, backend, start + i, text) for i, text in enumerate(texts)],
+            )
+
+    def complete(self, content_hash: str, backend: str, num_pages: int):
+        """Marks a document whose pages are all stored; evicts the least recently used beyond the limit."""
+        with self._lock, self._connect() as conn:
+            self._clock += 1
+            before = conn.total_changes
+            conn.execute(
+                "INSERT OR IGNORE INTO documents (content_hash, backend, num_pages, last_used) VALUES (?, ?, ?, ?)",
+                (content_hash, backend, num_pages, self._clock),
+            )
+            self._size += conn.total_changes - before
+            if self._size > self.max_documents:
+                excess = self._size - self.max_documents
+                stale = conn.execute(
+                    "SELECT content_hash, backend FROM documents ORDER BY last_used LIMIT ?", (excess,)
+                ).fetchall()
+                conn.executemany("DELETE FROM documents WHERE content_hash = ? AND backend = ?", stale)
+                conn.executemany("DELETE FROM pages WHERE content_hash = ? AND backend = ?", stale)
+                self._size -= len(stale)
+                self.evictions += len(stale)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "documents": self._size,
+            "max_documents": self.max_documents,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
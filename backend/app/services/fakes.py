@@ -0,0 +1,194 @@
+"""
+Deterministic local stand-ins for the Google APIs, for tests and benchmarks.
+"""
+import asyncio
+import hashlib
+import math
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeRateLimitError(Exception):
+    def __init__(self):
+        super().__init__("429 Resource has been exhausted (e.g. check quota).")
+
+
+class FakeServiceError(Exception):
+    def __init__(self):
+        super().__init__("500 An internal error has occurred.")
+
+
+def inject_fault(seed: int, call: int, error_rate: float, rate_limit_rate: float):
+    """
+    Raises a 429 or a 500 for a deterministic share of calls: the outcome of
+    call number `call` depends only on (seed, call), not on timing or threads.
+    """
+    if not (error_rate or rate_limit_rate):
+        return
+    digest = hashlib.md5(f"{seed}:{call}".encode("utf-8")).digest()
+    roll = int.from_bytes(digest[:8], "little") / 2 ** 64
+    if roll < rate_limit_rate:
+        raise FakeRateLimitError()
+    if roll < rate_limit_rate + error_rate:
+        raise FakeServiceError()
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Hashed bag-of-words embeddings: texts that share words get similar
+    vectors, so retrieval results are meaningful without an API.
+
+    :param latency: Seconds slept per call.
+    :param requests_per_minute: Raise a 429 when more calls than this land
+        within `window` seconds, like a real quota.
+    :param fail_first: Raise a 429 on the first N calls.
+    :param error_rate: Share of calls raising a 500, chosen by `seed`.
+    :param rate_limit_rate: Share of calls raising a 429, chosen by `seed`.
+    """
+
+    def __init__(
+        self,
+        dim: int = 64,
+        latency: float = 0.0,
+        requests_per_minute: int = 0,
+        window: float = 60.0,
+        fail_first: int = 0,
+        model: str = "fake-embedding",
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.dim = dim
+        self.latency = latency
+        self.requests_per_minute = requests_per_minute
+        self.window = window
+        self.fail_first = fail_first
+        self.model = model
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.seed = seed
+        self.calls = 0
+        self.rate_limited = 0
+        self.texts_embedded = 0
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def _admit(self):
+        with self._lock:
+            self.calls += 1
+            now = time.monotonic()
+            while self._recent and now - self._recent[0] > self.window:
+                self._recent.popleft()
+            over_quota = self.requests_per_minute and len(self._recent) >= self.requests_per_minute
+            if self.calls <= self.fail_first or over_quota:
+                self.rate_limited += 1
+                raise FakeRateLimitError()
+            try:
+                inject_fault(self.seed, self.calls, self.error_rate, self.rate_limit_rate)
+            except FakeRateLimitError:
+                self.rate_limited += 1
+                raise
+            self._recent.append(now)
+
+    def _vector(self, text: str) -> List[float]:
+        vector = [0.0] * self.dim
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str], task_type: Optional[str] = None) -> List[List[float]]:
+        # `task_type` mirrors the Gemini client's signature; the fake embeds queries and documents alike.
+        self._admit()
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.texts_embedded += len(texts)
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that answers with `tokens` numbered words, after waiting
+    `first_token_latency` seconds and then `token_latency` per token, like a
+    streaming LLM. Supports invoke/ainvoke and stream/astream.
+
+    `error_rate` / `rate_limit_rate` make that share of calls raise a 500 /
+    429 before answering, chosen deterministically by `seed`. With
+    `max_concurrent` set, an invoke made while that many are already being
+    answered raises a 429, like a provider's concurrency quota.
+    """
+
+    tokens: int = 50
+    first_token_latency: float = 0.0
+    token_latency: float = 0.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    seed: int = 0
+    max_concurrent: int = 0
+    calls: int = 0
+    in_flight: int = 0
+    rate_limited: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _pieces(self, messages: List[BaseMessage]) -> List[str]:
+        self.calls += 1
+        inject_fault(self.seed, self.calls, self.error_rate, self.rate_limit_rate)
+        if self.max_concurrent and self.in_flight >= self.max_concurrent:
+            self.rate_limited += 1
+            raise FakeRateLimitError()
+        prompt_words = len(str(messages[-1].content).split()) if messages else 0
+        return [f"Answer({prompt_words} prompt words)"] + [f" token{i}" for i in range(1, self.tokens)]
+
+    def _generate(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any
+    ) -> ChatResult:
+        pieces = self._pieces(messages)
+        self.in_flight += 1
+        try:
+            time.sleep(self.first_token_latency + self.token_latency * len(pieces))
+        finally:
+            self.in_flight -= 1
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(pieces)))])
+
+    async def _agenerate(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any
+    ) -> ChatResult:
+        pieces = self._pieces(messages)
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(self.first_token_latency + self.token_latency * len(pieces))
+        finally:
+            self.in_flight -= 1
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(pieces)))])
+
+    def _stream(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_latency)
+        for piece in self._pieces(messages):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            time.sleep(self.token_latency)
+
+    async def _astream(
+        self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs: Any
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.first_token_latency)
+        for piece in self._pieces(messages):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            await asyncio.sleep(self.token_latency)
@@ -1,67 +1,228 @@
+import asyncio
+import hashlib
+import logging
 import os
-import shutil
-from typing import List
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
 from fastapi import UploadFile
-import pdfplumber
 from app.core.config import settings
+from app.core.telemetry import metrics
+from app.services.dedup import RepeatedLineStripper
+from app.services.documents import document_registry
+from app.services.extraction import extract_page_range, extraction_pool
+
+logger = logging.getLogger(__name__)
 
 class IngestionService:
-    def __init__(self):
+    def __init__(self, registry=None):
         self.upload_dir = os.path.join(settings.DATA_DIR, "uploads")
         os.makedirs(self.upload_dir, exist_ok=True)
+        self.registry = registry or document_registry
+
+    async def save_upload(self, file: UploadFile) -> Tuple[str, str]:
+        """
+        Stores the upload under a content-addressed name, so files that share
+        a name never overwrite each other. Returns (file_path, content_hash).
+        """
+        digest = hashlib.sha256()
+        tmp_path = os.path.join(self.upload_dir, f".incoming-{os.getpid()}-{id(file)}")
+        with open(tmp_path, "wb") as buffer:
+            while chunk := file.file.read(1024 * 1024):
+                digest.update(chunk)
+                buffer.write(chunk)
+        content_hash = digest.hexdigest()
+        metrics.inc("researchmate_ingested_bytes_total", os.path.getsize(tmp_path))
+        file_path = os.path.join(self.upload_dir, f"{content_hash[:16]}_{os.path.basename(file.filename)}")
+        os.replace(tmp_path, file_path)
+        return file_path, content_hash
+
+    async def register_upload(self, file: UploadFile, tags: Iterable[str] = ()) -> Dict[str, Any]:
+        """
+        Saves an upload and returns its document; identical content maps to the existing document.
+        :param tags: Added to the document's tags.
+        """
+        file_path, content_hash = await self.save_upload(file)
+        document = self.registry.find_by_hash(content_hash)
+        if document is None:
+            return self.registry.create(file.filename, file_path, content_hash, tags=tags)
+        if set(tags) - set(document["tags"]):
+            self.registry.set_tags(document["id"], [*document["tags"], *tags])
+            document = self.registry.get(document["id"])
+        return document
 
-    async def save_upload(self, file: UploadFile) -> str:
-        file_path = os.path.join(self.upload_dir, file.filename)
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        return file_path
+    async def replace_document(self, doc_id: str, file: UploadFile) -> Optional[Dict[str, Any]]:
+        """Points an existing document at a new file version; re-indexing drops the stale chunks."""
+        document = self.registry.get(doc_id)
+        if document is None:
+            return None
+        file_path, content_hash = await self.save_upload(file)
+        self.registry.update(
+            doc_id, filename=file.filename, file_path=file_path, content_hash=content_hash, status="pending"
+        )
+        if document["file_path"] != file_path:
+            self._remove_unreferenced(document["file_path"])
+        if document["content_hash"] != content_hash:
+            from app.services.summaries import document_summarizer
+
+            document_summarizer.forget(doc_id)
+        return self.registry.get(doc_id)
+
+    async def delete_document(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        document = self.registry.get(doc_id)
+        if document is None:
+            return None
+        from app.services.rag import rag_service
+        from app.services.summaries import document_summarizer
+
+        removed = await asyncio.to_thread(rag_service.delete_document, doc_id)
+        document_summarizer.forget(doc_id)
+        self.registry.delete(doc_id)
+        self._remove_unreferenced(document["file_path"])
+        return {"doc_id": doc_id, "filename": document["filename"], "chunks_removed": removed}
+
+    def _remove_unreferenced(self, file_path: str):
+        if not self.registry.is_file_referenced(file_path) and os.path.exists(file_path):
+            os.remove(file_path)
 
     def extract_text(self, file_path: str) -> str:
-        text_content = []
+        """
+        Extracts text in the calling thread. Async callers should use
+        `aextract_text`, which keeps the event loop free.
+        """
         try:
-            with pdfplumber.open(file_path) as pdf:
-                for page in pdf.pages:
-                    text = page.extract_text()
-                    if text:
-                        text_content.append(text)
+            pages = extract_page_range(file_path)
         except Exception as e:
-            print(f"Error extracting text from {file_path}: {e}")
+            logger.exception("Error extracting text from %s", file_path)
             return ""
-        
-        return "\n".join(text_content)
 
-    async def process_document(self, file: UploadFile):
-        # 1. Save file
-        file_path = await self.save_upload(file)
-        
-        # 2. Extract text
-        text = self.extract_text(file_path)
-        
-        # 3. Chunking and Embedding (RAG)
+        return "\n".join(text for text in pages if text)
+
+    async def aextract_text(self, file_path: str, progress: Optional[Callable[[int, int], None]] = None) -> str:
+        try:
+            return await extraction_pool.extract_text(file_path, progress)
+        except Exception as e:
+            logger.exception("Error extracting text from %s", file_path)
+            return ""
+
+    def index_text(
+        self,
+        text: str,
+        doc_id: str,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> dict:
+        """
+        Chunks and upserts extracted text for a registered document.
+        Blocking; run it in a worker thread.
+        """
         from app.services.rag import rag_service
-        from fastapi import HTTPException
-        
+
+        document = self._get_document(doc_id)
+        counts = {"chunks": 0, "added": 0, "removed": 0, "duplicates": 0}
         try:
-            rag_service.add_document(text, {"source": file.filename, "file_path": file_path})
+            counts = rag_service.add_document(text, self._chunk_metadata(document), progress=progress)
             status = "ingested_and_indexed"
         except Exception as e:
-            error_msg = str(e)
-            if "429" in error_msg or "quota" in error_msg.lower():
-                print(f"Quota exceeded during indexing: {e}")
-                status = "ingested_only_quota_exceeded"
-                # We don't raise an error here to allow the file to be saved/extracted
-                # even if indexing fails. The user will be notified via status.
-            else:
-                print(f"Error during indexing: {e}")
-                status = "ingested_only_indexing_failed"
+            status = self._failure_status(e)
+        return self._finish(document, status, counts, len(text), text[:500] if text else "")
 
+    async def index_file(
+        self,
+        doc_id: str,
+        page_progress: Optional[Callable[[int, int], None]] = None,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> dict:
+        """
+        Extracts, chunks and embeds a registered document page by page: each
+        page is chunked as soon as it is extracted and chunks are indexed in
+        batches, so memory stays bounded and the first pages are searchable
+        while the rest are still being read. Running headers and footers
+        (lines repeated at the top or bottom of most pages) are stripped first.
+        :param page_progress: Called with (pages_done, pages_total).
+        :param progress: Called with (chunks_indexed, chunks_seen_so_far).
+        """
+        from app.services.rag import rag_service
+
+        document = self._get_document(doc_id)
+        counts = {"chunks": 0, "added": 0, "removed": 0, "duplicates": 0}
+        text_length, preview = 0, ""
+        stripper = RepeatedLineStripper()
+
+        async def add_pages(batch):
+            nonlocal text_length, preview
+            for page in batch:
+                if page:
+                    if len(preview) < 500:
+                        preview = (preview + "\n" + page if text_length else page)[:500]
+                    text_length += len(page) + (1 if text_length else 0)
+                await asyncio.to_thread(indexer.add_text, page)
+
+        try:
+            indexer = rag_service.open_document(self._chunk_metadata(document), progress)
+            pages = extraction_pool.iter_pages(
+                document["file_path"], page_progress, content_hash=document["content_hash"]
+            )
+            async for page in pages:
+                await add_pages(stripper.feed(page))
+            await add_pages(stripper.finish())
+            counts = await asyncio.to_thread(indexer.close)
+            status = "ingested_and_indexed"
+        except Exception as e:
+            status = self._failure_status(e)
+        result = self._finish(document, status, counts, text_length, preview)
+        result["header_lines_stripped"] = stripper.lines_stripped
+        return result
+
+    def _get_document(self, doc_id: str) -> Dict[str, Any]:
+        document = self.registry.get(doc_id)
+        if document is None:
+            raise ValueError(f"Document {doc_id} no longer exists")
+        return document
+
+    @staticmethod
+    def _chunk_metadata(document: Dict[str, Any]) -> Dict[str, Any]:
         return {
-            "filename": file.filename,
-            "file_path": file_path,
-            "text_length": len(text),
-            "preview": text[:500] if text else "",
+            "source": document["filename"],
+            "file_path": document["file_path"],
+            "doc_id": document["id"],
+            "content_hash": document["content_hash"],
+        }
+
+    @staticmethod
+    def _failure_status(e: Exception) -> str:
+        error_msg = str(e)
+        if "429" in error_msg or "quota" in error_msg.lower():
+            logger.warning("Quota exceeded during indexing: %s", e)
+            metrics.inc("researchmate_quota_errors_total", source="ingestion")
+            # We don't raise an error here to allow the file to be saved/extracted
+            # even if indexing fails. The user will be notified via status.
+            return "ingested_only_quota_exceeded"
+        logger.error("Error during indexing: %s", e, exc_info=e)
+        return "ingested_only_indexing_failed"
+
+    def _finish(self, document: Dict[str, Any], status: str, counts: dict, text_length: int, preview: str) -> dict:
+        self.registry.update(document["id"], status=status, chunk_count=counts["chunks"])
+        return {
+            "doc_id": document["id"],
+            "filename": document["filename"],
+            "file_path": document["file_path"],
+            "text_length": text_length,
+            "preview": preview,
             "status": status,
+            "chunks": counts["chunks"],
+            "chunks_added": counts["added"],
+            "chunks_removed": counts["removed"],
+            "chunks_duplicate": counts.get("duplicates", 0),
             "warning": "Indexing failed due to API quota. Search may not work for this document." if "quota" in status else None
         }
 
+    async def process_document(self, file: UploadFile):
+        """
+        Runs the whole pipeline inline. The upload endpoint queues a job instead
+        (see app.services.jobs), which runs the same stages in the background.
+        """
+        # 1. Save file
+        document = await self.register_upload(file)
+
+        # 2. Extract (process pool, off the event loop), chunk and embed page by page
+        return await self.index_file(document["id"])
+
 ingestion_service = IngestionService()
@@ -0,0 +1,214 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Job lifecycle
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# Pipeline stages, in order. Extraction and indexing run together (page by page),
+# so a job goes straight from "saved" to "indexed".
+STAGE_SAVED = "saved"
+STAGE_INDEXED = "indexed"
+
+
+class JobStore:
+    """
+    SQLite-backed job table, so queued and half-finished jobs survive a restart.
+    Safe to call from worker threads (e.g. embedding progress callbacks).
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    doc_id TEXT,
+                    filename TEXT NOT NULL,
+                    file_path TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    stage TEXT NOT NULL,
+                    pages_total INTEGER NOT NULL DEFAULT 0,
+                    pages_extracted INTEGER NOT NULL DEFAULT 0,
+                    chunks_total INTEGER NOT NULL DEFAULT 0,
+                    chunks_embedded INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self, doc_id: str, filename: str, file_path: str) -> Dict[str, Any]:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, doc_id, filename, file_path, status, stage, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, doc_id, filename, file_path, QUEUED, STAGE_SAVED, now, now),
+            )
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def update(self, job_id: str, **fields):
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"])
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY created_at", (QUEUED, RUNNING)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+
+class JobManager:
+    """
+    Runs uploaded documents through the ingestion stages on a bounded pool of
+    background workers. Progress is written to the JobStore as each stage advances.
+    """
+
+    def __init__(self, store: JobStore = None, workers: int = None, ingestion=None):
+        self.store = store or JobStore(os.path.join(settings.DATA_DIR, "jobs.db"))
+        self.num_workers = workers or settings.INGESTION_WORKERS
+        self._ingestion = ingestion
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._loop = None
+        self._pending = set()
+
+    @property
+    def ingestion(self):
+        if self._ingestion is None:
+            from app.services.ingestion import ingestion_service
+            self._ingestion = ingestion_service
+        return self._ingestion
+
+    async def start(self):
+        """Starts the workers and re-queues jobs left unfinished by a previous run."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._workers:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._pending = set()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+        for job in self.store.unfinished():
+            self._enqueue(job["id"])
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        """Queues (re-)ingestion of a registered document."""
+        # Workers are normally started by the app lifespan; start lazily otherwise.
+        await self.start()
+        job = self.store.create(document["id"], document["filename"], document["file_path"])
+        self._enqueue(job["id"])
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.store.get(job_id)
+
+    async def join(self):
+        """Waits until every queued job has been processed."""
+        await self._queue.join()
+
+    def _enqueue(self, job_id: str):
+        if job_id not in self._pending:
+            self._pending.add(job_id)
+            self._queue.put_nowait(job_id)
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                logger.exception("Ingestion job %s failed", job_id)
+                self.store.update(job_id, status=FAILED, error=str(e))
+            finally:
+                self._pending.discard(job_id)
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        job = self.store.get(job_id)
+        self.store.update(job_id, status=RUNNING)
+
+        def on_pages(done: int, total: int):
+            self.store.update(job_id, pages_extracted=done, pages_total=total)
+
+        def on_chunks(done: int, total: int):
+            self.store.update(job_id, chunks_embedded=done, chunks_total=total)
+
+        # Extract, chunk and embed page by page. A restarted job runs this again:
+        # chunks a previous run already indexed are kept, not re-embedded.
+        result = await self.ingestion.index_file(job["doc_id"], page_progress=on_pages, progress=on_chunks)
+        self.store.update(job_id, stage=STAGE_INDEXED, status=COMPLETED, result=result)
+        if settings.SUMMARIZE_ON_INGEST and result["status"] == "ingested_and_indexed":
+            from app.services.summaries import document_summarizer
+
+            # Runs in the background, so the next upload does not wait for it.
+            document_summarizer.schedule(job["doc_id"])
+
+
+def job_status(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Public view of a job, as returned by the API."""
+    return {
+        "job_id": job["id"],
+        "doc_id": job["doc_id"],
+        "filename": job["filename"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "progress": {
+            "pages_extracted": job["pages_extracted"],
+            "pages_total": job["pages_total"],
+            "chunks_embedded": job["chunks_embedded"],
+            "chunks_total": job["chunks_total"],
+        },
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+
+
+job_manager = JobManager()
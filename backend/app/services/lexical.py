@@ -0,0 +1,296 @@
+import json
+import math
+import re
+import sqlite3
+import threading
+from array import array
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from app.services.vectorstores import Where, filter_rows, matches
+
+# Decimal numbers ("28.4") stay whole; everything else splits on non-word characters.
+TOKEN_PATTERN = re.compile(r"\d+(?:\.\d+)+|\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were which with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in TOKEN_PATTERN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def _uint_array(values: np.ndarray) -> array:
+    packed = array("I")
+    packed.frombytes(values.astype(np.uint32).tobytes())
+    return packed
+
+
+class BM25Index:
+    """
+    Okapi BM25 over chunk texts, kept next to the vector store so exact-term
+    queries (dataset names, metrics, symbols) can be answered without an
+    embedding call.
+
+    Chunks live in SQLite; the inverted index is rebuilt in memory on first
+    use, each chunk at a row of dense per-row arrays (not its SQLite row
+    number). Each term's postings are two parallel typed arrays (row, term
+    frequency), 8 bytes per posting. A new chunk always gets a new row, and
+    deleted rows are skipped at query time until they make up half of the
+    postings; then they are purged and the live rows renumbered, so memory
+    and per-query work follow the live chunks. Rows are also indexed by
+    `indexed_fields`, so filters on them skip the scan.
+    """
+
+    indexed_fields = ("doc_id", "source", "section")
+
+    def __init__(self, db_path: str, k1: float = 1.2, b: float = 0.75):
+        self.db_path = db_path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._loaded = False
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS chunks (
+                    row INTEGER PRIMARY KEY AUTOINCREMENT,
+                    id TEXT NOT NULL UNIQUE,
+                    text TEXT NOT NULL,
+                    metadata TEXT NOT NULL
+                )
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    # -- in-memory index ---------------------------------------------------
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        self.lengths = array("I")  # tokens per row; 0 = no live chunk at this row
+        self.unique_terms = array("I")
+        self.row_of: Dict[str, int] = {}
+        self.id_of: Dict[int, str] = {}
+        self.metadatas: Dict[int, dict] = {}
+        self.field_index: Dict[str, Dict[Any, Set[int]]] = {field: {} for field in self.indexed_fields}
+        self.total_length = 0
+        self.live_postings = 0
+        self.dead_postings = 0
+        with self._connect() as conn:
+            for chunk_id, text, metadata in conn.execute("SELECT id, text, metadata FROM chunks ORDER BY row"):
+                self._index(chunk_id, text, json.loads(metadata))
+        self._loaded = True
+
+    def _index(self, chunk_id: str, text: str, metadata: dict):
+        counts = Counter(tokenize(text))
+        row = len(self.lengths)
+        for term, tf in counts.items():
+            rows, tfs = self.postings.setdefault(term, (array("I"), array("I")))
+            rows.append(row)
+            tfs.append(tf)
+        length = sum(counts.values())
+        self.lengths.append(max(length, 1))
+        self.unique_terms.append(len(counts))
+        self.total_length += length
+        self.live_postings += len(counts)
+        self.row_of[chunk_id] = row
+        self.id_of[row] = chunk_id
+        self.metadatas[row] = metadata
+        for field in self.indexed_fields:
+            if field in metadata:
+                self.field_index[field].setdefault(metadata[field], set()).add(row)
+
+    def _compact(self):
+        """Drops postings and rows of deleted chunks and renumbers the live rows densely, in order."""
+        lengths = np.frombuffer(self.lengths, dtype=np.uint32)
+        live = np.flatnonzero(lengths)
+        renumber = np.zeros(len(lengths), dtype=np.uint32)
+        renumber[live] = np.arange(len(live), dtype=np.uint32)
+        for term in list(self.postings):
+            rows, tfs = (np.frombuffer(a, dtype=np.uint32) for a in self.postings[term])
+            keep = lengths[rows] > 0
+            if keep.any():
+                self.postings[term] = (_uint_array(renumber[rows[keep]]), _uint_array(tfs[keep]))
+            else:
+                del self.postings[term]
+        self.lengths = _uint_array(lengths[live])
+        self.unique_terms = _uint_array(np.frombuffer(self.unique_terms, dtype=np.uint32)[live])
+        self.id_of = {int(renumber[row]): chunk_id for row, chunk_id in self.id_of.items()}
+        self.row_of = {chunk_id: row for row, chunk_id in self.id_of.items()}
+        self.metadatas = {int(renumber[row]): metadata for row, metadata in self.metadatas.items()}
+        self.field_index = {
+            field: {value: {int(renumber[row]) for row in rows} for value, rows in values.items() if rows}
+            for field, values in self.field_index.items()
+        }
+        self.dead_postings = 0
+
+    # -- writes ------------------------------------------------------------
+
+    def missing(self, ids: Sequence[str]) -> List[str]:
+        """The ids not indexed yet."""
+        with self._lock:
+            self._ensure_loaded()
+            return [i for i in ids if i not in self.row_of]
+
+    def add(self, ids: List[str], texts: List[str], metadatas: List[dict]):
+        """Indexes new chunks. Chunk ids are content-addressed, so ids already present are skipped."""
+        with self._lock:
+            self._ensure_loaded()
+            new = [
+                (chunk_id, text, metadata)
+                for chunk_id, text, metadata in zip(ids, texts, metadatas)
+                if chunk_id not in self.row_of
+            ]
+            if not new:
+                return
+            with self._connect() as conn:
+                for chunk_id, text, metadata in new:
+                    conn.execute(
+                        "INSERT INTO chunks (id, text, metadata) VALUES (?, ?, ?)",
+                        (chunk_id, text, json.dumps(metadata)),
+                    )
+                    self._index(chunk_id, text, metadata)
+
+    def delete(self, ids: List[str]):
+        with self._lock:
+            self._ensure_loaded()
+            ids = [i for i in dict.fromkeys(ids) if i in self.row_of]
+            if not ids:
+                return
+            rows = [self.row_of.pop(i) for i in ids]
+            with self._connect() as conn:
+                conn.executemany("DELETE FROM chunks WHERE id = ?", [(i,) for i in ids])
+            for row in rows:
+                self.total_length -= self.lengths[row]
+                self.live_postings -= self.unique_terms[row]
+                self.dead_postings += self.unique_terms[row]
+                self.lengths[row] = 0
+                del self.id_of[row]
+                metadata = self.metadatas.pop(row)
+                for field in self.indexed_fields:
+                    if field in metadata:
+                        self.field_index[field].get(metadata[field], set()).discard(row)
+            if self.dead_postings > self.live_postings:
+                self._compact()
+
+    # -- reads -------------------------------------------------------------
+
+    def _candidate_rows(self, where: Where, within: Optional[Set[int]] = None) -> Optional[Set[int]]:
+        """
+        Live rows passing the filter, looked up by indexed fields where possible
+        (None = no filter). Only rows in `within` are considered, if given.
+        """
+        if not where:
+            return within
+        rows, excluded, rest = filter_rows(self.field_index, where)
+        if rows is None:
+            rows = set(self.metadatas) if within is None else within
+        elif within is not None:
+            rows = rows & within
+        if rest:
+            rows = {r for r in rows if matches(self.metadatas[r], rest)}
+        return rows - excluded
+
+    def get_ids(self, where: Where = None) -> List[str]:
+        with self._lock:
+            self._ensure_loaded()
+            rows = self._candidate_rows(where)
+            if rows is None:
+                return list(self.row_of)
+            return [self.id_of[row] for row in sorted(rows)]
+
+    def count(self) -> int:
+        with self._lock:
+            self._ensure_loaded()
+            return len(self.row_of)
+
+    def documents(self, where: Where = None) -> List[Document]:
+        """The chunks passing the filter, in the order they were indexed."""
+        with self._lock:
+            self._ensure_loaded()
+            rows = self._candidate_rows(where)
+            ids = [self.id_of[row] for row in sorted(self.id_of if rows is None else rows)]
+        docs = []
+        with self._connect() as conn:
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                docs.extend(
+                    Document(id=chunk_id, page_content=text, metadata=json.loads(metadata))
+                    for chunk_id, text, metadata in conn.execute(
+                        f"SELECT id, text, metadata FROM chunks WHERE id IN ({','.join('?' * len(batch))}) ORDER BY row",
+                        batch,
+                    )
+                )
+        return docs
+
+    def _scores(self, terms: List[str]) -> np.ndarray:
+        lengths = np.frombuffer(self.lengths, dtype=np.uint32).astype(np.float32)
+        scores = np.zeros(len(lengths), dtype=np.float32)
+        n = len(self.row_of)
+        avg_length = max(self.total_length / n, 1.0)
+        for term in set(terms):
+            if term not in self.postings:
+                continue
+            rows, tfs = self.postings[term]
+            rows = np.frombuffer(rows, dtype=np.uint32)
+            tfs = np.frombuffer(tfs, dtype=np.uint32).astype(np.float32)
+            row_lengths = lengths[rows]
+            live = row_lengths > 0
+            df = int(live.sum())
+            if not df:
+                continue
+            idf = math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * row_lengths / avg_length)
+            scores[rows] += np.where(live, idf * tfs * (self.k1 + 1.0) / (tfs + norm), 0.0)
+        return scores
+
+    def search(self, query: str, k: int = 4, where: Where = None) -> List[Tuple[Document, float]]:
+        """Top-k chunks by BM25 score, best first. Chunks sharing no term with the query are never returned."""
+        terms = tokenize(query)
+        with self._lock:
+            self._ensure_loaded()
+            if not terms or not self.row_of:
+                return []
+            scores = self._scores(terms)
+            rows = np.flatnonzero(scores > 0)
+            if where:
+                # Only rows sharing a term with the query are filtered.
+                candidates = self._candidate_rows(where, within=set(rows.tolist()))
+                rows = np.fromiter(sorted(candidates), dtype=np.int64, count=len(candidates))
+            if len(rows) > k:
+                rows = rows[np.argpartition(-scores[rows], k - 1)[:k]]
+            rows = rows[np.argsort(-scores[rows], kind="stable")]
+            # Rows are renumbered by compaction, so resolve them to chunk ids under the lock.
+            hits = [(self.id_of[int(r)], float(scores[r])) for r in rows]
+        if not hits:
+            return []
+        with self._connect() as conn:
+            placeholders = ", ".join("?" * len(hits))
+            found = {
+                chunk_id: (text, json.loads(metadata))
+                for chunk_id, text, metadata in conn.execute(
+                    f"SELECT id, text, metadata FROM chunks WHERE id IN ({placeholders})", [i for i, _ in hits]
+                )
+            }
+        return [
+            (Document(id=chunk_id, page_content=found[chunk_id][0], metadata=found[chunk_id][1]), score)
+            for chunk_id, score in hits
+            if chunk_id in found
+        ]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            self._ensure_loaded()
+            postings = self.live_postings + self.dead_postings
+            return {
+                "chunks": len(self.row_of),
+                "terms": len(self.postings),
+                "postings": postings,
+                "dead_postings": self.dead_postings,
+                "postings_bytes": postings * 8,
+            }
@@ -1,47 +1,524 @@
+import hashlib
+import logging
 import os
-from typing import List
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import zip_longest
+from typing import Any, Callable, Dict, List, Optional, Tuple
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from app.core.config import settings
+from app.core.llm import build_embeddings
+from app.core.telemetry import metrics, span
+from app.services.admission import Overloaded, embedding_flight, embedding_gate
+from app.services.chunking import SectionChunker, StreamingChunker
+from app.services.dedup import DuplicateIndex
+from app.services.embedding_cache import CachedEmbeddings, EmbeddingCache
+from app.services.embedding_scheduler import EmbeddingScheduler, estimate_tokens, is_rate_limit_error
+from app.services.lexical import BM25Index
+from app.services.vectorstores import Not, VectorStore, Where, make_vector_store, matches
+
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+CHUNKERS = ("sections", "recursive")
+# Reciprocal rank fusion constant; 60 is the value from the original RRF paper.
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int = RRF_K) -> List[Document]:
+    """Merges ranked lists by summing 1 / (k + rank) per document id."""
+    scores: Dict[str, float] = {}
+    docs: Dict[str, Document] = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking, start=1):
+            scores[doc.id] = scores.get(doc.id, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(doc.id, doc)
+    return [docs[i] for i in sorted(scores, key=scores.get, reverse=True)]
+
+
+def _falls_back_to_lexical(e: Exception) -> bool:
+    """Hybrid retrieval answers from the lexical index alone when the embedding API is rate-limited or shed."""
+    if is_rate_limit_error(e):
+        logger.warning("Embedding quota exceeded, answering from the lexical index only: %s", e)
+        metrics.inc("researchmate_quota_errors_total", source="retrieval")
+        return True
+    if isinstance(e, Overloaded):
+        logger.warning("Embedding API at capacity, answering from the lexical index only")
+        return True
+    return False
+
 
 class RAGService:
-    def __init__(self):
-        self.persist_directory = os.path.join(settings.DATA_DIR, "chroma_db")
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            model="models/embedding-001",
-            google_api_key=settings.GOOGLE_API_KEY
+    def __init__(
+        self,
+        embeddings: Embeddings = None,
+        data_dir: str = None,
+        scheduler: EmbeddingScheduler = None,
+        vector_store: VectorStore = None,
+        lexical_index: BM25Index = None,
+        dedup_index: DuplicateIndex = None,
+        dedup: bool = None,
+        chunker: str = None,
+    ):
+        """
+        :param dedup: Skip near-duplicate chunks (MinHash, see DuplicateIndex) instead of
+            indexing them; defaults to settings.CHUNK_DEDUP.
+        :param chunker: "sections" (SectionChunker) or "recursive" (the text splitter);
+            defaults to settings.CHUNKER.
+        """
+        data_dir = data_dir or settings.DATA_DIR
+        if embeddings is None:
+            embeddings = build_embeddings()
+        # Every embedding goes through the local cache first.
+        self.embedding_cache = EmbeddingCache(
+            os.path.join(data_dir, "embedding_cache.db"), max_entries=settings.EMBEDDING_CACHE_SIZE
         )
-        self.vector_store = Chroma(
-            persist_directory=self.persist_directory,
-            embedding_function=self.embeddings,
-            collection_name="sn_insight_docs"
+        model_name = getattr(embeddings, "model", None) or settings.EMBEDDING_MODEL
+        self.embeddings = CachedEmbeddings(
+            embeddings, model_name, self.embedding_cache,
+            gate=embedding_gate, flight=embedding_flight if settings.SINGLE_FLIGHT else None,
         )
+        self.vector_store = vector_store or make_vector_store(
+            settings.VECTOR_BACKEND, data_dir, rerank_factor=settings.VECTOR_RERANK_FACTOR
+        )
+        self.lexical_index = lexical_index or BM25Index(os.path.join(data_dir, "lexical.db"))
+        if dedup_index is None and (settings.CHUNK_DEDUP if dedup is None else dedup):
+            dedup_index = DuplicateIndex(
+                os.path.join(data_dir, "dedup.db"), threshold=settings.CHUNK_DEDUP_THRESHOLD
+            )
+        self.dedup_index = dedup_index
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
             chunk_overlap=200,
             length_function=len,
+            add_start_index=True,
         )
+        self.chunker = chunker or settings.CHUNKER
+        if self.chunker not in CHUNKERS:
+            raise ValueError(f"Unknown chunker '{self.chunker}'")
+        self.scheduler = scheduler or EmbeddingScheduler()
+        # Called with a doc_id whenever that document's chunks are re-indexed or deleted.
+        self.change_listeners: List[Callable[[str], None]] = []
+
+    @staticmethod
+    def chunk_id(doc_id: str, content_hash: str, start_index: int) -> str:
+        # Same document + same file + same offset -> same id, so re-ingesting is an idempotent
+        # upsert; two documents with the same file never share (or overwrite) each other's chunks.
+        return f"{doc_id}-{content_hash[:16]}-{start_index}"
+
+    def make_chunker(self):
+        """A chunker for one document; SectionChunker also names each chunk's section."""
+        if self.chunker == "sections":
+            return SectionChunker(self.text_splitter._chunk_size, self.text_splitter._chunk_overlap)
+        return StreamingChunker(self.text_splitter)
+
+    def _document_chunk_ids(self, doc_id: str) -> List[str]:
+        return self.vector_store.get_ids(where={"doc_id": doc_id})
+
+    def _document_lexical_ids(self, doc_id: str) -> List[str]:
+        return self.lexical_index.get_ids(where={"doc_id": doc_id})
 
-    def add_document(self, text: str, metadata: dict):
+    def add_document(
+        self,
+        text: str,
+        metadata: dict,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> Dict[str, int]:
         """
-        Chunks the text and adds it to the vector store.
+        Chunks the text and upserts it into the vector store.
+
+        Chunk ids are derived from the doc_id, the document's content hash and
+        each chunk's offset. Chunks already indexed for `metadata["doc_id"]` are kept, only
+        missing ones are embedded, and chunks left over from a previous version
+        of the document are removed once the new ones are in. Near-duplicates of
+        chunks already in the corpus are linked to them instead of indexed.
+        :param progress: Called with (chunks_indexed, chunks_total) after each batch.
         """
         if not text:
+            return {"chunks": 0, "added": 0, "removed": 0, "duplicates": 0}
+
+        metadata = dict(metadata)
+        metadata.setdefault("content_hash", hashlib.sha256(text.encode("utf-8")).hexdigest())
+        indexer = self.open_document(metadata, progress)
+        indexer.add_text(text)
+        return indexer.close()
+
+    def open_document(
+        self, metadata: dict, progress: Optional[Callable[[int, int], None]] = None
+    ) -> "DocumentIndexer":
+        """
+        Starts indexing a document whose text is fed piece by piece (see
+        DocumentIndexer). `metadata` must carry the file's "content_hash".
+        """
+        return DocumentIndexer(self, metadata, progress)
+
+    def delete_document(self, doc_id: str) -> int:
+        """Removes every chunk of a document. Returns the number of chunks removed."""
+        ids = self._document_chunk_ids(doc_id)
+        if ids:
+            self.vector_store.delete(ids=ids)
+        lexical_ids = self._document_lexical_ids(doc_id)
+        if lexical_ids:
+            self.lexical_index.delete(lexical_ids)
+        if self.dedup_index is not None:
+            known = self.dedup_index.document_ids(doc_id)
+            self._promote(self.dedup_index.remove(list(set(ids) | set(lexical_ids) | set(known))))
+        self._notify(doc_id)
+        return len(set(ids) | set(lexical_ids))
+
+    def _index_chunks(
+        self,
+        batch: List[Tuple[str, Document]],
+        existing: set = frozenset(),
+        embed: bool = True,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> int:
+        """
+        Adds (chunk_id, Document) pairs to the lexical index, then embeds and adds
+        those not in `existing` to the vector store. Returns the number embedded.
+        """
+        # The lexical index needs no API call, so it is filled first: the chunks are
+        # searchable in "lexical" mode even if embedding hits its quota.
+        lexical_new = set(self.lexical_index.missing([chunk_id for chunk_id, _ in batch]))
+        unindexed = [(chunk_id, doc) for chunk_id, doc in batch if chunk_id in lexical_new]
+        self.lexical_index.add(
+            [chunk_id for chunk_id, _ in unindexed],
+            [doc.page_content for _, doc in unindexed],
+            [doc.metadata for _, doc in unindexed],
+        )
+        new = [(chunk_id, doc) for chunk_id, doc in batch if chunk_id not in existing]
+        if not embed or not new:
+            return 0
+
+        def add_batch(items):
+            texts = [doc.page_content for _, doc in items]
+            self.vector_store.add(
+                [chunk_id for chunk_id, _ in items],
+                texts,
+                self.embeddings.embed_documents(texts),
+                [doc.metadata for _, doc in items],
+            )
+
+        # Embed and add in rate-limited batches (retried with backoff on 429).
+        self.scheduler.run(new, add_batch, cost=lambda item: estimate_tokens(item[1].page_content), progress=progress)
+        return len(new)
+
+    def _promote(self, orphans: List[Tuple[str, str, dict]]):
+        """Indexes duplicates whose canonical chunk was removed, in its place."""
+        if not orphans:
+            return
+        canonical = self.dedup_index.dedupe([(cid, meta.get("doc_id"), text, meta) for cid, text, meta in orphans])
+        batch = [
+            (cid, Document(page_content=text, metadata=meta))
+            for (cid, text, meta), match in zip(orphans, canonical) if match is None
+        ]
+        try:
+            self._index_chunks(batch)
+        except Exception as e:
+            logger.warning("Could not embed %d chunks that replaced deleted duplicates: %s", len(batch), e)
+        for doc_id in {meta.get("doc_id") for _, _, meta in orphans}:
+            self._notify(doc_id)
+
+    def document_chunks(self, doc_id: str) -> List[Document]:
+        """Every chunk of a document in text order, including those linked to a duplicate elsewhere."""
+        docs = self.lexical_index.documents(where={"doc_id": doc_id})
+        if self.dedup_index is not None:
+            docs += [
+                Document(id=chunk_id, page_content=text, metadata=metadata)
+                for chunk_id, text, metadata in self.dedup_index.duplicates(doc_id)
+            ]
+        return sorted(docs, key=lambda d: d.metadata.get("start_index", 0))
+
+    def document_sections(self, doc_id: str) -> List[Dict[str, Any]]:
+        """
+        The section index of a document: its sections in text order, each with
+        the offset of its first chunk and its number of chunks. Empty for
+        documents chunked without sections.
+        """
+        sections: List[Dict[str, Any]] = []
+        for doc in self.document_chunks(doc_id):
+            name = doc.metadata.get("section")
+            if name is None:
+                continue
+            if sections and sections[-1]["section"] == name:
+                sections[-1]["chunks"] += 1
+            else:
+                sections.append({"section": name, "start_index": doc.metadata.get("start_index", 0), "chunks": 1})
+        return sections
+
+    def _notify(self, doc_id: str):
+        for listener in self.change_listeners:
+            listener(doc_id)
+
+    def similarity_search(self, query: str, k: int = 4, where: Where = None, mode: str = None) -> List[Document]:
+        """
+        Retrieves the top-k chunks for a query.
+        :param mode: "vector" (dense), "lexical" (BM25, no embedding call) or "hybrid"
+            (both, merged by reciprocal rank fusion). Defaults to settings.RETRIEVAL_MODE.
+        """
+        return self.similarity_search_many([query], k=k, where=where, mode=mode)[0]
+
+    def similarity_search_many(
+        self, queries: List[str], k: int = 4, where: Where = None, mode: str = None
+    ) -> List[List[Document]]:
+        """
+        `similarity_search` for many queries: their embeddings are computed in
+        one batched call and searched in one vectorized pass over the store.
+        Returns one result list per query.
+        """
+        mode = mode or settings.RETRIEVAL_MODE
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{mode}'")
+        if not queries:
+            return []
+        where = self._scoped(where)
+        aliases = self._duplicate_aliases(where)
+        if aliases:
+            return [self._search_with_duplicates(query, k, where, mode, aliases) for query in queries]
+        return self._search(queries, k, where, mode)
+
+    def _search(self, queries: List[str], k: int, where: Where, mode: str) -> List[List[Document]]:
+        if mode == "lexical":
+            return [self.lexical_search(query, k=k, where=where) for query in queries]
+        if mode == "vector":
+            return self.search_by_vectors(self._embed_queries(queries), k=k, where=where)
+
+        # Hybrid: a deeper candidate list from each side gives fusion room to re-order.
+        lexical = [self.lexical_search(query, k=2 * k, where=where) for query in queries]
+        try:
+            dense = self.search_by_vectors(self._embed_queries(queries), k=2 * k, where=where)
+        except Exception as e:
+            if not _falls_back_to_lexical(e):
+                raise
+            return [ranking[:k] for ranking in lexical]
+        return [reciprocal_rank_fusion([d, l])[:k] for d, l in zip(dense, lexical)]
+
+    def _duplicate_aliases(self, where: Where) -> Dict[str, Tuple[str, Document]]:
+        """
+        For a filter on doc_id: the chunks of those documents that were linked to
+        a duplicate in another document instead of indexed, as (canonical doc_id,
+        chunk) keyed by the canonical chunk's id; they are returned in its place.
+        """
+        doc_ids = (where or {}).get("doc_id")
+        if self.dedup_index is None or doc_ids is None or isinstance(doc_ids, Not):
+            return {}
+        doc_ids = [doc_ids] if isinstance(doc_ids, str) else list(doc_ids)
+        rest = {field: value for field, value in where.items() if field != "doc_id"}
+        aliases = {}
+        for chunk_id, canonical_id, canonical_doc, text, metadata in self.dedup_index.links(doc_ids):
+            if canonical_doc not in doc_ids and matches(metadata, rest):
+                aliases.setdefault(canonical_id, (canonical_doc, Document(id=chunk_id, page_content=text, metadata=metadata)))
+        return aliases
+
+    def _search_with_duplicates(
+        self, query: str, k: int, where: Where, mode: str, aliases: Dict[str, Tuple[str, Document]]
+    ) -> List[Document]:
+        """
+        Searches the filtered documents together with the documents holding the
+        canonical chunks of their duplicates, keeping the filtered documents' own
+        chunks and the aliased ones; fetches deeper until k are kept or the
+        candidates run out.
+        """
+        doc_ids = where["doc_id"]
+        doc_ids = {doc_ids} if isinstance(doc_ids, str) else set(doc_ids)
+        expanded = dict(where, doc_id=sorted(doc_ids | {doc_id for doc_id, _ in aliases.values()}))
+        fetch = 2 * k
+        while True:
+            found = self._search([query], fetch, expanded, mode)[0]
+            kept = []
+            for doc in found:
+                if doc.metadata.get("doc_id") in doc_ids:
+                    kept.append(doc)
+                elif doc.id in aliases:
+                    kept.append(aliases[doc.id][1])
+            if len(kept) >= k or len(found) < fetch:
+                return kept[:k]
+            fetch *= 2
+
+    @staticmethod
+    def _scoped(where: Where) -> Where:
+        """Leaves out RETRIEVAL_EXCLUDED_SECTIONS (the reference list), unless the filter picks sections itself."""
+        if not settings.RETRIEVAL_EXCLUDED_SECTIONS or (where and "section" in where):
+            return where
+        return dict(where or {}, section=Not(settings.RETRIEVAL_EXCLUDED_SECTIONS))
+
+    def _embed_queries(self, queries: List[str]) -> List[List[float]]:
+        # A single query goes through embed_query, where identical concurrent requests are coalesced.
+        if len(queries) == 1:
+            return [self.embeddings.embed_query(queries[0])]
+        return self.embeddings.embed_queries(queries)
+
+    def search_per_document(
+        self, query: str, doc_ids: List[str], k: int = 4, mode: str = None, where: Where = None
+    ) -> List[Document]:
+        """
+        Per-source quota retrieval: k chunks spread evenly over the given
+        documents, so no single document takes every slot. Each document is
+        searched on its own, concurrently; a document with fewer matching chunks
+        than its share leaves the rest to the others. Results are interleaved
+        (every document's best chunk first), so any prefix stays balanced.
+        :param where: Further conditions on the chunks, e.g. {"section": ["Method"]}.
+        """
+        doc_ids = list(dict.fromkeys(doc_ids))
+        if not doc_ids or k <= 0:
+            return []
+        mode = mode or settings.RETRIEVAL_MODE
+        if mode != "lexical":
+            # Embed once up front; the per-document searches then hit the embedding cache.
+            try:
+                self.embeddings.embed_query(query)
+            except Exception as e:
+                if mode == "vector" or not _falls_back_to_lexical(e):
+                    raise
+                mode = "lexical"
+
+        def search(doc_id: str) -> List[Document]:
+            return self.similarity_search(query, k=k, where=dict(where or {}, doc_id=doc_id), mode=mode)
+
+        with ThreadPoolExecutor(max_workers=min(len(doc_ids), 8)) as pool:
+            per_document = list(pool.map(search, doc_ids))
+        interleaved = [doc for rank in zip_longest(*per_document) for doc in rank if doc is not None]
+        return interleaved[:k]
+
+    def lexical_search(self, query: str, k: int = 4, where: Where = None) -> List[Document]:
+        return [doc for doc, _ in self.lexical_index.search(query, k=k, where=where)]
+
+    def search_by_vectors(self, vectors: List[List[float]], k: int = 4, where: Where = None) -> List[List[Document]]:
+        """Searches many query vectors in one call; returns one result list per vector."""
+        return [[doc for doc, _ in hits] for hits in self.vector_store.search(vectors, k=k, where=where)]
+
+class DocumentIndexer:
+    """
+    Indexes one document from text that arrives in pieces, e.g. page by page
+    while a PDF is still being extracted. Chunks are cut by a StreamingChunker
+    and, every `batch_size` chunks, added to the lexical index and embedded,
+    so memory stays bounded by the batch instead of the document and the
+    first chunks are searchable before the last page is read.
+
+    Chunks already indexed for the document are kept without re-embedding,
+    and near-duplicates of chunks anywhere in the corpus (running text the
+    header/footer stripper missed, boilerplate, shared reference lists) are
+    linked to the original through the DuplicateIndex instead of indexed.
+    If embedding fails (e.g. quota), the remaining chunks still go into the
+    lexical index and `close` raises the error; otherwise `close` removes the
+    chunks left over from a previous version of the document.
+    """
+
+    def __init__(
+        self,
+        rag: RAGService,
+        metadata: dict,
+        progress: Optional[Callable[[int, int], None]] = None,
+        batch_size: int = None,
+    ):
+        self.rag = rag
+        self.metadata = dict(metadata)
+        self.content_hash = self.metadata["content_hash"]
+        self.doc_id = self.metadata.setdefault("doc_id", self.content_hash[:16])
+        self.progress = progress
+        self.batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE * settings.EMBEDDING_MAX_IN_FLIGHT
+        self.chunker = rag.make_chunker()
+        self.existing = set(rag._document_chunk_ids(self.doc_id))
+        self.ids: set = set()
+        self.pending: List[Tuple[str, Document]] = []
+        self.duplicates: set = set()
+        self.indexed = 0
+        self.added = 0
+        self.error: Optional[Exception] = None
+
+    def add_text(self, text: str):
+        """Feeds the next piece of text (pages are joined with newlines); blocks while a full batch is indexed."""
+        with span("chunk"):
+            chunks = self.chunker.feed(text)
+        self._queue(chunks)
+        if len(self.pending) >= self.batch_size:
+            self._flush()
+
+    def close(self) -> Dict[str, int]:
+        """Indexes the rest and drops stale chunks. Returns chunk counts like `add_document`."""
+        with span("chunk"):
+            chunks = self.chunker.finish()
+        self._queue(chunks)
+        self._flush()
+        if self.error is not None:
+            raise self.error
+
+        indexed = self.ids - self.duplicates
+        stale = self.existing - indexed
+        if stale:
+            self.rag.vector_store.delete(ids=list(stale))
+        lexical_stale = set(self.rag._document_lexical_ids(self.doc_id)) - indexed
+        if lexical_stale:
+            self.rag.lexical_index.delete(list(lexical_stale))
+        dedup_index = self.rag.dedup_index
+        if dedup_index is not None:
+            forgotten = (set(dedup_index.document_ids(self.doc_id)) | stale | lexical_stale) - self.ids
+            self.rag._promote(dedup_index.remove(list(forgotten)))
+        self.rag._notify(self.doc_id)
+        return {
+            "chunks": len(self.ids),
+            "added": self.added,
+            "removed": len((stale | lexical_stale) - self.ids),
+            "duplicates": len(self.duplicates),
+        }
+
+    def _queue(self, chunks: List[Tuple[int, str]]):
+        for start, text in chunks:
+            chunk_id = self.rag.chunk_id(self.doc_id, self.content_hash, start)
+            if chunk_id not in self.ids:
+                self.ids.add(chunk_id)
+                metadata = dict(self.metadata, start_index=start)
+                section = self.chunker.section_at(start)
+                if section is not None:
+                    metadata["section"] = section
+                self.pending.append((chunk_id, Document(page_content=text, metadata=metadata)))
+
+    def _flush(self):
+        batch, self.pending = self.pending, []
+        if not batch:
             return
+        size = len(batch)
+        if self.rag.dedup_index is not None:
+            canonical = self.rag.dedup_index.dedupe(
+                [(chunk_id, self.doc_id, doc.page_content, doc.metadata) for chunk_id, doc in batch]
+            )
+            duplicates = {chunk_id for (chunk_id, _), match in zip(batch, canonical) if match is not None}
+            self.duplicates |= duplicates
+            batch = [(chunk_id, doc) for chunk_id, doc in batch if chunk_id not in duplicates]
+
+        kept = self.indexed + size - sum(1 for chunk_id, _ in batch if chunk_id not in self.existing)
+
+        def on_batch(done: int, total: int):
+            if self.progress:
+                self.progress(kept + done, len(self.ids))
+
+        # An interrupted run resumes naturally: its chunks are "existing" next time.
+        on_batch(0, 0)
+        try:
+            self.added += self.rag._index_chunks(batch, self.existing, embed=self.error is None, progress=on_batch)
+        except Exception as e:
+            self.error = e
+        self.indexed += size
+
+
+_rag_service: Optional[RAGService] = None
+_rag_service_lock = threading.Lock()
+
 
-        # Create Document objects
-        docs = [Document(page_content=text, metadata=metadata)]
-        
-        # Split documents
-        splits = self.text_splitter.split_documents(docs)
-        
-        # Add to vector store
-        self.vector_store.add_documents(splits)
-        # self.vector_store.persist() # Chroma 0.4+ persists automatically
+def get_rag_service() -> RAGService:
+    """The shared RAGService, built on first use (opening the stores and the embeddings client)."""
+    global _rag_service
+    if _rag_service is None:
+        with _rag_service_lock:
+            if _rag_service is None:
+                _rag_service = RAGService()
+    return _rag_service
 
-    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
-        return self.vector_store.similarity_search(query, k=k)
 
-rag_service = RAGService()
+def __getattr__(name: str):
+    # `from app.services.rag import rag_service` still works, without building it at import time.
+    if name == "rag_service":
+        return get_rag_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
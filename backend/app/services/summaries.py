@@ -0,0 +1,397 @@
+"""
+Precomputed per-document summaries.
+
+After a document is indexed, a background task summarizes it map-reduce
+style: consecutive chunks are grouped into sections of at most
+SUMMARY_SECTION_TOKENS (chunks carrying a "section" title are never grouped
+across titles), each section is summarized on its own, and the section
+digests are reduced, level by level, into one summary of the paper. Results
+are stored per document with the content hash they were built from, so a
+replaced document's old summary is never served.
+
+The Paper Analyzer answers plain "summarize paper X" requests (about the
+paper as a whole, not one of its topics) straight from the stored summary, and the Paper Analyzer and Documentation Writer put the
+summaries of the papers they retrieved from above their chunks.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from langchain_core.documents import Document
+from app.core.config import settings
+from app.core.llm import get_chat_model
+from app.core.telemetry import span
+from app.services.admission import chat_gate
+from app.services.documents import document_registry
+from app.services.embedding_scheduler import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+RUNNING = "running"
+READY = "ready"
+FAILED = "failed"
+
+# Requests for a summary; a stored one answers them when they are about the whole paper.
+SUMMARY_REQUEST = re.compile(r"\b(summar(y|ise|ize)|overview|tl;?dr|gist)\b", re.I)
+# Words a whole-paper summary request is made of, besides the paper's name. Any other
+# word ("methodology", "results", "table 3") asks about a topic of the paper instead.
+PLAIN_SUMMARY_WORDS = frozenset("""
+    a an the this that it its of for on about in me us please can could would you i we
+    give provide write make show get need want what is s
+    short brief briefly quick concise high level overall whole entire full one paragraph
+    paper document doc article study pdf file
+    summary summarize summarise summarization summarisation overview tl dr tldr gist
+""".split())
+
+SECTION_PROMPT = """Summarize this part of the research paper "{source}" in at most {words} words.
+Keep the problem, methods, datasets, numbers and findings it states; do not add anything it does not say.
+
+{text}"""
+
+COMBINE_PROMPT = """Below are summaries of consecutive parts of the research paper "{source}".
+Merge them into one summary of at most {words} words, keeping methods, datasets, numbers and findings.
+
+{text}"""
+
+PAPER_PROMPT = """Below are summaries of consecutive parts of the research paper "{source}".
+Write a summary of the whole paper in at most {words} words: the problem, the method, the data,
+the key results and the limitations.
+
+{text}"""
+
+
+class SummaryStore:
+    """SQLite table of per-document summaries and their section digests."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS summaries (
+                    doc_id TEXT PRIMARY KEY,
+                    content_hash TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    summary TEXT,
+                    sections TEXT,
+                    llm_calls INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def put(self, doc_id: str, content_hash: str, status: str, **fields):
+        """Replaces the document's row."""
+        if "sections" in fields:
+            fields["sections"] = json.dumps(fields["sections"])
+        fields.update(doc_id=doc_id, content_hash=content_hash, status=status, updated_at=time.time())
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO summaries ({', '.join(fields)}) VALUES ({', '.join('?' * len(fields))})",
+                list(fields.values()),
+            )
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM summaries WHERE doc_id = ?", (doc_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def ready(self, versions: Iterable[Tuple[str, str]]) -> Dict[str, Dict[str, Any]]:
+        """doc_id -> summary for the (doc_id, content_hash) pairs whose summary is built from that version."""
+        versions = dict(versions)
+        if not versions:
+            return {}
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM summaries WHERE status = ? AND doc_id IN ({','.join('?' * len(versions))})",
+                (READY, *versions),
+            ).fetchall()
+        return {row["doc_id"]: self._to_dict(row) for row in rows if row["content_hash"] == versions[row["doc_id"]]}
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT * FROM summaries WHERE status IN (?, ?)", (PENDING, RUNNING)).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def delete(self, doc_id: str):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM summaries WHERE doc_id = ?", (doc_id,))
+
+    def stats(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT status, COUNT(*) FROM summaries GROUP BY status").fetchall())
+        return {status: counts.get(status, 0) for status in (PENDING, RUNNING, READY, FAILED)}
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        summary = dict(row)
+        summary["sections"] = json.loads(summary["sections"]) if summary["sections"] else []
+        return summary
+
+
+def group_sections(chunks: List[Document], max_tokens: int) -> List[Dict[str, Any]]:
+    """
+    Consecutive chunks (ordered by start_index) joined into sections of at most
+    `max_tokens`, with the overlap between neighbouring chunks sent once. A
+    change of the chunks' "section" title always starts a new section.
+    """
+    sections: List[Dict[str, Any]] = []
+    end = None
+    for doc in sorted(chunks, key=lambda d: d.metadata.get("start_index", 0)):
+        start = doc.metadata.get("start_index", 0)
+        text = doc.page_content
+        if end is not None and start < end:
+            text = text[end - start:]
+        end = max(end or 0, start + len(doc.page_content))
+        title = doc.metadata.get("section")
+        current = sections[-1] if sections else None
+        if (
+            current is None
+            or title != current["title"]
+            or current["tokens"] + estimate_tokens(text) > max_tokens
+        ):
+            current = {"title": title, "text": "", "tokens": 0, "chunks": 0}
+            sections.append(current)
+        current["text"] += text
+        current["tokens"] += estimate_tokens(text)
+        current["chunks"] += 1
+    return sections
+
+
+def batch_texts(texts: List[str], max_tokens: int) -> List[List[str]]:
+    """Consecutive texts in groups of at most `max_tokens`, at least two per group so every level shrinks."""
+    groups: List[List[str]] = []
+    tokens = 0
+    for text in texts:
+        cost = estimate_tokens(text)
+        if groups and (tokens + cost <= max_tokens or len(groups[-1]) < 2):
+            groups[-1].append(text)
+            tokens += cost
+        else:
+            groups.append([text])
+            tokens = cost
+    return groups
+
+
+def plain_summary_request(query: str, names: Iterable[str] = ()) -> bool:
+    """
+    Whether the query asks for a summary of the paper as a whole ("Summarize
+    this paper", "TL;DR of bert.pdf") rather than of a topic in it ("Summarize
+    the methodology"). `names` are filenames the query may refer to the paper by.
+    """
+    if not SUMMARY_REQUEST.search(query):
+        return False
+    text = f" {_words(query)} "
+    for name in names:
+        for key in {_words(name), _words(os.path.splitext(name)[0])} - {""}:
+            text = text.replace(f" {key} ", " ")
+    return set(text.split()) <= PLAIN_SUMMARY_WORDS
+
+
+def _words(text: str) -> str:
+    return " ".join(re.findall(r"[^\W_]+", text.lower()))
+
+
+class DocumentSummarizer:
+    """
+    Builds and serves the stored summaries. `schedule` starts a background
+    task per document; at most `max_concurrent` summarization LLM calls run
+    at once, and they queue for the chat LLM's admission gate like any
+    other call (without being shed).
+
+    :param llm: Chat model to summarize with (default: SUMMARY_MODEL from the client pool).
+    """
+
+    def __init__(
+        self,
+        store: SummaryStore,
+        llm=None,
+        registry=None,
+        max_concurrent: int = None,
+        section_tokens: int = None,
+        words: int = None,
+    ):
+        self.store = store
+        self._llm = llm
+        self.registry = registry or document_registry
+        self.max_concurrent = max_concurrent or settings.SUMMARY_MAX_CONCURRENCY
+        self.section_tokens = section_tokens or settings.SUMMARY_SECTION_TOKENS
+        self.words = words or settings.SUMMARY_MAX_WORDS
+        self.served = 0
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._loop = None
+        self._limit: Optional[asyncio.Semaphore] = None
+
+    @property
+    def llm(self):
+        return self._llm if self._llm is not None else get_chat_model(settings.SUMMARY_MODEL, 0.2)
+
+    @llm.setter
+    def llm(self, llm):
+        self._llm = llm
+
+    def schedule(self, doc_id: str) -> Optional[asyncio.Task]:
+        """Summarizes the document's current version in the background, replacing any run in progress."""
+        document = self.registry.get(doc_id)
+        if document is None:
+            return None
+        self._bind_loop()
+        self.cancel(doc_id)
+        self.store.put(doc_id, document["content_hash"], PENDING)
+        task = self._tasks[doc_id] = asyncio.create_task(self._run(document))
+        task.add_done_callback(lambda done: self._tasks.pop(doc_id) if self._tasks.get(doc_id) is done else None)
+        return task
+
+    def _bind_loop(self):
+        # Tasks and the semaphore belong to one event loop (tests run several).
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._limit, self._tasks = loop, asyncio.Semaphore(self.max_concurrent), {}
+
+    def resume(self):
+        """Re-schedules summaries left unfinished by the previous process."""
+        for summary in self.store.unfinished():
+            self.schedule(summary["doc_id"])
+
+    def cancel(self, doc_id: str):
+        task = self._tasks.pop(doc_id, None)
+        if task is not None:
+            task.cancel()
+
+    def forget(self, doc_id: str):
+        """Drops the document's summary (it was deleted or replaced)."""
+        self.cancel(doc_id)
+        self.store.delete(doc_id)
+
+    async def _run(self, document: Dict[str, Any]):
+        doc_id, content_hash = document["id"], document["content_hash"]
+        self.store.put(doc_id, content_hash, RUNNING)
+        try:
+            summary, sections, calls = await self.summarize(doc_id, document["filename"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Summarizing %s failed: %s", document["filename"], e)
+            self.store.put(doc_id, content_hash, FAILED, error=str(e))
+            return
+        current = self.registry.get(doc_id)
+        if current is None or current["content_hash"] != content_hash:
+            return  # Replaced or deleted meanwhile; the new version gets its own run.
+        self.store.put(doc_id, content_hash, READY, summary=summary, sections=sections, llm_calls=calls)
+
+    async def summarize(self, doc_id: str, source: str) -> Tuple[str, List[Dict[str, Any]], int]:
+        """Map-reduce over the document's indexed chunks; returns (summary, section digests, LLM calls)."""
+        from app.services.rag import get_rag_service
+
+        chunks = await asyncio.to_thread(get_rag_service().document_chunks, doc_id)
+        # Sections left out of retrieval (the reference list) are left out of the summary too.
+        chunks = [c for c in chunks if c.metadata.get("section") not in settings.RETRIEVAL_EXCLUDED_SECTIONS]
+        sections = group_sections(chunks, self.section_tokens)
+        if not sections:
+            raise ValueError("the document has no indexed chunks")
+        # Map: every section on its own, concurrently.
+        digests = await asyncio.gather(
+            *(self._generate(SECTION_PROMPT, source, section["text"]) for section in sections)
+        )
+        calls = len(sections)
+        # Reduce: merge neighbouring digests level by level until one prompt holds them all.
+        level = list(digests)
+        while len(level) > 1 and sum(estimate_tokens(text) for text in level) > self.section_tokens:
+            groups = batch_texts(level, self.section_tokens)
+            level = await asyncio.gather(
+                *(self._generate(COMBINE_PROMPT, source, "\n\n".join(group)) for group in groups)
+            )
+            calls += len(groups)
+        if len(sections) == 1:
+            summary = digests[0]
+        else:
+            summary = await self._generate(PAPER_PROMPT, source, "\n\n".join(level))
+            calls += 1
+        parts = [
+            {"title": section["title"] or f"Part {i + 1}", "chunks": section["chunks"], "summary": digest}
+            for i, (section, digest) in enumerate(zip(sections, digests))
+        ]
+        return summary, parts, calls
+
+    async def _generate(self, template: str, source: str, text: str) -> str:
+        prompt = template.format(source=source, words=self.words, text=text)
+        self._bind_loop()
+        async with self._limit:
+            await chat_gate.aacquire(shed=False)
+            try:
+                with span("summarize"):
+                    response = await self.llm.ainvoke(prompt)
+            finally:
+                chat_gate.release()
+        return response.content.strip()
+
+    # -- serving -----------------------------------------------------------
+
+    def context(self, docs: List[Document]) -> List[str]:
+        """Ready summaries of the papers the chunks come from, as prompt passages (best-ranked paper first)."""
+        versions = {}
+        for doc in docs:
+            doc_id, content_hash = doc.metadata.get("doc_id"), doc.metadata.get("content_hash")
+            if doc_id and content_hash and doc_id not in versions:
+                versions[doc_id] = content_hash
+        ready = self.store.ready(versions.items())
+        sources = {doc.metadata.get("doc_id"): doc.metadata.get("source") for doc in docs}
+        return [
+            f"Summary of {sources[doc_id]}:\n{ready[doc_id]['summary']}"
+            for doc_id in versions if doc_id in ready
+        ]
+
+    def answer(self, query: str, doc_ids: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        A ready summary answering a plain summary request about one document:
+        the one the request is filtered to, else the one named in the query,
+        else the only document. None when there is no such summary, or when the
+        request is about a topic of the paper (see `plain_summary_request`); the
+        agent then answers it with the summary as context.
+        """
+        if not SUMMARY_REQUEST.search(query):
+            return None
+        if doc_ids is not None:
+            candidates = list(doc_ids)
+        else:
+            candidates = [document["id"] for document in self.registry.named_in(query)]
+            if not candidates:
+                candidates = [document["id"] for document in self.registry.list()]
+        if len(candidates) != 1:
+            return None
+        document = self.registry.get(candidates[0])
+        if document is None or not plain_summary_request(query, [document["filename"]]):
+            return None
+        summary = self.store.ready([(document["id"], document["content_hash"])]).get(document["id"])
+        if summary is None:
+            return None
+        self.served += 1
+        sections = "\n\n".join(f"### {part['title']}\n\n{part['summary']}" for part in summary["sections"])
+        response = f"## Summary of {document['filename']}\n\n{summary['summary']}"
+        if len(summary["sections"]) > 1:
+            response += f"\n\n## Section digests\n\n{sections}"
+        return {
+            "agent": "Paper Analyzer",
+            "response": response,
+            "sources": [document["filename"]],
+            "precomputed": True,
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.store.stats(), "in_progress": len(self._tasks), "served": self.served}
+
+
+document_summarizer = DocumentSummarizer(SummaryStore(os.path.join(settings.DATA_DIR, "summaries.db")))
@@ -0,0 +1,489 @@
+import json
+import os
+import struct
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from langchain_core.documents import Document
+
+# Metadata filters are dicts of field -> value (or list of accepted values, or Not(values) to
+# reject them), all of which must match. A field the row lacks matches Not(...).
+Where = Optional[Dict[str, Any]]
+SearchResults = List[List[Tuple[Document, float]]]
+
+
+class VectorStore(ABC):
+    """
+    Storage backend behind RAGService. Embeddings are computed by the caller;
+    backends only store vectors and rank them by cosine similarity.
+    """
+
+    @abstractmethod
+    def add(self, ids: List[str], texts: List[str], embeddings: List[List[float]], metadatas: List[dict]):
+        """Inserts the rows, replacing rows that already have the same id."""
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        pass
+
+    @abstractmethod
+    def get_ids(self, where: Where = None) -> List[str]:
+        pass
+
+    @abstractmethod
+    def search(self, query_embeddings: Sequence[Sequence[float]], k: int = 4, where: Where = None) -> SearchResults:
+        """
+        Returns, for each query vector, up to k (Document, similarity) pairs,
+        best first. Many query vectors can be searched in one call.
+        """
+
+    @abstractmethod
+    def count(self) -> int:
+        pass
+
+
+def normalize(vectors: Sequence[Sequence[float]]) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def top_k(scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Row-wise top-k of a score matrix via argpartition; returns (indices, scores), best first."""
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+class Not(frozenset):
+    """Filter value accepting every value except these, e.g. {"section": Not(["References"])}."""
+
+
+def matches(metadata: dict, where: Where) -> bool:
+    for field, expected in (where or {}).items():
+        value = metadata.get(field)
+        if isinstance(expected, Not):
+            if value in expected:
+                return False
+        elif isinstance(expected, (list, tuple, set)):
+            if value not in expected:
+                return False
+        elif value != expected:
+            return False
+    return True
+
+
+def filter_rows(field_index: Dict[str, Dict[Any, Set[int]]], where: Where) -> Tuple[Optional[Set[int]], Set[int], dict]:
+    """
+    Resolves a filter's conditions on indexed fields. Returns the rows they
+    accept (None = no such condition), the rows they reject, and the
+    conditions on the other fields.
+    """
+    rows, excluded, rest = None, set(), {}
+    for field, expected in where.items():
+        if field not in field_index:
+            rest[field] = expected
+        elif isinstance(expected, Not):
+            excluded.update(*(field_index[field].get(v, ()) for v in expected))
+        else:
+            values = expected if isinstance(expected, (list, tuple, set)) else [expected]
+            found = set().union(*(field_index[field].get(v, set()) for v in values))
+            rows = found if rows is None else rows & found
+    return rows, excluded, rest
+
+
+class ChromaVectorStore(VectorStore):
+    """Chroma collection (the original backend). Reads collections written through LangChain's Chroma."""
+
+    def __init__(self, persist_directory: str, collection_name: str = "sn_insight_docs"):
+        import chromadb
+
+        self.client = chromadb.PersistentClient(path=persist_directory)
+        self.collection = self.client.get_or_create_collection(collection_name)
+        self._max_batch = self.client.get_max_batch_size()
+
+    @staticmethod
+    def _where(where: Where) -> Optional[dict]:
+        clauses = []
+        for field, value in (where or {}).items():
+            if isinstance(value, Not):
+                value = {"$nin": sorted(value)}
+            elif isinstance(value, (list, tuple, set)):
+                value = {"$in": list(value)}
+            clauses.append({field: value})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    def add(self, ids, texts, embeddings, metadatas):
+        for i in range(0, len(ids), self._max_batch):
+            end = i + self._max_batch
+            self.collection.upsert(
+                ids=ids[i:end],
+                embeddings=normalize(embeddings[i:end]),
+                documents=texts[i:end],
+                metadatas=metadatas[i:end],
+            )
+
+    def delete(self, ids):
+        if ids:
+            self.collection.delete(ids=list(ids))
+
+    def get_ids(self, where=None):
+        return self.collection.get(where=self._where(where), include=[])["ids"]
+
+    def search(self, query_embeddings, k=4, where=None):
+        if not len(query_embeddings):
+            return []
+        result = self.collection.query(
+            query_embeddings=normalize(query_embeddings),
+            n_results=k,
+            where=self._where(where),
+            include=["documents", "metadatas", "distances"],
+        )
+        output = []
+        for ids, texts, metadatas, distances in zip(
+            result["ids"], result["documents"], result["metadatas"], result["distances"]
+        ):
+            # Default collections use squared L2; for unit vectors cos = 1 - d / 2.
+            output.append([
+                (Document(id=i, page_content=t, metadata=m or {}), 1.0 - d / 2.0)
+                for i, t, m, d in zip(ids, texts, metadatas, distances)
+            ])
+        return output
+
+    def count(self):
+        return self.collection.count()
+
+
+NPY_HEADER_LEN = 128
+
+
+def write_npy_header(f, shape: Tuple[int, ...], descr: str):
+    """Writes a fixed-size .npy v1.0 header, so it can be patched in place as rows are appended."""
+    header = repr({"descr": descr, "fortran_order": False, "shape": shape}).encode("latin1")
+    padding = NPY_HEADER_LEN - 10 - len(header) - 1
+    f.seek(0)
+    f.write(b"\x93NUMPY\x01\x00" + struct.pack("<H", NPY_HEADER_LEN - 10) + header + b" " * padding + b"\n")
+
+
+def append_npy(path: str, rows: np.ndarray, start: int):
+    """Writes `rows` at row offset `start` of the .npy file (dropping anything after) and patches the header."""
+    rows = np.ascontiguousarray(rows)
+    row_bytes = rows.itemsize * int(np.prod(rows.shape[1:], dtype=np.int64))
+    with open(path, "r+b" if os.path.exists(path) else "w+b") as f:
+        f.seek(NPY_HEADER_LEN + start * row_bytes)
+        f.write(rows.tobytes())
+        f.truncate()
+        write_npy_header(f, (start + len(rows), *rows.shape[1:]), rows.dtype.str)
+
+
+def open_npy(path: str, rows: int) -> Optional[np.ndarray]:
+    """Memory-maps the first `rows` rows of an .npy file (None if it holds fewer)."""
+    if not rows or not os.path.exists(path):
+        return None
+    array = np.load(path, mmap_mode="r")
+    return array[:rows] if len(array) >= rows else None
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Exact in-process index: one contiguous float32 matrix of unit vectors,
+    memory-mapped from `vectors.npy`, searched with a single matrix product
+    plus `argpartition`.
+
+    Appends write only the new rows and patch the fixed-size .npy header.
+    Texts and metadata live in an append-only `rows.jsonl` log; deletions
+    and replaced rows are tombstoned and dropped by `compact()`, which runs
+    automatically once most rows are dead. Single writer per directory.
+
+    Rows are indexed by `indexed_fields`; a filter that leaves at most a
+    quarter of the rows scores only those rows.
+    """
+
+    indexed_fields = ("doc_id", "source", "section")
+    query_block_bytes = 256 * 1024 * 1024
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, "vectors.npy")
+        self.rows_path = os.path.join(directory, "rows.jsonl")
+        self._lock = threading.RLock()
+        self._load()
+
+    # -- persistence -------------------------------------------------------
+
+    def _reset_state(self):
+        self.dim: Optional[int] = None
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self.metadatas: List[dict] = []
+        self.alive = np.zeros(0, dtype=bool)
+        self.row_of: Dict[str, int] = {}
+        self.field_index: Dict[str, Dict[Any, Set[int]]] = {field: {} for field in self.indexed_fields}
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+
+    def _load(self):
+        self._reset_state()
+        rows = 0
+        if os.path.exists(self.vectors_path):
+            rows, dim = np.load(self.vectors_path, mmap_mode="r").shape
+            self.dim = dim or None
+        alive = []
+        if os.path.exists(self.rows_path):
+            with open(self.rows_path, encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record["op"] == "add":
+                        if len(self.ids) >= rows:
+                            break  # vector never made it to disk; ignore the rest
+                        alive.append(True)
+                        self._index_row(len(self.ids), record["id"], record["text"], record["metadata"], alive)
+                    else:
+                        self._tombstone(self.row_of.get(record["id"]), alive)
+        self.alive = np.array(alive, dtype=bool)
+        self._remap(len(self.ids))
+
+    def _remap(self, rows: int):
+        matrix = open_npy(self.vectors_path, rows) if self.dim else None
+        self.matrix = matrix if matrix is not None else np.zeros((0, self.dim or 0), dtype=np.float32)
+
+    def _index_row(self, row: int, chunk_id: str, text: str, metadata: dict, alive):
+        previous = self.row_of.get(chunk_id)
+        if previous is not None:
+            self._tombstone(previous, alive)
+        self.ids.append(chunk_id)
+        self.texts.append(text)
+        self.metadatas.append(metadata)
+        self.row_of[chunk_id] = row
+        for field in self.indexed_fields:
+            if field in metadata:
+                self.field_index[field].setdefault(metadata[field], set()).add(row)
+
+    def _tombstone(self, row: Optional[int], alive):
+        if row is None or not alive[row]:
+            return
+        alive[row] = False
+        metadata = self.metadatas[row]
+        self.row_of.pop(self.ids[row], None)
+        for field in self.indexed_fields:
+            if field in metadata:
+                self.field_index[field].get(metadata[field], set()).discard(row)
+
+    # -- writes ------------------------------------------------------------
+
+    def add(self, ids, texts, embeddings, metadatas):
+        if not ids:
+            return
+        vectors = normalize(embeddings)
+        with self._lock:
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional embeddings, got {vectors.shape[1]}")
+            start = len(self.ids)
+            self._append_vectors(vectors, start)
+            with open(self.rows_path, "a", encoding="utf-8") as f:
+                for chunk_id, text, metadata in zip(ids, texts, metadatas):
+                    f.write(json.dumps({"op": "add", "id": chunk_id, "text": text, "metadata": metadata}) + "\n")
+            alive = np.concatenate([self.alive, np.ones(len(ids), dtype=bool)])
+            for offset, (chunk_id, text, metadata) in enumerate(zip(ids, texts, metadatas)):
+                self._index_row(start + offset, chunk_id, text, metadata, alive)
+            self.alive = alive
+            self._remap(len(self.ids))
+
+    def _append_vectors(self, vectors: np.ndarray, start: int):
+        append_npy(self.vectors_path, vectors, start)
+
+    def delete(self, ids):
+        with self._lock:
+            deleted = [i for i in ids if i in self.row_of]
+            if not deleted:
+                return
+            with open(self.rows_path, "a", encoding="utf-8") as f:
+                for chunk_id in deleted:
+                    f.write(json.dumps({"op": "del", "id": chunk_id}) + "\n")
+            alive = self.alive
+            for chunk_id in deleted:
+                self._tombstone(self.row_of.get(chunk_id), alive)
+            dead = len(alive) - int(alive.sum())
+            if dead > 1000 and dead > len(alive) // 2:
+                self.compact()
+
+    def compact(self):
+        """Rewrites both files without dead rows."""
+        with self._lock:
+            keep = np.flatnonzero(self.alive)
+            vectors = np.array(self.matrix[keep]) if len(keep) else np.zeros((0, self.dim or 0), np.float32)
+            rows = [(self.ids[r], self.texts[r], self.metadatas[r]) for r in keep]
+            tmp_vectors, tmp_rows = self.vectors_path + ".tmp", self.rows_path + ".tmp"
+            append_npy(tmp_vectors, vectors, 0)
+            with open(tmp_rows, "w", encoding="utf-8") as f:
+                for chunk_id, text, metadata in rows:
+                    f.write(json.dumps({"op": "add", "id": chunk_id, "text": text, "metadata": metadata}) + "\n")
+            self.matrix = np.zeros((0, 0), dtype=np.float32)  # release the old mapping
+            os.replace(tmp_vectors, self.vectors_path)
+            os.replace(tmp_rows, self.rows_path)
+            self._load()
+
+    # -- reads -------------------------------------------------------------
+
+    def _candidate_rows(self, where: Where) -> Optional[np.ndarray]:
+        """Boolean mask of live rows passing the filter (None = all live rows)."""
+        if not where:
+            return None
+        rows, excluded, rest = filter_rows(self.field_index, where)
+        if rows is None:
+            mask = np.array([matches(m, rest) for m in self.metadatas], dtype=bool) if rest else self.alive.copy()
+        else:
+            mask = np.zeros(len(self.ids), dtype=bool)
+            mask[[r for r in rows if matches(self.metadatas[r], rest)]] = True
+        mask[list(excluded)] = False
+        return mask & self.alive
+
+    def get_ids(self, where=None):
+        with self._lock:
+            mask = self._candidate_rows(where)
+            rows = np.flatnonzero(self.alive if mask is None else mask)
+            return [self.ids[r] for r in rows]
+
+    def _rank(self, queries: np.ndarray, dead: Optional[np.ndarray], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the (queries x k) best rows and their scores, best first."""
+        scores = queries @ self.matrix.T
+        if dead is not None:
+            scores[:, dead] = -np.inf
+        return top_k(scores, k)
+
+    def search(self, query_embeddings, k=4, where=None):
+        if not len(query_embeddings):
+            return []
+        queries = normalize(query_embeddings)
+        with self._lock:
+            n = len(self.ids)
+            mask = self._candidate_rows(where)
+            valid = self.alive if mask is None else mask
+            live = int(valid.sum())
+            if n == 0 or live == 0:
+                return [[] for _ in range(len(queries))]
+            k = min(k, live)
+            if mask is not None and live * 4 <= n:
+                # Selective filter: score only the matching rows (exactly, for every backend).
+                rows = np.flatnonzero(valid)
+                scores = queries @ np.asarray(self.matrix[rows]).T
+                top, top_scores = top_k(scores, k)
+                return [self._hits(rows[r], s) for r, s in zip(top, top_scores)]
+            dead = ~valid if live < n else None
+            # Bound the (queries x rows) score matrix for large indexes.
+            block = max(1, self.query_block_bytes // (4 * n))
+            results = []
+            for i in range(0, len(queries), block):
+                rows, scores = self._rank(queries[i:i + block], dead, k)
+                results.extend(self._hits(r, s) for r, s in zip(rows, scores))
+            return results
+
+    def _hits(self, rows: Sequence[int], scores: Sequence[float]) -> List[Tuple[Document, float]]:
+        return [
+            (Document(id=self.ids[r], page_content=self.texts[r], metadata=dict(self.metadatas[r])), float(s))
+            for r, s in zip(rows, scores)
+        ]
+
+    def count(self):
+        return int(self.alive.sum())
+
+
+def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-vector int8 quantization: v ~= codes * scale, scale = max|v| / 127."""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+class Int8VectorStore(NumpyVectorStore):
+    """
+    NumpyVectorStore that scans int8 codes instead of float32 vectors:
+    each vector is stored as `codes.npy` (1 byte per dimension) plus one
+    float32 scale in `scales.npy`, a quarter of the bytes read per query.
+
+    The top `k * rerank_factor` candidates from the approximate scan are
+    re-scored exactly against the float32 vectors, which stay on disk in
+    `vectors.npy` and are only paged in for those rows, so returned scores
+    are exact cosine similarities.
+    """
+
+    # Codes are widened to float32 a cache-sized block at a time.
+    scan_block_bytes = 4 * 1024 * 1024
+
+    def __init__(self, directory: str, rerank_factor: int = 4):
+        self.codes_path = os.path.join(directory, "codes.npy")
+        self.scales_path = os.path.join(directory, "scales.npy")
+        self.rerank_factor = max(1, rerank_factor)
+        super().__init__(directory)
+
+    def _remap(self, rows: int):
+        super()._remap(rows)
+        self.codes = open_npy(self.codes_path, rows) if self.dim else None
+        self.scales = open_npy(self.scales_path, rows) if self.dim else None
+        if rows and (self.codes is None or self.scales is None):
+            # Index written by the float32 store, or codes lost mid-write: rebuild them.
+            block = self._scan_block_rows()
+            for start in range(0, rows, block):
+                self._append_codes(np.asarray(self.matrix[start:start + block]), start)
+            self.codes = open_npy(self.codes_path, rows)
+            self.scales = open_npy(self.scales_path, rows)
+
+    def _scan_block_rows(self) -> int:
+        return max(1, self.scan_block_bytes // (4 * (self.dim or 1)))
+
+    def _append_vectors(self, vectors: np.ndarray, start: int):
+        super()._append_vectors(vectors, start)
+        self._append_codes(vectors, start)
+
+    def _append_codes(self, vectors: np.ndarray, start: int):
+        codes, scales = quantize(vectors)
+        append_npy(self.codes_path, codes, start)
+        append_npy(self.scales_path, scales, start)
+
+    def compact(self):
+        with self._lock:
+            # Rebuilt from the compacted vectors when the store reloads.
+            self.codes = self.scales = None
+            for path in (self.codes_path, self.scales_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            super().compact()
+
+    def _rank(self, queries, dead, k):
+        n = len(self.ids)
+        approx = np.empty((len(queries), n), dtype=np.float32)
+        block = self._scan_block_rows()
+        for start in range(0, n, block):
+            end = min(n, start + block)
+            codes = self.codes[start:end].astype(np.float32)
+            approx[:, start:end] = (queries @ codes.T) * self.scales[start:end]
+        if dead is not None:
+            approx[:, dead] = -np.inf
+        candidates, approx_scores = top_k(approx, min(n, k * self.rerank_factor))
+        vectors = self.matrix[candidates.ravel()].reshape(*candidates.shape, self.dim)
+        exact = np.einsum("qcd,qd->qc", vectors, queries)
+        exact[np.isneginf(approx_scores)] = -np.inf
+        order, scores = top_k(exact, k)
+        return np.take_along_axis(candidates, order, axis=1), scores
+
+    def memory_per_vector(self) -> Dict[str, int]:
+        """Bytes per vector scanned on every query vs. kept on disk for re-ranking."""
+        dim = self.dim or 0
+        return {"scanned": dim + 4, "rerank_only": 4 * dim}
+
+
+def make_vector_store(backend: str, data_dir: str, rerank_factor: int = 4) -> VectorStore:
+    if backend == "numpy":
+        return NumpyVectorStore(os.path.join(data_dir, "numpy_index"))
+    if backend == "numpy-int8":
+        return Int8VectorStore(os.path.join(data_dir, "numpy_index"), rerank_factor=rerank_factor)
+    if backend == "chroma":
+        return ChromaVectorStore(os.path.join(data_dir, "chroma_db"))
+    raise ValueError(f"Unknown VECTOR_BACKEND '{backend}'")
@@ -0,0 +1,97 @@
+"""
+Throughput of an evaluation job: --queries questions answered one /query call
+at a time (each call embeds and searches on its own) vs. one batch, where
+the questions are embedded in one call, searched in one pass and answered
+BATCH_MAX_CONCURRENCY at a time.
+
+Runs offline against a fresh DATA_DIR with the fake chat model and fake
+embeddings from app.services.fakes; their latencies stand in for Gemini's.
+
+Usage (from backend/):
+    python -m benchmarks.bench_batch --queries 40 --concurrency 4
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+WORDS = (
+    "attention model sequence layer encoder decoder token training dataset loss gradient "
+    "benchmark accuracy baseline transformer embedding retrieval corpus query graph network "
+    "parameter inference latency memory batch optimizer schedule evaluation ablation result"
+).split()
+# Routed by the local router, so every question costs one retrieval and one (fake) LLM answer.
+TEMPLATES = [
+    "Summarize the methodology of the paper on {} and {}",
+    "What are the limitations of the {} {} approach?",
+    "Generate code for the {} {} model described in the paper",
+    "Plan a dashboard for the {} {} results",
+]
+
+
+def questions(n: int, rng: random.Random):
+    return [TEMPLATES[i % len(TEMPLATES)].format(*rng.sample(WORDS, 2)) for i in range(n)]
+
+
+async def run(args):
+    from app.agents.orchestrator import orchestrator
+    from app.services.fakes import FakeChatModel
+
+    rng = random.Random(0)
+    rag = orchestrator.rag
+    for d in range(args.docs):
+        text = " ".join(rng.choice(WORDS) for _ in range(args.words))
+        rag.add_document(text, {"source": f"paper-{d}.pdf", "doc_id": f"paper-{d}"})
+    fake = FakeChatModel(tokens=50, first_token_latency=args.llm_latency)
+    orchestrator.llm = fake
+    for agent in orchestrator.agents.values():
+        agent.llm = fake
+    embeddings = rag.embeddings.embeddings
+    context = {"retrieval_mode": args.mode, "bypass_cache": True}
+
+    async def sequential(queries):
+        for query in queries:
+            await orchestrator.process_query(query, context)
+
+    async def batch(queries):
+        async for _ in orchestrator.process_batch(queries, context):
+            pass
+
+    print(f"{args.queries} questions, {args.mode} retrieval, LLM {args.llm_latency:g}s, "
+          f"embedding call {args.embedding_latency:g}s, batch concurrency {args.concurrency}")
+    print(f"{'path':>12} {'seconds':>8} {'queries/min':>11} {'embed_calls':>11} {'llm_calls':>9}")
+    for name, path in (("sequential", sequential), ("batch", batch)):
+        # Fresh questions per path, so neither finds the other's embeddings in the cache.
+        queries = questions(args.queries, rng)
+        embed_calls, llm_calls = embeddings.calls, fake.calls
+        start = time.perf_counter()
+        await path(queries)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>12} {elapsed:>8.2f} {args.queries / elapsed * 60:>11.1f} "
+              f"{embeddings.calls - embed_calls:>11} {fake.calls - llm_calls:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=4, help="BATCH_MAX_CONCURRENCY")
+    parser.add_argument("--mode", default="vector", choices=["vector", "hybrid"])
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="fake LLM seconds per answer")
+    parser.add_argument("--embedding-latency", type=float, default=0.1, help="fake seconds per embedding call")
+    parser.add_argument("--docs", type=int, default=20, help="synthetic documents to index")
+    parser.add_argument("--words", type=int, default=2000, help="words per document")
+    args = parser.parse_args()
+    # Settings are read at import time, so configure them before importing the app.
+    os.environ.setdefault("GOOGLE_API_KEY", "unused")
+    os.environ.setdefault("LLM_PROVIDER", "fake")
+    os.environ.setdefault("EMBEDDING_PROVIDER", "fake")
+    os.environ["FAKE_EMBEDDING_LATENCY"] = str(args.embedding_latency)
+    os.environ["BATCH_MAX_CONCURRENCY"] = str(args.concurrency)
+    os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="bench-batch-")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
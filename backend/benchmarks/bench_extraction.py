@@ -0,0 +1,106 @@
+"""
+Query latency while PDFs are being extracted, before and after the process pool.
+
+"before" runs `IngestionService.extract_text` directly on the event loop, the
+way `process_document` used to. "after" goes through the extraction pool.
+Meanwhile a probe keeps issuing requests against the ASGI app and records
+their latency, which is what any concurrent `/query` call would experience.
+
+Usage (from backend/):
+    python -m benchmarks.bench_extraction --pages 300 --uploads 2
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import httpx
+
+from app.main import app
+from app.services.extraction import ExtractionPool
+from app.services.ingestion import ingestion_service
+from benchmarks.pdfgen import make_pdf
+
+
+async def probe(client: httpx.AsyncClient, stop: asyncio.Event, latencies: list, interval: float = 0.01):
+    # Open loop: a client request arrives every `interval` whether or not the
+    # server keeps up, and its latency is measured from its arrival time, so
+    # time spent queued behind a blocked event loop is counted.
+    async def request(arrival: float):
+        await client.get("/")
+        latencies.append((time.perf_counter() - arrival) * 1000)
+
+    tasks = []
+    arrival = time.perf_counter()
+    while True:
+        now = time.perf_counter()
+        while arrival <= now:
+            tasks.append(asyncio.create_task(request(arrival)))
+            arrival += interval
+        if stop.is_set():
+            break
+        await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+    await asyncio.gather(*tasks)
+
+
+async def run(mode: str, pdf_path: str, uploads: int, pool: ExtractionPool) -> dict:
+    latencies = []
+    stop = asyncio.Event()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        probe_task = asyncio.create_task(probe(client, stop, latencies))
+        await asyncio.sleep(0.05)
+
+        async def upload():
+            if mode == "before":
+                # What process_document used to do: extract on the event loop.
+                return ingestion_service.extract_text(pdf_path)
+            return await pool.extract_text(pdf_path)
+
+        start = time.perf_counter()
+        texts = await asyncio.gather(*(upload() for _ in range(uploads)))
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await probe_task
+
+    latencies.sort()
+    return {
+        "mode": mode,
+        "extract_s": round(elapsed, 2),
+        "chars": len(texts[0]),
+        "probe_requests": len(latencies),
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] if len(latencies) > 1 else latencies[0], 1),
+        "max_ms": round(latencies[-1], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--uploads", type=int, default=2, help="concurrent uploads")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--pages-per-task", type=int, default=25)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = make_pdf(os.path.join(tmp, "bench.pdf"), args.pages)
+        pool = ExtractionPool(max_workers=args.workers, pages_per_task=args.pages_per_task)
+        try:
+            # Warm the pool so worker start-up is not billed to the first upload.
+            asyncio.run(pool.extract_text(make_pdf(os.path.join(tmp, "warm.pdf"), 1)))
+            for mode in ("before", "after"):
+                result = asyncio.run(run(mode, pdf_path, args.uploads, pool))
+                print(
+                    f"{result['mode']:>6}: extract {result['extract_s']}s for {args.uploads}x{args.pages} pages | "
+                    f"probe n={result['probe_requests']} p50={result['p50_ms']}ms "
+                    f"p99={result['p99_ms']}ms max={result['max_ms']}ms"
+                )
+        finally:
+            pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Latency of a compound request ("summarize this paper, list its limitations
+and give me starter code") answered by concurrent agents in one request,
+vs. the same three tasks sent one after another.
+
+Agents use a fake chat model (no API calls) with a different latency per
+agent; retrieval runs in lexical mode.
+
+Usage (from backend/):
+    python -m benchmarks.bench_fanout --latencies 1.2,0.8,1.5 --runs 3
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+QUERY = "Summarize this paper, list its limitations and give me starter code"
+
+
+async def run(latencies, runs: int):
+    from app.agents.orchestrator import orchestrator
+    from app.services.fakes import FakeChatModel
+
+    plan = orchestrator.plan(QUERY)
+    for (agent, _), latency in zip(plan, latencies):
+        agent.llm = FakeChatModel(tokens=100, first_token_latency=latency)
+    context = {"retrieval_mode": "lexical", "bypass_cache": True}
+
+    sequential, fanout, slowest = [], [], []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for _, task in plan:
+            await orchestrator.process_query(task, context)
+        sequential.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        result = await orchestrator.process_query(QUERY, context)
+        fanout.append(time.perf_counter() - start)
+        slowest.append(max(part["elapsed_ms"] for part in result["parts"]) / 1000)
+
+    print(f"agents: {', '.join(f'{agent.name} ({latency:g}s)' for (agent, _), latency in zip(plan, latencies))}")
+    print(f"{'mode':>22} {'median_s':>9}")
+    print(f"{'three requests':>22} {statistics.median(sequential):>9.2f}")
+    print(f"{'one compound request':>22} {statistics.median(fanout):>9.2f}")
+    print(f"{'slowest agent':>22} {statistics.median(slowest):>9.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latencies", default="1.2,0.8,1.5", help="fake LLM seconds per agent, in plan order")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    os.environ.setdefault("GOOGLE_API_KEY", "unused")
+    asyncio.run(run([float(x) for x in args.latencies.split(",")], args.runs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Memory and throughput of ingesting a synthetic N-page PDF, whole-document
+vs. page-by-page streaming.
+
+"whole" is the previous pipeline: extract every page, join them into one
+string, then chunk and embed it (`aextract_text` + `index_text`). "stream"
+is `IngestionService.index_file`: pages are chunked as they are extracted
+and chunks are embedded in batches.
+
+Each mode runs in a fresh subprocess with its own DATA_DIR, fake
+embeddings (no API calls; --embed-latency simulates the round trip) and
+the numpy vector store. Reported per mode: wall time, pages/s, peak
+Python heap of the ingesting process (tracemalloc; extraction workers are
+separate processes and not included), and the time until the first chunk
+was searchable.
+
+Usage (from backend/):
+    python -m benchmarks.bench_ingestion --pages 1000
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+async def ingest(mode: str, pdf_path: str, embed_latency: float) -> dict:
+    import app.services.rag as rag_module
+    from app.services.embedding_scheduler import EmbeddingScheduler
+    from app.services.extraction import extraction_pool
+    from app.services.fakes import FakeEmbeddings
+    from app.services.ingestion import ingestion_service
+    from app.services.rag import RAGService
+    from app.services.vectorstores import make_vector_store
+    from app.core.config import settings
+
+    rag = RAGService(
+        embeddings=FakeEmbeddings(latency=embed_latency),
+        scheduler=EmbeddingScheduler(requests_per_minute=1e9, tokens_per_minute=1e12),
+        vector_store=make_vector_store("numpy", settings.DATA_DIR),
+    )
+    rag_module._rag_service = rag
+    first_searchable = []
+    add = rag.vector_store.add
+
+    def timed_add(*args, **kwargs):
+        add(*args, **kwargs)
+        if not first_searchable:
+            first_searchable.append(time.perf_counter())
+
+    rag.vector_store.add = timed_add
+    with open(pdf_path, "rb") as f:
+        from fastapi import UploadFile
+
+        document = await ingestion_service.register_upload(UploadFile(file=f, filename="bench.pdf"))
+    # Start the extraction workers outside the measurement.
+    await extraction_pool.extract_text(pdf_path.replace("bench.pdf", "warm.pdf"))
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    if mode == "whole":
+        text = await ingestion_service.aextract_text(document["file_path"])
+        result = await asyncio.to_thread(ingestion_service.index_text, text, document["id"])
+        del text
+    else:
+        result = await ingestion_service.index_file(document["id"])
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    extraction_pool.shutdown()
+    return {
+        "mode": mode,
+        "seconds": elapsed,
+        "chunks": result["chunks"],
+        "status": result["status"],
+        "peak_mb": peak / 2 ** 20,
+        "first_searchable_s": first_searchable[0] - start if first_searchable else None,
+    }
+
+
+def run_mode(mode: str, pdf_path: str, embed_latency: float) -> dict:
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(os.environ, DATA_DIR=data_dir)
+        env.setdefault("GOOGLE_API_KEY", "unused")
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_ingestion", "--child", mode, "--pdf", pdf_path,
+             "--embed-latency", str(embed_latency)],
+            env=env, check=True, capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ).stdout
+        return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="fake seconds per embedding request")
+    parser.add_argument("--child", choices=["whole", "stream"], help=argparse.SUPPRESS)
+    parser.add_argument("--pdf", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(ingest(args.child, args.pdf, args.embed_latency))))
+        return
+
+    from benchmarks.pdfgen import make_pdf
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = make_pdf(os.path.join(tmp, "bench.pdf"), args.pages)
+        make_pdf(os.path.join(tmp, "warm.pdf"), 1)
+        print(f"{args.pages} pages, {os.path.getsize(pdf_path) / 2 ** 20:.1f} MB PDF")
+        print(f"{'mode':>6} {'chunks':>7} {'seconds':>8} {'pages/s':>8} {'peak_MB':>8} {'first_searchable_s':>19}")
+        for mode in ("whole", "stream"):
+            r = run_mode(mode, pdf_path, args.embed_latency)
+            print(f"{r['mode']:>6} {r['chunks']:>7} {r['seconds']:>8.1f} {args.pages / r['seconds']:>8.1f} "
+                  f"{r['peak_mb']:>8.1f} {r['first_searchable_s']:>19.2f}")
+
+
+if __name__ == "__main__":
+    main()
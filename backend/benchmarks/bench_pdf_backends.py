@@ -0,0 +1,50 @@
+"""
+Pages per second of each PDF text backend on a synthetic PDF, plus a
+re-extraction of the same file served from the extraction cache.
+
+Runs in-process (no worker pool) so the numbers are per core.
+
+Usage (from backend/):
+    python -m benchmarks.bench_pdf_backends --pages 200
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from app.services.extraction import ExtractionPool
+from app.services.extraction_cache import ExtractionCache
+from benchmarks.pdfgen import make_pdf
+
+
+async def run(pdf_path: str, pages: int, tmp: str):
+    print(f"{'backend':>16} {'seconds':>8} {'pages/s':>9} {'fallback':>9}")
+    for backend in ("pdfplumber", "pypdf", "auto"):
+        pool = ExtractionPool(max_workers=0, backend=backend)
+        start = time.perf_counter()
+        await pool.extract_text(pdf_path)
+        elapsed = time.perf_counter() - start
+        print(f"{backend:>16} {elapsed:>8.2f} {pages / elapsed:>9.1f} {pool.stats()['fallback_pages']:>9}")
+
+    pool = ExtractionPool(max_workers=0, cache=ExtractionCache(os.path.join(tmp, "cache.db")))
+    await pool.extract_text(pdf_path)
+    start = time.perf_counter()
+    await pool.extract_text(pdf_path)
+    elapsed = time.perf_counter() - start
+    print(f"{'auto (cached)':>16} {elapsed:>8.2f} {pages / elapsed:>9.1f} {'-':>9}")
+    print(f"cache: {pool.stats()['cache']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = make_pdf(os.path.join(tmp, "bench.pdf"), args.pages)
+        asyncio.run(run(pdf_path, args.pages, tmp))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Int8 quantized index vs. the float32 exact index: bytes scanned per vector,
+recall@k against exact search and single-query p50/p99 latency, for a few
+re-rank factors.
+
+Usage (from backend/):
+    python -m benchmarks.bench_quantization --sizes 100000,1000000 --dim 768
+    python -m benchmarks.bench_quantization --sizes 10000 --rerank 1,2,4,8
+"""
+import argparse
+import os
+import tempfile
+
+import numpy as np
+
+from app.services.vectorstores import Int8VectorStore, NumpyVectorStore, normalize
+from benchmarks.bench_vectorstores import exact_top_k, make_vectors, measure
+
+
+def fill(store, vectors: np.ndarray, batch: int = 5000):
+    for i in range(0, len(vectors), batch):
+        rows = range(i, min(len(vectors), i + batch))
+        store.add([str(r) for r in rows], [""] * len(rows), vectors[i:i + batch], [{"doc_id": "bench"}] * len(rows))
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100000")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rerank", default="1,2,4,8", help="re-rank factors to try")
+    args = parser.parse_args()
+
+    print(f"{'index':>12} {'n':>9} {'bytes/vec':>9} {'index_MB':>9} {'recall@k':>9} {'p50_ms':>8} {'p99_ms':>8}")
+    for n in (int(s) for s in args.sizes.split(",")):
+        vectors = make_vectors(n, args.dim)
+        rng = np.random.default_rng(1)
+        queries = normalize(vectors[rng.integers(0, n, args.queries)] + rng.normal(
+            scale=0.3, size=(args.queries, args.dim)).astype(np.float32))
+        truth = exact_top_k(vectors, queries, args.k)
+        with tempfile.TemporaryDirectory() as tmp:
+            store = fill(NumpyVectorStore(os.path.join(tmp, "float32")), vectors)
+            r = measure(store, queries, truth, args.k)
+            per_vector = 4 * args.dim
+            print(f"{'float32':>12} {n:>9} {per_vector:>9} {per_vector * n / 2**20:>9.1f} {r['recall']:>9} "
+                  f"{r['p50_ms']:>8} {r['p99_ms']:>8}")
+            del store
+
+            store = fill(Int8VectorStore(os.path.join(tmp, "int8")), vectors)
+            per_vector = store.memory_per_vector()["scanned"]
+            for factor in (int(f) for f in args.rerank.split(",")):
+                store.rerank_factor = factor
+                r = measure(store, queries, truth, args.k)
+                print(f"{f'int8 x{factor}':>12} {n:>9} {per_vector:>9} {per_vector * n / 2**20:>9.1f} "
+                      f"{r['recall']:>9} {r['p50_ms']:>8} {r['p99_ms']:>8}")
+            del store
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Local router vs. the LLM router on a labelled query set
+(benchmarks/data/routing_eval.jsonl): accuracy, share of queries answered
+locally, and routing latency.
+
+The local router is measured cold (first pass) and warm (second pass, served
+from its decision cache). --llm also measures the Gemini router and the
+combined path (local first, LLM on fallback); it needs GOOGLE_API_KEY and
+spends one request per query.
+
+Usage (from backend/):
+    python -m benchmarks.bench_routing
+    python -m benchmarks.bench_routing --llm
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+EVAL_SET = os.path.join(os.path.dirname(__file__), "data", "routing_eval.jsonl")
+
+
+def load_eval_set(path: str = EVAL_SET):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+
+def report(label: str, rows, decisions, latencies_ms):
+    answered = [(row, agent) for row, agent in zip(rows, decisions) if agent is not None]
+    correct = sum(1 for row, agent in answered if agent == row["agent"])
+    print(f"{label:>14} {len(answered) / len(rows):>9.1%} {correct / max(1, len(answered)):>13.1%} "
+          f"{correct / len(rows):>9.1%} {percentile(latencies_ms, 0.5):>9.3f} {percentile(latencies_ms, 0.99):>9.3f}")
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--llm", action="store_true", help="also measure the Gemini router (network, API quota)")
+    args = parser.parse_args()
+    from app.agents.orchestrator import OrchestratorAgent
+    from app.agents.router import LocalRouter
+    from app.core.config import settings
+
+    orchestrator = OrchestratorAgent()
+    router = LocalRouter()
+    router.fit(orchestrator.agents.descriptions())
+    rows = load_eval_set()
+
+    print(f"{len(rows)} labelled queries")
+    print(f"{'router':>14} {'answered':>9} {'acc@answered':>13} {'accuracy':>9} {'p50_ms':>9} {'p99_ms':>9}")
+    for label in ("local (cold)", "local (warm)"):
+        decisions, latencies = zip(*(timed(router.route, row["query"]) for row in rows))
+        report(label, rows, decisions, latencies)
+
+    if args.llm:
+        settings.ROUTING_MODE = "llm"
+
+        async def llm_route(query):
+            start = time.perf_counter()
+            agent = await orchestrator.route_query(query)
+            return agent, (time.perf_counter() - start) * 1000
+
+        llm = [asyncio.run(llm_route(row["query"])) for row in rows]
+        report("llm", rows, [a for a, _ in llm], [ms for _, ms in llm])
+
+        cold = LocalRouter()
+        cold.fit(orchestrator.agents.descriptions())
+        combined, latencies = [], []
+        for row, (llm_agent, llm_ms) in zip(rows, llm):
+            agent, ms = timed(cold.route, row["query"])
+            combined.append(agent or llm_agent)
+            latencies.append(ms if agent else ms + llm_ms)
+        report("local+llm", rows, combined, latencies)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Cold-start cost of the API: time until the app is ready to serve, and the
+latency of the first and second POST /query in a fresh interpreter, which
+is where lazily built agents, LLM clients and the RAG service are paid for.
+
+Each run is a new subprocess with LLM_PROVIDER=fake (no API calls),
+retrieval in lexical mode and its own empty DATA_DIR. Also reports how
+many of the six agents were constructed and whether the Gemini SDK was
+imported by then.
+
+Usage (from backend/):
+    python -m benchmarks.bench_startup --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+CHILD = r"""
+import json, sys, time
+start = time.perf_counter()
+from fastapi.testclient import TestClient
+import app.main
+from app.core.config import settings
+imported = time.perf_counter()
+with TestClient(app.main.app) as client:
+    ready = time.perf_counter()
+    body = {"query": "Summarize the key findings", "retrieval_mode": "lexical", "bypass_cache": True}
+    latencies = []
+    for _ in range(2):
+        t = time.perf_counter()
+        client.post(f"{settings.API_PREFIX}/query", json=body).raise_for_status()
+        latencies.append(time.perf_counter() - t)
+from app.agents.orchestrator import orchestrator
+print(json.dumps({
+    "import_s": imported - start,
+    "ready_s": ready - start,
+    "first_query_s": latencies[0],
+    "second_query_s": latencies[1],
+    "agents_built": len(orchestrator.agents.loaded()),
+    "gemini_imported": "langchain_google_genai" in sys.modules,
+}))
+"""
+
+
+def run_once() -> dict:
+    with tempfile.TemporaryDirectory() as data_dir:
+        env = dict(os.environ, LLM_PROVIDER="fake", DATA_DIR=data_dir)
+        env.setdefault("GOOGLE_API_KEY", "unused")
+        out = subprocess.run(
+            [sys.executable, "-c", CHILD], env=env, check=True, capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ).stdout
+        return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    print(f"{'stage':>16} {'median_ms':>10} {'max_ms':>10}")
+    for key in ("import_s", "ready_s", "first_query_s", "second_query_s"):
+        values = [r[key] * 1000 for r in runs]
+        print(f"{key[:-2]:>16} {statistics.median(values):>10.0f} {max(values):>10.0f}")
+    print(f"agents built after 2 queries: {runs[-1]['agents_built']}/6, "
+          f"Gemini SDK imported: {runs[-1]['gemini_imported']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Time to first byte of POST /query vs. the SSE endpoint POST /query/stream,
+over HTTP against an in-process server whose agents use a fake streaming
+chat model (no API calls; retrieval runs in lexical mode).
+
+Usage (from backend/):
+    python -m benchmarks.bench_streaming --tokens 400 --first-token 0.8 --token-latency 0.02
+"""
+import argparse
+import os
+import socket
+import statistics
+import threading
+import time
+
+import httpx
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(app, port: int):
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=400)
+    parser.add_argument("--first-token", type=float, default=0.8, help="fake LLM seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="fake LLM seconds per token")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    os.environ.setdefault("GOOGLE_API_KEY", "unused")
+
+    from app.agents.orchestrator import orchestrator
+    from app.core.config import settings
+    from app.main import app
+    from app.services.fakes import FakeChatModel
+
+    for agent in orchestrator.agents.values():
+        agent.llm = FakeChatModel(
+            tokens=args.tokens, first_token_latency=args.first_token, token_latency=args.token_latency
+        )
+    port = free_port()
+    server, thread = serve(app, port)
+    url = f"http://127.0.0.1:{port}{settings.API_PREFIX}"
+    body = {"query": "Generate code for the model described in the paper", "retrieval_mode": "lexical",
+            "bypass_cache": True}
+
+    blocking, ttfb, first_token, streamed = [], [], [], []
+    with httpx.Client(timeout=120) as client:
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            client.post(f"{url}/query", json=body).raise_for_status()
+            blocking.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            with client.stream("POST", f"{url}/query/stream", json=body) as response:
+                seen_byte = seen_token = False
+                for line in response.iter_lines():
+                    if not seen_byte:
+                        ttfb.append(time.perf_counter() - start)
+                        seen_byte = True
+                    if line == "event: token" and not seen_token:
+                        first_token.append(time.perf_counter() - start)
+                        seen_token = True
+            streamed.append(time.perf_counter() - start)
+    server.should_exit = True
+    thread.join()
+
+    ms = lambda values: f"{statistics.median(values) * 1000:>10.0f}"
+    print(f"{'endpoint':>14} {'ttfb_ms':>10} {'1st_token':>10} {'total_ms':>10}")
+    print(f"{'/query':>14} {ms(blocking)} {ms(blocking)} {ms(blocking)}")
+    print(f"{'/query/stream':>14} {ms(ttfb)} {ms(first_token)} {ms(streamed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Offline benchmark suite: ingestion throughput, retrieval latency, /query
+latency under concurrency and peak memory, with the fake chat model and
+embeddings from app.services.fakes (no API calls, no network besides
+localhost).
+
+Everything runs in one process against a fresh DATA_DIR:
+
+  ingestion   synthetic PDFs uploaded and indexed through IngestionService
+              (pages/s, chunks/s)
+  retrieval   similarity_search per mode over the ingested corpus
+              (p50/p95/p99 ms)
+  query       POST /query over HTTP against an in-process server, with
+              --concurrency requests in flight (p50/p95/p99 ms, requests/s,
+              errors)
+  memory      peak resident set size after each phase
+
+The fakes' latency and failure rates are configurable, so the same run can
+simulate a slow or rate-limited provider. Results are written to --output
+as JSON; --compare prints every metric next to an earlier run's.
+
+Usage (from backend/):
+    python -m benchmarks.bench_suite --output suite.json
+    python -m benchmarks.bench_suite --output new.json --compare suite.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+WORDS = (
+    "attention model sequence layer encoder decoder token training dataset loss gradient "
+    "benchmark accuracy baseline transformer embedding retrieval corpus query graph network "
+    "parameter inference latency memory batch optimizer schedule evaluation ablation result"
+).split()
+# All routed by the local router, so /query latency is one retrieval plus one (fake) LLM answer.
+QUERIES = [
+    "Summarize the methodology of the paper",
+    "What are the limitations of this approach?",
+    "Generate code for the model described in the paper",
+    "Plan a dashboard for these results",
+    "Describe the dataset used for evaluation",
+]
+
+
+def percentiles(seconds) -> dict:
+    """p50/p95/p99 (nearest rank) and mean of `seconds`, in milliseconds."""
+    ordered = sorted(seconds)
+    if not ordered:
+        return {}
+    rank = lambda p: ordered[min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))]
+    return {
+        "p50_ms": round(rank(50) * 1000, 2),
+        "p95_ms": round(rank(95) * 1000, 2),
+        "p99_ms": round(rank(99) * 1000, 2),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+    }
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return round(peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10, 1)
+
+
+def page_lines(seed: int):
+    def lines(page_no: int, lines_per_page: int):
+        rng = random.Random(seed * 100003 + page_no)
+        return [" ".join(rng.choice(WORDS) for _ in range(12)) for _ in range(lines_per_page)]
+
+    return lines
+
+
+async def bench_ingestion(tmp: str, docs: int, pages: int) -> dict:
+    from fastapi import UploadFile
+
+    from app.services.extraction import extraction_pool
+    from app.services.ingestion import ingestion_service
+    from benchmarks.pdfgen import make_pdf
+
+    paths = [make_pdf(os.path.join(tmp, f"paper{i}.pdf"), pages, page_lines=page_lines(i)) for i in range(docs)]
+    # Start the extraction workers outside the measurement.
+    await extraction_pool.extract_text(make_pdf(os.path.join(tmp, "warm.pdf"), 1))
+
+    chunks, failed = 0, 0
+    start = time.perf_counter()
+    for path in paths:
+        with open(path, "rb") as f:
+            document = await ingestion_service.register_upload(UploadFile(file=f, filename=os.path.basename(path)))
+        result = await ingestion_service.index_file(document["id"])
+        chunks += result["chunks"]
+        failed += result["status"] != "ingested_and_indexed"
+    elapsed = time.perf_counter() - start
+    return {
+        "documents": docs,
+        "pages": docs * pages,
+        "chunks": chunks,
+        "failed": failed,
+        "seconds": round(elapsed, 3),
+        "pages_per_s": round(docs * pages / elapsed, 1),
+        "chunks_per_s": round(chunks / elapsed, 1),
+    }
+
+
+def bench_retrieval(queries: int, k: int) -> dict:
+    from app.services.rag import get_rag_service
+
+    rag = get_rag_service()
+    rng = random.Random(1)
+    # Distinct queries, so vector search is not just served by the embedding cache.
+    texts = [" ".join(rng.sample(WORDS, 4)) for _ in range(queries)]
+    results = {}
+    for mode in ("vector", "lexical", "hybrid"):
+        latencies, errors = [], 0
+        for text in texts:
+            start = time.perf_counter()
+            try:
+                rag.similarity_search(f"{mode} {text}", k=k, mode=mode)
+            except Exception:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+        results[mode] = {"errors": errors, **percentiles(latencies)}
+    return results
+
+
+async def bench_query(url: str, requests: int, concurrency: int, mode: str) -> dict:
+    gate = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(client: httpx.AsyncClient, i: int):
+        nonlocal errors
+        body = {"query": QUERIES[i % len(QUERIES)], "retrieval_mode": mode, "bypass_cache": True}
+        async with gate:
+            start = time.perf_counter()
+            try:
+                response = await client.post(url, json=body)
+                failed = response.status_code != 200 or str(response.json().get("status", "")).startswith("error")
+            except httpx.HTTPError:
+                failed = True
+            latencies.append(time.perf_counter() - start)
+            errors += failed
+
+    async with httpx.AsyncClient(timeout=300) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(one(client, i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "retrieval_mode": mode,
+        "errors": errors,
+        "requests_per_s": round(requests / elapsed, 2),
+        **percentiles(latencies),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def run(args, tmp: str) -> dict:
+    from app.core.config import settings
+    from app.main import app
+    from app.services.extraction import extraction_pool
+    from benchmarks.bench_streaming import free_port, serve
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "vector_backend": settings.VECTOR_BACKEND,
+            "args": vars(args),
+        },
+    }
+    memory = {}
+    results["ingestion"] = asyncio.run(bench_ingestion(tmp, args.docs, args.pages))
+    extraction_pool.shutdown()
+    memory["after_ingestion_mb"] = peak_rss_mb()
+
+    results["retrieval"] = bench_retrieval(args.queries, args.k)
+    memory["after_retrieval_mb"] = peak_rss_mb()
+
+    port = free_port()
+    server, thread = serve(app, port)
+    try:
+        url = f"http://127.0.0.1:{port}{settings.API_PREFIX}/query"
+        results["query"] = asyncio.run(bench_query(url, args.requests, args.concurrency, args.mode))
+    finally:
+        server.should_exit = True
+        thread.join()
+    memory["peak_rss_mb"] = peak_rss_mb()
+    results["memory"] = memory
+    return results
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in results.items():
+        if key == "meta":
+            continue
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def report(results: dict, previous: dict = None):
+    new, old = flatten(results), flatten(previous or {})
+    width = max(len(key) for key in new)
+    if previous:
+        print(f"compared with {previous['meta'].get('commit') or '?'} ({previous['meta'].get('timestamp', '?')})")
+        print(f"{'metric':<{width}} {'before':>10} {'after':>10} {'change':>8}")
+    else:
+        print(f"{'metric':<{width}} {'value':>10}")
+    for key, value in new.items():
+        if not previous:
+            print(f"{key:<{width}} {value:>10g}")
+            continue
+        before = old.get(key)
+        change = f"{value / before - 1:>+8.1%}" if before else f"{'-':>8}"
+        print(f"{key:<{width}} {before if before is not None else '-':>10} {value:>10g} {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="bench_suite.json", help="where to write the JSON results")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--docs", type=int, default=5, help="synthetic PDFs to ingest")
+    parser.add_argument("--pages", type=int, default=40, help="pages per PDF")
+    parser.add_argument("--queries", type=int, default=50, help="retrieval calls per mode")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=100, help="total POST /query requests")
+    parser.add_argument("--concurrency", type=int, default=10, help="/query requests in flight")
+    parser.add_argument("--mode", default="hybrid", choices=["vector", "lexical", "hybrid"],
+                        help="retrieval mode of the /query requests")
+    parser.add_argument("--embed-latency", type=float, default=0.02, help="fake seconds per embedding request")
+    parser.add_argument("--first-token", type=float, default=0.3, help="fake LLM seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="fake LLM seconds per token")
+    parser.add_argument("--tokens", type=int, default=200, help="tokens per fake answer")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake calls failing with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of fake calls failing with a 429")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Settings are read at import, so configure the environment before importing the app.
+        os.makedirs(os.path.join(tmp, "data"))
+        os.environ.update(
+            DATA_DIR=os.path.join(tmp, "data"),
+            LLM_PROVIDER="fake",
+            EMBEDDING_PROVIDER="fake",
+            FAKE_EMBEDDING_LATENCY=str(args.embed_latency),
+            FAKE_LLM_FIRST_TOKEN_LATENCY=str(args.first_token),
+            FAKE_LLM_TOKEN_LATENCY=str(args.token_latency),
+            FAKE_LLM_TOKENS=str(args.tokens),
+            FAKE_ERROR_RATE=str(args.error_rate),
+            FAKE_RATE_LIMIT_RATE=str(args.rate_limit_rate),
+            FAKE_SEED=str(args.seed),
+        )
+        os.environ.setdefault("GOOGLE_API_KEY", "unused")
+        results = run(args, tmp)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    report(results, previous)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+"Summarize paper X": answered by retrieval plus a generation over the
+Paper Analyzer's 4 chunks, vs. served from the summary precomputed at
+ingestion. Also reports what building the summaries costs once per paper.
+
+Runs offline against a fresh DATA_DIR with the fake chat model and
+embeddings from app.services.fakes; --llm-latency stands in for a
+generation.
+
+Usage (from backend/):
+    python -m benchmarks.bench_summaries --papers 5 --words 20000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+
+WORDS = (
+    "attention model sequence layer encoder decoder token training dataset loss gradient "
+    "benchmark accuracy baseline transformer embedding retrieval corpus query graph network "
+    "parameter inference latency memory batch optimizer schedule evaluation ablation result"
+).split()
+
+
+async def run(args):
+    from app.agents.orchestrator import orchestrator
+    from app.services.documents import document_registry
+    from app.services.fakes import FakeChatModel
+    from app.services.summaries import document_summarizer
+
+    rng = random.Random(0)
+    rag = orchestrator.rag
+    papers = []
+    for p in range(args.papers):
+        filename = f"paper{p}.pdf"
+        document = document_registry.create(filename, f"/tmp/{filename}", f"bench-{p}")
+        # Words tagged with the paper and position, so no chunk is a near-duplicate of another.
+        text = " ".join(f"{rng.choice(WORDS)} p{p}w{i}" for i in range(args.words // 2))
+        metadata = {"source": filename, "doc_id": document["id"], "content_hash": document["content_hash"]}
+        papers.append((document, rag.add_document(text, metadata)["chunks"]))
+
+    fake = FakeChatModel(tokens=100, first_token_latency=args.llm_latency)
+    orchestrator.llm = fake
+    for agent in orchestrator.agents.values():
+        agent.llm = fake
+    document_summarizer.llm = fake
+
+    start = time.perf_counter()
+    await asyncio.gather(*(document_summarizer.schedule(document["id"]) for document, _ in papers))
+    build = time.perf_counter() - start
+    build_calls = fake.calls
+    sections = [len(document_summarizer.store.get(document["id"])["sections"]) for document, _ in papers]
+
+    async def ask(bypass: bool):
+        latencies, calls = [], fake.calls
+        for document, _ in papers:
+            context = {"filters": {"doc_ids": [document["id"]]}, "retrieval_mode": "lexical", "bypass_cache": bypass}
+            begin = time.perf_counter()
+            result = await orchestrator.process_query(f"Summarize {document['filename']}", context)
+            latencies.append(time.perf_counter() - begin)
+            assert result.get("precomputed", False) is not bypass
+        return statistics.median(latencies), (fake.calls - calls) / len(papers)
+
+    generated, generated_calls = await ask(bypass=True)
+    served, served_calls = await ask(bypass=False)
+    chunks = statistics.median(n for _, n in papers)
+    k = orchestrator.agents["Paper Analyzer"].retrieval_k
+    print(f"{args.papers} papers, median {chunks:g} chunks and {statistics.median(sections):g} sections each, "
+          f"LLM {args.llm_latency:g}s per call")
+    print(f"build: {build:.2f}s for all papers, {build_calls / args.papers:.1f} LLM calls per paper, "
+          f"at most {document_summarizer.max_concurrent} at once")
+    print(f"{'answer':>12} {'median_s':>9} {'llm_calls':>9} {'chunks_seen':>11}")
+    print(f"{'generated':>12} {generated:>9.3f} {generated_calls:>9.1f} {k:>11}")
+    print(f"{'precomputed':>12} {served:>9.3f} {served_calls:>9.1f} {chunks:>11g}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--papers", type=int, default=5)
+    parser.add_argument("--words", type=int, default=20000, help="words per paper")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="fake LLM seconds per call")
+    args = parser.parse_args()
+    # Settings are read at import time, so configure them before importing the app.
+    os.environ.setdefault("GOOGLE_API_KEY", "unused")
+    os.environ.setdefault("LLM_PROVIDER", "fake")
+    os.environ.setdefault("EMBEDDING_PROVIDER", "fake")
+    os.environ["DATA_DIR"] = tempfile.mkdtemp(prefix="bench-summaries-")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
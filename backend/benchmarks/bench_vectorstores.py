@@ -0,0 +1,100 @@
+"""
+Vector backend comparison: recall@k and single-query p50/p99 latency.
+
+Vectors are drawn around random cluster centres (closer to real embeddings
+than uniform noise); ground truth is exact cosine search.
+
+Usage (from backend/):
+    python -m benchmarks.bench_vectorstores --sizes 10000,100000,1000000 --dim 768
+    python -m benchmarks.bench_vectorstores --sizes 10000 --backends numpy,chroma
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.vectorstores import ChromaVectorStore, NumpyVectorStore, normalize
+
+
+def make_vectors(n: int, dim: int, seed: int = 0, clusters: int = 256) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dim)).astype(np.float32)
+    out = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 100_000):
+        end = min(n, start + 100_000)
+        out[start:end] = centres[rng.integers(0, clusters, end - start)] + rng.normal(
+            scale=0.6, size=(end - start, dim)
+        ).astype(np.float32)
+    return normalize(out)
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ vectors.T
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    return np.take_along_axis(top, np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1), axis=1)
+
+
+def build(backend: str, directory: str, vectors: np.ndarray, batch: int = 5000):
+    store = NumpyVectorStore(directory) if backend == "numpy" else ChromaVectorStore(directory)
+    start = time.perf_counter()
+    for i in range(0, len(vectors), batch):
+        rows = range(i, min(len(vectors), i + batch))
+        store.add([str(r) for r in rows], [""] * len(rows), vectors[i:i + batch], [{"doc_id": "bench"}] * len(rows))
+    return store, time.perf_counter() - start
+
+
+def measure(store, queries: np.ndarray, truth: np.ndarray, k: int) -> dict:
+    latencies, recalls = [], []
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        hits = store.search([query], k=k)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+        found = {int(doc.id) for doc, _ in hits}
+        recalls.append(len(found & set(expected.tolist())) / k)
+    latencies.sort()
+    result = {
+        "recall": round(statistics.mean(recalls), 4),
+        "p50_ms": round(latencies[len(latencies) // 2], 3),
+        "p99_ms": round(latencies[max(0, int(len(latencies) * 0.99) - 1)], 3),
+    }
+    if isinstance(store, NumpyVectorStore):
+        start = time.perf_counter()
+        store.search(queries, k=k)
+        result["batched_ms_per_query"] = round((time.perf_counter() - start) * 1000 / len(queries), 3)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--backends", default="numpy,chroma")
+    parser.add_argument("--chroma-max", type=int, default=100_000, help="skip Chroma above this size")
+    args = parser.parse_args()
+
+    print(f"{'backend':>8} {'n':>9} {'build_s':>8} {'recall@k':>9} {'p50_ms':>8} {'p99_ms':>8} {'batched':>8}")
+    for n in (int(s) for s in args.sizes.split(",")):
+        vectors = make_vectors(n, args.dim)
+        rng = np.random.default_rng(1)
+        queries = normalize(vectors[rng.integers(0, n, args.queries)] + rng.normal(
+            scale=0.3, size=(args.queries, args.dim)).astype(np.float32))
+        truth = exact_top_k(vectors, queries, args.k)
+        for backend in args.backends.split(","):
+            if backend == "chroma" and n > args.chroma_max:
+                print(f"{backend:>8} {n:>9} skipped (--chroma-max {args.chroma_max})")
+                continue
+            with tempfile.TemporaryDirectory() as tmp:
+                store, build_s = build(backend, os.path.join(tmp, backend), vectors)
+                r = measure(store, queries, truth, args.k)
+                print(f"{backend:>8} {n:>9} {build_s:>8.1f} {r['recall']:>9} {r['p50_ms']:>8} {r['p99_ms']:>8} "
+                      f"{r.get('batched_ms_per_query', '-'):>8}")
+                del store
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Minimal synthetic PDF writer used by the benchmarks and tests.
+
+Produces plain text-layer PDFs (Helvetica, one text object per page) without
+any third-party dependency, so large documents can be generated on the fly.
+"""
+from typing import Callable, List, Optional
+
+LOREM = (
+    "Attention mechanisms allow the model to relate positions of a sequence "
+    "in order to compute a representation of that sequence. We evaluate on "
+    "the WMT 2014 English-to-German translation task and report BLEU scores."
+)
+
+
+def default_page_lines(page_no: int, lines_per_page: int) -> List[str]:
+    lines = [f"Page {page_no + 1} section {page_no // 10 + 1}"]
+    for i in range(lines_per_page - 1):
+        lines.append(f"{i + 1}. {LOREM[: 60 + (page_no + i) % 40]}")
+    return lines
+
+
+def _escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf(
+    path: str,
+    num_pages: int,
+    lines_per_page: int = 40,
+    page_lines: Optional[Callable[[int, int], List[str]]] = None,
+) -> str:
+    """
+    Writes a `num_pages` page PDF to `path` and returns the path.
+    :param page_lines: Optional callable (page_no, lines_per_page) -> lines.
+    """
+    page_lines = page_lines or default_page_lines
+    # Object layout: 1 catalog, 2 pages, 3 font, then (page, content) pairs.
+    objects: List[bytes] = [b"", b"", b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for page_no in range(num_pages):
+        page_obj = len(objects) + 1
+        content_obj = page_obj + 1
+        kids.append(f"{page_obj} 0 R")
+        ops = ["BT", "/F1 10 Tf", "12 TL", "50 760 Td"]
+        for line in page_lines(page_no, lines_per_page):
+            ops.append(f"({_escape(line)}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", "replace")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content_obj} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    objects[0] = b"<< /Type /Catalog /Pages 2 0 R >>"
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {num_pages} >>".encode()
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = []
+        for i, body in enumerate(objects, start=1):
+            offsets.append(f.tell())
+            f.write(f"{i} 0 obj\n".encode() + body + b"\nendobj\n")
+        xref = f.tell()
+        f.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+        for offset in offsets:
+            f.write(f"{offset:010d} 00000 n \n".encode())
+        f.write(
+            f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+        )
+    return path
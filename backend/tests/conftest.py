@@ -1,10 +1,17 @@
 import pytest
 import os
 import sys
+import tempfile
 
 # Add parent directory to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+# Run offline by default: fake chat model and embeddings, and a throwaway data
+# directory. Set LLM_PROVIDER / EMBEDDING_PROVIDER=google to test against Gemini.
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("EMBEDDING_PROVIDER", "fake")
+os.environ.setdefault("DATA_DIR", tempfile.mkdtemp(prefix="researchmate-tests-"))
+
 @pytest.fixture
 def sample_text():
     """Sample research paper text for testing"""
@@ -0,0 +1,144 @@
+import pytest
+import asyncio
+import threading
+import time
+from app.services.admission import AdmissionGate, AsyncSingleFlight, Overloaded, SingleFlight
+from app.services.embedding_cache import CachedEmbeddings, EmbeddingCache
+from app.services.fakes import FakeEmbeddings
+
+class TestAdmission:
+    """Test upstream admission control and single-flight coalescing"""
+
+    @pytest.mark.asyncio
+    async def test_gate_queues_then_sheds(self):
+        """Test callers beyond the limit queue, and are shed once the queue is full"""
+        gate = AdmissionGate("chat LLM", max_concurrent=1, max_queue=1, queue_timeout=5)
+        order = []
+
+        async def call(name, hold):
+            async with gate:
+                order.append(name)
+                await hold.wait()
+
+        first_done, second_done = asyncio.Event(), asyncio.Event()
+        first = asyncio.create_task(call("first", first_done))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(call("second", second_done))
+        await asyncio.sleep(0)
+        assert gate.stats()["queue_depth"] == 1
+
+        with pytest.raises(Overloaded, match="503"):
+            await gate.aacquire()
+        first_done.set()
+        second_done.set()
+        await asyncio.gather(first, second)
+
+        assert order == ["first", "second"]
+        stats = gate.stats()
+        assert stats["shed"] == 1 and stats["admitted"] == 2 and stats["in_flight"] == 0
+        assert stats["peak_queue_depth"] == 1
+
+    @pytest.mark.asyncio
+    async def test_queue_timeout_and_cancellation(self):
+        """Test a caller that waits too long is shed and a cancelled waiter leaves no slot behind"""
+        gate = AdmissionGate("chat LLM", max_concurrent=1, max_queue=5, queue_timeout=0.05)
+        await gate.aacquire()
+        with pytest.raises(Overloaded):
+            await gate.aacquire()
+        waiter = asyncio.create_task(gate.aacquire())
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        gate.release()
+
+        stats = gate.stats()
+        assert stats["timed_out"] == 1 and stats["in_flight"] == 0 and stats["queue_depth"] == 0
+
+    def test_background_callers_wait_instead_of_shedding(self):
+        """Test acquire(shed=False) waits however long the queue is, from threads"""
+        gate = AdmissionGate("embedding API", max_concurrent=2, max_queue=0, queue_timeout=0.01)
+        peak, active, lock = [0], [0], threading.Lock()
+
+        def work():
+            gate.acquire(shed=False)
+            try:
+                with lock:
+                    active[0] += 1
+                    peak[0] = max(peak[0], active[0])
+                time.sleep(0.05)
+                with lock:
+                    active[0] -= 1
+            finally:
+                gate.release()
+
+        threads = [threading.Thread(target=work) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.01)
+        with pytest.raises(Overloaded):
+            with gate:
+                pass
+        for thread in threads:
+            thread.join()
+
+        assert peak[0] == 2
+        assert gate.stats()["admitted"] == 6 and gate.stats()["shed"] == 1
+
+    def test_single_flight_shares_one_call(self):
+        """Test identical concurrent blocking calls run once and share the result"""
+        flight, calls = SingleFlight(), []
+
+        def slow():
+            calls.append(1)
+            time.sleep(0.05)
+            return "vector"
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.call("q", slow))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == ["vector"] * 5
+        assert len(calls) == 1
+        assert flight.stats() == {"calls": 1, "coalesced": 4, "in_flight": 0}
+
+    @pytest.mark.asyncio
+    async def test_async_single_flight_shares_result_and_error(self):
+        """Test identical concurrent coroutines share a result, and an error reaches every caller"""
+        flight, calls = AsyncSingleFlight(), []
+
+        async def answer():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return {"response": "ok"}
+
+        results = await asyncio.gather(*(flight.do("q", answer) for _ in range(4)))
+        assert len(calls) == 1
+        assert [shared for _, shared in results] == [False, True, True, True]
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        outcomes = await asyncio.gather(*(flight.do("q", fail) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+
+    def test_identical_query_embeddings_are_coalesced(self, tmp_path):
+        """Test concurrent identical query embeddings make one API call"""
+        fake = FakeEmbeddings(latency=0.05)
+        gate = AdmissionGate("embedding API", max_concurrent=4, max_queue=4)
+        embeddings = CachedEmbeddings(
+            fake, "fake", EmbeddingCache(str(tmp_path / "cache.db")), gate=gate, flight=SingleFlight()
+        )
+        vectors = []
+        threads = [threading.Thread(target=lambda: vectors.append(embeddings.embed_query("attention"))) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert fake.calls == 1
+        assert len(vectors) == 6 and all(vector == vectors[0] for vector in vectors)
@@ -47,3 +47,249 @@ class TestAgents:
         # Check that run method exists and is callable
         assert hasattr(agent, 'run')
         assert callable(agent.run)
+
+    @pytest.mark.asyncio
+    async def test_retrieval_overlaps_routing(self, monkeypatch):
+        """Test retrieval runs alongside routing and its documents reach the agent"""
+        import asyncio
+        import time
+        from langchain_core.documents import Document
+        from app.services.rag import rag_service
+
+        orchestrator = OrchestratorAgent()
+        docs = [Document(page_content=f"chunk {i}") for i in range(6)]
+        searches = []
+
+        async def slow_route(query):
+            await asyncio.sleep(0.2)
+            return "Paper Analyzer"
+
+        def slow_search(query, k=4, mode=None):
+            searches.append((k, mode))
+            time.sleep(0.2)
+            return docs[:k]
+
+        seen = {}
+
+        async def run(query, context=None):
+            seen["docs"] = orchestrator.agents["Paper Analyzer"].retrieve(query, context)
+            return {"agent": "Paper Analyzer", "response": "ok", "sources": []}
+
+        monkeypatch.setattr(orchestrator, "route_query", slow_route)
+        monkeypatch.setattr(rag_service, "similarity_search", slow_search)
+        monkeypatch.setattr(orchestrator.agents["Paper Analyzer"], "run", run)
+
+        result = await orchestrator.process_query("Summarize the paper", {"retrieval_mode": "lexical"})
+
+        assert searches == [(6, "lexical")]  # one search, at the comparator's k
+        assert seen["docs"] == docs[:4]
+        assert result["timings"]["total_ms"] < 350
+        assert result["timings"]["saved_ms"] > 100
+
+    @pytest.mark.asyncio
+    async def test_compound_query_fans_out(self, monkeypatch):
+        """Test a compound request runs its agents concurrently over one retrieval and keeps partial results"""
+        import asyncio
+        from langchain_core.documents import Document
+        from app.core.config import settings
+        from app.services.fakes import FakeRateLimitError
+        from app.services.rag import rag_service
+
+        orchestrator = OrchestratorAgent()
+        docs = [Document(id=f"c{i}", page_content=f"chunk {i}", metadata={"source": f"p{i % 2}.pdf"}) for i in range(6)]
+        searches = []
+
+        def search(query, k=4, mode=None):
+            searches.append(k)
+            return docs[:k]
+
+        def slow_agent(name, delay, error=None):
+            async def run(query, context=None):
+                await asyncio.sleep(delay)
+                if error:
+                    raise error
+                return {"agent": name, "response": f"{name}: {query}", "sources": ["p0.pdf"]}
+
+            monkeypatch.setattr(orchestrator.agents[name], "run", run)
+
+        async def no_route(query):
+            raise AssertionError("compound requests skip routing")
+
+        monkeypatch.setattr(settings, "AGENT_TIMEOUT", 0.5)
+        monkeypatch.setattr(rag_service, "similarity_search", search)
+        monkeypatch.setattr(orchestrator, "route_query", no_route)
+        slow_agent("Paper Analyzer", 0.3)
+        slow_agent("Insight Generator", 0.1, FakeRateLimitError())
+        slow_agent("Code Generator", 5)
+        query = "Summarize this paper, list its limitations and give me starter code"
+        context = {"retrieval_mode": "lexical", "bypass_cache": True}
+
+        result = await orchestrator.process_query(query, context)
+
+        assert searches == [6]
+        assert result["agents"] == ["Paper Analyzer", "Insight Generator", "Code Generator"]
+        assert result["status"] == "partial"
+        analyzer, insight, coder = result["parts"]
+        # Each agent is asked the whole request with its part; the part alone labels the section.
+        assert analyzer["response"] == f"Paper Analyzer: Request: {query}\nYour part: Summarize this paper"
+        assert [part["task"] for part in result["parts"]] == [
+            "Summarize this paper", "list its limitations", "give me starter code"
+        ]
+        assert insight["status"] == "error_quota_exceeded"
+        assert coder["status"] == "error_timeout"
+        assert result["response"].startswith(f"## Paper Analyzer\n\n{analyzer['response']}\n\n## Insight")
+        assert result["sources"] == ["p0.pdf"]
+        # The slowest agent (cut off at the timeout) bounds the latency, not the sum
+        assert 500 <= result["timings"]["agent_ms"] < 800
+        assert result["timings"]["saved_ms"] > 300
+
+        events = [event async for event in orchestrator.stream_query(query, context)]
+        names = [name for name, _ in events]
+        assert names[:2] == ["route", "sources"] and names[-1] == "done"
+        assert events[0][1]["agents"] == result["agents"]
+        assert [data["agent"] for name, data in events if name == "part"] == [
+            "Insight Generator", "Paper Analyzer", "Code Generator"
+        ]
+        assert "".join(data for name, data in events if name == "token") == events[-1][1]["response"]
+
+    def test_comparator_covers_every_named_paper(self, monkeypatch):
+        """Test the comparator splits its chunks across the papers named in the query"""
+        from langchain_core.documents import Document
+        from app.agents.comparator import PaperComparisonAgent
+        import app.agents.comparator as comparator_module
+        from app.services.rag import rag_service
+
+        class Registry:
+            def named_in(self, text):
+                return [{"id": "a"}, {"id": "b"}] if "alpha" in text else []
+
+        def doc(doc_id, i):
+            return Document(id=f"{doc_id}-{i}", page_content=f"{doc_id} {i}", metadata={"doc_id": doc_id})
+
+        searches = []
+
+        def search_per_document(query, doc_ids, k=4, mode=None, where=None):
+            searches.append(list(doc_ids))
+            return [doc(doc_id, i) for i in range(k // len(doc_ids)) for doc_id in doc_ids]
+
+        monkeypatch.setattr(comparator_module, "document_registry", Registry())
+        monkeypatch.setattr(rag_service, "search_per_document", search_per_document)
+        agent = PaperComparisonAgent()
+        prefetched = [doc("a", i) for i in range(6)]
+
+        docs = agent.retrieve("compare alpha and beta", {"documents": prefetched})
+        assert searches == [["a", "b"]]
+        assert sorted(d.metadata["doc_id"] for d in docs) == ["a"] * 3 + ["b"] * 3
+        # Already balanced chunks are kept without searching again
+        assert agent.retrieve("compare alpha and beta", {"documents": docs}) == docs
+        assert len(searches) == 1
+        # One paper in the results and none named: a plain comparison over the shared chunks
+        assert agent.retrieve("compare the methods", {"documents": prefetched}) == prefetched
+        # Filters name the papers
+        agent.retrieve("compare the methods", {"documents": prefetched, "doc_ids": ["b", "c"]})
+        assert searches[-1] == ["b", "c"]
+
+    @pytest.mark.asyncio
+    async def test_identical_queries_share_one_answer(self, monkeypatch):
+        """Test identical concurrent queries make one LLM call and overload surfaces as Overloaded"""
+        import asyncio
+        from app.services.admission import AdmissionGate, Overloaded
+        from app.services.fakes import FakeChatModel
+
+        orchestrator = OrchestratorAgent()
+        fake = FakeChatModel(tokens=5, first_token_latency=0.05)
+        orchestrator.agents["Code Generator"].llm = fake
+        context = {"retrieval_mode": "lexical", "bypass_cache": True}
+
+        results = await asyncio.gather(
+            *(orchestrator.process_query("Generate code for the model", context) for _ in range(5))
+        )
+        assert fake.calls == 1
+        assert sum(bool(result.get("coalesced")) for result in results) == 4
+        assert len({result["response"] for result in results}) == 1
+
+        # A full chat queue is reported to the caller (a 503 from the API) instead of an error answer.
+        full = AdmissionGate("chat LLM", max_concurrent=1, max_queue=0)
+        await full.aacquire()
+        monkeypatch.setattr("app.agents.base.chat_gate", full)
+        with pytest.raises(Overloaded):
+            await orchestrator.process_query("Generate code for the model", context)
+
+    @pytest.mark.asyncio
+    async def test_batch_shares_retrieval_and_bounds_generation(self, monkeypatch):
+        """Test a batch retrieves once for every query and generates at most BATCH_MAX_CONCURRENCY at a time"""
+        import app.agents.orchestrator as module
+        from app.core.config import settings
+        from app.services.fakes import FakeChatModel
+
+        orchestrator = OrchestratorAgent()
+        # The fake answers 429 once more than two calls are in flight.
+        fake = FakeChatModel(tokens=5, first_token_latency=0.02, max_concurrent=2)
+        orchestrator.agents["Code Generator"].llm = fake
+        monkeypatch.setattr(settings, "BATCH_MAX_CONCURRENCY", 2)
+        batches = []
+
+        def retrieve_many(queries, k, context, rag=None):
+            batches.append(list(queries))
+            return [[] for _ in queries]
+
+        async def no_single_retrieval(query, context):
+            raise AssertionError("queries of a batch are not retrieved one by one")
+
+        monkeypatch.setattr(module, "retrieve_documents_many", retrieve_many)
+        monkeypatch.setattr(orchestrator, "_retrieve", no_single_retrieval)
+        queries = [f"Generate code for model {i}" for i in range(6)]
+        context = {"retrieval_mode": "lexical", "bypass_cache": True}
+
+        results = [item async for item in orchestrator.process_batch(queries, context)]
+        assert batches == [queries]
+        assert sorted(i for i, _ in results) == list(range(6))
+        assert all("status" not in result and result["agent"] == "Code Generator" for _, result in results)
+        assert fake.calls == 6 and fake.rate_limited == 0
+
+    def test_agents_share_pooled_llm_client(self):
+        """Test agents with the same model settings share one chat client"""
+        analyzer, insight = PaperAnalyzerAgent(), InsightGeneratorAgent()
+        assert analyzer.llm is insight.llm
+        assert OrchestratorAgent().llm is not analyzer.llm  # lower temperature, separate client
+
+    def test_agent_llm_override(self):
+        """Test assigning an agent's llm replaces the pooled client for that agent only"""
+        from app.services.fakes import FakeChatModel
+
+        agent, other = PaperAnalyzerAgent(), PaperAnalyzerAgent()
+        fake = FakeChatModel()
+        agent.llm = fake
+        assert agent.llm is fake
+        assert other.llm is not fake
+
+    def test_orchestrator_constructs_agents_on_demand(self):
+        """Test the orchestrator only builds the agents it is asked for"""
+        orchestrator = OrchestratorAgent()
+        assert orchestrator.agents.loaded() == []
+        assert orchestrator.agents.max_retrieval_k() == 6
+        assert set(orchestrator.agents.descriptions()) == set(orchestrator.agents)
+
+        agent = orchestrator.agents["Code Generator"]
+        assert orchestrator.agents["Code Generator"] is agent
+        assert orchestrator.agents.loaded() == ["Code Generator"]
+        assert orchestrator.agents.get("Unknown Agent") is None
+
+    @pytest.mark.asyncio
+    async def test_agent_packs_context(self):
+        """Test agents send merged chunks to the LLM and report the tokens saved"""
+        from langchain_core.documents import Document
+        from app.services.fakes import FakeChatModel
+
+        text = " ".join(f"word{i}" for i in range(300))
+        docs = [
+            Document(page_content=text[start:start + 1000], metadata={"doc_id": "d1", "source": "a.pdf", "start_index": start})
+            for start in (0, 800)
+        ]
+        agent = PaperAnalyzerAgent()
+        agent.llm = FakeChatModel(tokens=3)
+        result = await agent.run("Summarize", {"documents": docs})
+
+        assert result["sources"] == ["a.pdf"]
+        assert result["context_stats"]["passages"] == 1
+        assert result["context_stats"]["tokens_saved"] == 50
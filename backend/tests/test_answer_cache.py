@@ -0,0 +1,83 @@
+import pytest
+from app.services.answer_cache import AnswerCache
+
+ANSWER = {"agent": "Paper Analyzer", "response": "It uses attention.", "sources": ["paper.pdf"]}
+
+class TestAnswerCache:
+    """Test the semantic answer cache"""
+
+    def test_exact_and_near_duplicate_queries_hit(self):
+        """Test normalized text or a similar embedding over the same chunks reuses the answer"""
+        cache = AnswerCache(similarity=0.95)
+        cache.put("Paper Analyzer", "Summarize the methodology", [1.0, 0.0, 0.0], ["c1", "c2"], ["d1"], ANSWER)
+
+        assert cache.get("Paper Analyzer", "summarize  the methodology?", None, ["c2", "c1"]) == ANSWER
+        assert cache.get("Paper Analyzer", "Give me the methodology summary", [0.99, 0.05, 0.0], ["c1", "c2"]) == ANSWER
+        assert cache.get("Paper Analyzer", "What are the limitations", [0.5, 0.8, 0.0], ["c1", "c2"]) is None
+        assert cache.get("Paper Analyzer", "Summarize the methodology", None, ["c1", "c3"]) is None
+        assert cache.get("Code Generator", "Summarize the methodology", None, ["c1", "c2"]) is None
+        assert cache.stats()["hits"] == 2
+        assert cache.stats()["misses"] == 3
+
+    def test_ttl_and_lru_eviction(self):
+        """Test entries expire after the TTL and the least recently used go first"""
+        now = [0.0]
+        cache = AnswerCache(max_entries=2, ttl=60, clock=lambda: now[0])
+        for query in ("a", "b"):
+            cache.put("Paper Analyzer", query, None, ["c1"], ["d1"], {"response": query})
+        cache.get("Paper Analyzer", "a", None, ["c1"])
+        cache.put("Paper Analyzer", "c", None, ["c1"], ["d1"], {"response": "c"})
+        assert cache.get("Paper Analyzer", "b", None, ["c1"]) is None
+        assert cache.get("Paper Analyzer", "a", None, ["c1"]) == {"response": "a"}
+
+        now[0] = 61
+        assert cache.get("Paper Analyzer", "a", None, ["c1"]) is None
+        assert cache.stats()["evictions"] == 3  # "b" by LRU, "a" and "c" by TTL
+
+    def test_invalidate_document(self):
+        """Test answers built on a re-ingested document are dropped"""
+        cache = AnswerCache()
+        cache.put("Paper Analyzer", "q1", None, ["c1"], ["d1"], ANSWER)
+        cache.put("Paper Comparator", "q2", None, ["c1", "c9"], ["d1", "d2"], ANSWER)
+        cache.put("Paper Analyzer", "q3", None, ["c9"], ["d2"], ANSWER)
+
+        cache.invalidate_document("d1")
+        assert cache.stats()["entries"] == 1
+        assert cache.stats()["invalidations"] == 2
+        assert cache.get("Paper Analyzer", "q3", None, ["c9"]) == ANSWER
+
+
+@pytest.mark.asyncio
+async def test_orchestrator_answers_repeats_from_cache(monkeypatch):
+    """Test repeated queries skip the agent until bypassed or the document changes"""
+    from langchain_core.documents import Document
+    from app.agents.orchestrator import OrchestratorAgent
+    from app.services.rag import rag_service
+
+    orchestrator = OrchestratorAgent()
+    orchestrator.answer_cache = AnswerCache()
+    docs = [Document(id=f"c{i}", page_content=f"chunk {i}", metadata={"doc_id": "d1"}) for i in range(6)]
+    runs = []
+
+    async def route(query):
+        return "Paper Analyzer"
+
+    async def run(query, context=None):
+        runs.append(query)
+        return {"agent": "Paper Analyzer", "response": f"answer {len(runs)}", "sources": []}
+
+    monkeypatch.setattr(orchestrator, "route_query", route)
+    monkeypatch.setattr(rag_service, "similarity_search", lambda query, k=4, mode=None: docs[:k])
+    monkeypatch.setattr(orchestrator.agents["Paper Analyzer"], "run", run)
+    context = {"retrieval_mode": "lexical"}
+
+    first = await orchestrator.process_query("Summarize the methodology", context)
+    second = await orchestrator.process_query("summarize the methodology", context)
+    assert (first["cached"], second["cached"]) == (False, True)
+    assert second["response"] == "answer 1"
+
+    bypassed = await orchestrator.process_query("Summarize the methodology", {**context, "bypass_cache": True})
+    assert bypassed["response"] == "answer 2"
+
+    orchestrator.answer_cache.invalidate_document("d1")
+    assert (await orchestrator.process_query("Summarize the methodology", context))["response"] == "answer 3"
@@ -33,3 +33,110 @@ class TestAPI:
         """Test upload endpoint without file"""
         response = client.post("/api/v1/upload")
         assert response.status_code == 422  # Missing required field
+
+    def test_unknown_job(self):
+        """Test job status endpoint returns 404 for unknown jobs"""
+        response = client.get("/api/v1/jobs/does-not-exist")
+        assert response.status_code == 404
+
+    def test_documents_endpoints(self):
+        """Test document listing and 404s for unknown documents"""
+        response = client.get("/api/v1/documents")
+        assert response.status_code == 200
+        assert "documents" in response.json()
+        assert client.delete("/api/v1/documents/does-not-exist").status_code == 404
+        assert client.put("/api/v1/documents/does-not-exist/tags", json={"tags": ["nlp"]}).status_code == 404
+        assert client.get("/api/v1/documents/does-not-exist/summary").status_code == 404
+        assert client.post("/api/v1/documents/does-not-exist/summary").status_code == 404
+        assert client.get("/api/v1/documents/does-not-exist/sections").status_code == 404
+
+    def test_query_stream_events(self, monkeypatch):
+        """Test the SSE endpoint sends route, sources, tokens and the final result"""
+        import json
+        from app.agents.orchestrator import orchestrator
+        from app.services.fakes import FakeChatModel
+
+        for agent in orchestrator.agents.values():
+            monkeypatch.setattr(agent, "llm", FakeChatModel(tokens=5))
+        response = client.post(
+            "/api/v1/query/stream",
+            json={"query": "Generate code for the model", "retrieval_mode": "lexical", "bypass_cache": True},
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+
+        events = []
+        for block in response.text.strip().split("\n\n"):
+            name, data = block.split("\n")
+            events.append((name.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+        names = [name for name, _ in events]
+        assert names[:2] == ["route", "sources"]
+        assert names[-1] == "done"
+        assert events[0][1] == {"agent": "Code Generator"}
+
+        tokens = "".join(data for name, data in events if name == "token")
+        assert tokens == events[-1][1]["response"]
+        assert tokens.endswith("token4")
+        assert "first_token_ms" in events[-1][1]["timings"]
+
+    def test_query_batch_streams_ndjson(self, monkeypatch):
+        """Test the batch endpoint sends one line per query, then the totals"""
+        import json
+        from app.agents.orchestrator import orchestrator
+        from app.services.fakes import FakeChatModel
+
+        for agent in orchestrator.agents.values():
+            monkeypatch.setattr(agent, "llm", FakeChatModel(tokens=5))
+        queries = ["Generate code for the model", "Write documentation for the API", "Generate code for the model"]
+        response = client.post(
+            "/api/v1/query/batch",
+            json={"queries": queries, "retrieval_mode": "lexical", "bypass_cache": True},
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+
+        lines = [json.loads(line) for line in response.text.strip().split("\n")]
+        assert sorted(line["index"] for line in lines[:-1]) == [0, 1, 2]
+        assert all(line["query"] == queries[line["index"]] and line["response"] for line in lines[:-1])
+        assert lines[-1]["done"] is True
+        assert lines[-1]["queries"] == 3 and lines[-1]["errors"] == 0
+
+        assert client.post("/api/v1/query/batch", json={"queries": []}).status_code == 400
+
+    def test_server_timing_and_metrics(self, monkeypatch):
+        """Test /query reports its stages in Server-Timing and /metrics exposes them"""
+        from app.agents.orchestrator import orchestrator
+        from app.services.fakes import FakeChatModel
+
+        for agent in orchestrator.agents.values():
+            monkeypatch.setattr(agent, "llm", FakeChatModel(tokens=5))
+        response = client.post(
+            "/api/v1/query",
+            json={"query": "Generate code for the model", "retrieval_mode": "lexical", "bypass_cache": True},
+        )
+        stages = [entry.split(";")[0] for entry in response.headers["Server-Timing"].split(", ")]
+        assert {"route", "retrieve", "prompt", "generate", "total"} <= set(stages)
+
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        text = response.text
+        assert 'researchmate_stage_seconds_count{stage="generate"}' in text
+        assert 'researchmate_request_seconds_count{method="POST",route="/api/v1/query"}' in text
+        assert 'researchmate_cache_hits_total{cache="embedding"}' in text
+        assert 'researchmate_quota_errors_total{source="agent"}' in text
+        assert "researchmate_ingested_bytes_total" in text
+
+    def test_overloaded_upstream_returns_503(self, monkeypatch):
+        """Test a shed request gets a 503 with Retry-After"""
+        from app.agents.orchestrator import orchestrator
+        from app.services.admission import Overloaded
+
+        async def shed(query, context=None):
+            raise Overloaded("chat LLM")
+
+        monkeypatch.setattr(orchestrator, "process_query", shed)
+        response = client.post("/api/v1/query", json={"query": "Summarize the paper"})
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        assert "admission" in client.get("/api/v1/stats").json()
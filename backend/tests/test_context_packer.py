@@ -0,0 +1,83 @@
+from langchain_core.documents import Document
+from app.services.context_packer import ContextPacker
+
+WORDS = " ".join(f"word{i}" for i in range(400))
+
+
+def chunk(text: str, start: int, size: int, doc_id: str = "d1", source: str = "a.pdf") -> Document:
+    return Document(
+        page_content=text[start:start + size],
+        metadata={"doc_id": doc_id, "source": source, "start_index": start},
+        id=f"{doc_id}-{start}",
+    )
+
+class TestContextPacker:
+    """Test context assembly for agent prompts"""
+
+    def test_overlapping_chunks_are_merged(self):
+        """Test overlapping chunks of one document become one passage with the overlap sent once"""
+        docs = [chunk(WORDS, 800, 1000), chunk(WORDS, 0, 1000), chunk(WORDS, 1600, 1000)]
+        passages, stats = ContextPacker(budget_tokens=10000).pack(docs)
+
+        assert len(passages) == 1
+        assert passages[0].page_content == WORDS[0:2600]
+        assert passages[0].metadata["start_index"] == 0
+        assert stats["tokens_in"] == 750
+        assert stats["tokens_used"] == 650
+        assert stats["tokens_saved"] == 100
+
+    def test_separate_documents_keep_rank_order(self):
+        """Test chunks of different documents are not merged and stay in rank order"""
+        other = "other text " * 100
+        docs = [chunk(other, 0, 500, doc_id="d2"), chunk(WORDS, 0, 500), chunk(WORDS, 2000, 500)]
+        passages, stats = ContextPacker(budget_tokens=10000).pack(docs)
+
+        assert [p.page_content for p in passages] == [d.page_content for d in docs]
+        assert stats["tokens_saved"] == 0
+
+    def test_near_duplicates_are_dropped(self):
+        """Test a chunk nearly identical to a better-ranked one is dropped"""
+        text = "Transformers replace recurrence with self-attention over the whole sequence. " * 5
+        docs = [
+            Document(page_content=text, metadata={"source": "a.pdf"}),
+            Document(page_content=text + " Also.", metadata={"source": "b.pdf"}),
+            Document(page_content="Results improve BLEU on translation benchmarks.", metadata={"source": "c.pdf"}),
+        ]
+        passages, stats = ContextPacker(budget_tokens=10000).pack(docs)
+
+        assert [p.metadata["source"] for p in passages] == ["a.pdf", "c.pdf"]
+        assert stats["duplicates_dropped"] == 1
+
+    def test_token_budget(self):
+        """Test chunks beyond the budget are skipped and an oversized first chunk is cut"""
+        docs = [chunk(WORDS, 0, 400), chunk(WORDS, 1000, 400), chunk(WORDS, 2000, 400)]
+        passages, stats = ContextPacker(budget_tokens=200).pack(docs)
+        assert len(passages) == 2
+        assert stats["tokens_used"] <= 200
+
+        passages, _ = ContextPacker(budget_tokens=50).pack([chunk(WORDS, 0, 1000)])
+        assert len(passages[0].page_content) == 200
+
+    def test_mmr_promotes_novel_chunks(self):
+        """Test MMR moves a chunk on a new topic ahead of one repeating the top chunk"""
+        docs = [
+            Document(page_content="attention heads encoder decoder layers attention"),
+            Document(page_content="attention heads encoder layers training"),
+            Document(page_content="dataset licensing and ethical review"),
+        ]
+        plain, _ = ContextPacker(budget_tokens=10000, dedupe_threshold=1.1).pack(docs)
+        diverse, _ = ContextPacker(budget_tokens=10000, dedupe_threshold=1.1, mmr_lambda=0.5).pack(docs)
+
+        assert [d.page_content for d in plain] == [d.page_content for d in docs]
+        assert diverse[1].page_content == docs[2].page_content
+
+    def test_stats_accumulate(self):
+        """Test totals across requests are kept for /stats"""
+        packer = ContextPacker(budget_tokens=10000)
+        docs = [chunk(WORDS, 0, 1000), chunk(WORDS, 800, 1000)]
+        packer.pack(docs)
+        packer.pack(docs)
+        stats = packer.stats()
+        assert stats["requests"] == 2
+        assert stats["tokens_saved"] == 100
+        assert stats["tokens_saved_avg"] == 50.0
@@ -0,0 +1,71 @@
+from typing import List
+from langchain_core.embeddings import Embeddings
+from app.services.embedding_cache import CachedEmbeddings, EmbeddingCache
+
+class CountingEmbeddings(Embeddings):
+    """Deterministic embeddings that count backend calls"""
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.embedded.extend(texts)
+        return [[float(len(t)), 1.0, 0.5] for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        self.embedded.append(text)
+        return [float(len(text)), 0.0, 0.0]
+
+class TestEmbeddingCache:
+    """Test the persistent embedding cache"""
+
+    def test_repeated_texts_are_embedded_once(self, tmp_path):
+        """Test cache hits skip the backend and preserve input order"""
+        backend = CountingEmbeddings()
+        cached = CachedEmbeddings(backend, "test-model", EmbeddingCache(str(tmp_path / "cache.db")))
+
+        first = cached.embed_documents(["alpha", "beta", "alpha"])
+        second = cached.embed_documents(["beta", "gamma"])
+
+        assert backend.embedded == ["alpha", "beta", "gamma"]
+        assert first == [[5.0, 1.0, 0.5], [4.0, 1.0, 0.5], [5.0, 1.0, 0.5]]
+        assert second[0] == first[1]
+        stats = cached.cache.stats()
+        assert stats["hits"] == 1 and stats["misses"] == 4
+
+    def test_cache_persists_and_is_keyed_by_model(self, tmp_path):
+        """Test vectors survive a restart and are not shared across models"""
+        db_path = str(tmp_path / "cache.db")
+        CachedEmbeddings(CountingEmbeddings(), "model-a", EmbeddingCache(db_path)).embed_documents(["alpha"])
+
+        backend = CountingEmbeddings()
+        CachedEmbeddings(backend, "model-a", EmbeddingCache(db_path)).embed_documents(["alpha"])
+        assert backend.embedded == []
+
+        CachedEmbeddings(backend, "model-b", EmbeddingCache(db_path)).embed_documents(["alpha"])
+        assert backend.embedded == ["alpha"]
+
+    def test_queries_cached_separately(self, tmp_path):
+        """Test query embeddings do not collide with document embeddings"""
+        backend = CountingEmbeddings()
+        cached = CachedEmbeddings(backend, "test-model", EmbeddingCache(str(tmp_path / "cache.db")))
+        cached.embed_documents(["alpha"])
+        assert cached.embed_query("alpha") == [5.0, 0.0, 0.0]
+        assert cached.embed_query("alpha") == [5.0, 0.0, 0.0]
+        assert backend.embedded == ["alpha", "alpha"]
+
+    def test_lru_eviction(self, tmp_path):
+        """Test least recently used vectors are evicted past the size cap"""
+        backend = CountingEmbeddings()
+        cache = EmbeddingCache(str(tmp_path / "cache.db"), max_entries=2)
+        cached = CachedEmbeddings(backend, "test-model", cache)
+
+        cached.embed_documents(["a", "b"])
+        cached.embed_documents(["a"])  # "b" is now least recently used
+        cached.embed_documents(["c"])
+        assert cache.stats()["entries"] == 2
+        assert cache.stats()["evictions"] == 1
+
+        backend.embedded.clear()
+        cached.embed_documents(["a", "c", "b"])
+        assert backend.embedded == ["b"]
@@ -0,0 +1,57 @@
+import pytest
+from app.services.embedding_scheduler import EmbeddingScheduler, TokenBucket
+from app.services.fakes import FakeEmbeddings
+
+def make_scheduler(**kwargs):
+    options = dict(batch_size=2, requests_per_minute=60000, tokens_per_minute=10**7,
+                   max_in_flight=3, max_retries=5, base_delay=0.001, max_delay=0.01)
+    options.update(kwargs)
+    return EmbeddingScheduler(**options)
+
+class TestEmbeddingScheduler:
+    """Test batched, rate-limited embedding"""
+
+    def test_batches_and_progress(self):
+        """Test every item is embedded once in batches of the configured size"""
+        fake = FakeEmbeddings()
+        seen, progress = [], []
+        scheduler = make_scheduler()
+        scheduler.run([f"chunk {i}" for i in range(7)],
+                      lambda batch: seen.append(fake.embed_documents(batch) and len(batch)),
+                      progress=lambda done, total: progress.append((done, total)))
+
+        assert sorted(seen) == [1, 2, 2, 2]
+        assert fake.texts_embedded == 7
+        assert progress[-1] == (7, 7)
+
+    def test_retries_injected_429s(self):
+        """Test rate-limit errors are retried with backoff instead of failing"""
+        fake = FakeEmbeddings(fail_first=3)
+        scheduler = make_scheduler()
+        scheduler.run([f"chunk {i}" for i in range(6)], fake.embed_documents)
+
+        assert fake.texts_embedded == 6
+        assert fake.rate_limited == 3
+        assert scheduler.stats()["retries"] == 3
+
+    def test_gives_up_after_max_retries(self):
+        """Test a persistent 429 surfaces once retries are exhausted"""
+        fake = FakeEmbeddings(fail_first=100)
+        scheduler = make_scheduler(max_retries=2, max_in_flight=1)
+        with pytest.raises(Exception, match="429"):
+            scheduler.run(["a", "b"], fake.embed_documents)
+
+    def test_token_bucket_waits_for_refill(self):
+        """Test the bucket blocks for exactly the missing tokens"""
+        now = [0.0]
+        slept = []
+
+        def sleep(seconds):
+            slept.append(seconds)
+            now[0] += seconds
+
+        bucket = TokenBucket(60, capacity=2, clock=lambda: now[0], sleep=sleep)
+        bucket.acquire()
+        bucket.acquire()
+        bucket.acquire()
+        assert slept == [pytest.approx(1.0)]
@@ -0,0 +1,55 @@
+import pytest
+from app.core import llm
+from app.core.config import settings
+from app.services.fakes import FakeChatModel, FakeEmbeddings, FakeRateLimitError, FakeServiceError
+
+def outcomes(call, n=200):
+    seen = []
+    for _ in range(n):
+        try:
+            call()
+            seen.append("ok")
+        except FakeRateLimitError:
+            seen.append("429")
+        except FakeServiceError:
+            seen.append("500")
+    return seen
+
+class TestFakes:
+    """Test the offline stand-ins for the Google APIs"""
+
+    def test_embedding_faults_are_seeded(self):
+        """Test injected 429s and 500s hit the configured share of calls, identically per seed"""
+        make = lambda seed: FakeEmbeddings(error_rate=0.1, rate_limit_rate=0.2, seed=seed)
+        first, again = make(1), make(1)
+        seen = outcomes(lambda: first.embed_query("attention"))
+
+        assert seen == outcomes(lambda: again.embed_query("attention"))
+        assert seen != outcomes(lambda: make(2).embed_query("attention"))
+        assert 20 <= seen.count("429") <= 60 and 5 <= seen.count("500") <= 40
+        assert first.rate_limited == seen.count("429")
+        assert first.texts_embedded == seen.count("ok")
+
+    def test_chat_faults_are_seeded(self):
+        """Test the fake chat model fails the same calls for the same seed"""
+        first = FakeChatModel(tokens=3, error_rate=0.25, seed=5)
+        again = FakeChatModel(tokens=3, error_rate=0.25, seed=5)
+        seen = outcomes(lambda: first.invoke("hello"), n=40)
+
+        assert seen == outcomes(lambda: again.invoke("hello"), n=40)
+        assert "500" in seen and "ok" in seen and "429" not in seen
+
+    def test_providers_follow_settings(self, monkeypatch):
+        """Test EMBEDDING_PROVIDER / LLM_PROVIDER=fake build configured fakes"""
+        monkeypatch.setattr(settings, "EMBEDDING_PROVIDER", "fake")
+        monkeypatch.setattr(settings, "FAKE_EMBEDDING_LATENCY", 0.01)
+        monkeypatch.setattr(settings, "LLM_PROVIDER", "fake")
+        monkeypatch.setattr(settings, "FAKE_LLM_TOKENS", 7)
+        monkeypatch.setattr(settings, "FAKE_RATE_LIMIT_RATE", 0.5)
+
+        embeddings = llm.build_embeddings()
+        assert isinstance(embeddings, FakeEmbeddings)
+        assert embeddings.latency == 0.01 and embeddings.rate_limit_rate == 0.5
+        chat = llm._build_chat_model("gemini-1.5-pro", 0.7)
+        assert isinstance(chat, FakeChatModel)
+        assert chat.tokens == 7 and chat.rate_limit_rate == 0.5
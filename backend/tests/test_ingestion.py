@@ -0,0 +1,237 @@
+import os
+import pytest
+from app.services.extraction import ExtractionPool, split_pages, text_looks_wrong
+from app.services.extraction_cache import ExtractionCache
+from app.services.ingestion import IngestionService
+from benchmarks.pdfgen import make_pdf
+
+class TestExtraction:
+    """Test PDF extraction off the event loop"""
+
+    def test_split_pages(self):
+        """Test page ranges cover every page exactly once"""
+        assert split_pages(7, 3) == [(0, 3), (3, 6), (6, 7)]
+        assert split_pages(0, 3) == []
+
+    @pytest.mark.asyncio
+    async def test_pool_preserves_page_order(self, tmp_path):
+        """Test pages split across workers are reassembled in order"""
+        pdf_path = make_pdf(str(tmp_path / "paper.pdf"), 7, lines_per_page=3)
+        pool = ExtractionPool(max_workers=2, max_queue=1, pages_per_task=2)
+        try:
+            pages = await pool.extract_pages(pdf_path)
+        finally:
+            pool.shutdown()
+
+        assert len(pages) == 7
+        assert [p.splitlines()[0] for p in pages] == [f"Page {i} section 1" for i in range(1, 8)]
+        assert "\n".join(pages) == IngestionService().extract_text(pdf_path)
+
+    @pytest.mark.asyncio
+    async def test_thread_fallback(self, tmp_path):
+        """Test extraction still works with the process pool disabled"""
+        pdf_path = make_pdf(str(tmp_path / "paper.pdf"), 3, lines_per_page=3)
+        pool = ExtractionPool(max_workers=0, pages_per_task=1)
+        text = await pool.extract_text(pdf_path)
+        assert text.startswith("Page 1 section 1")
+        assert "Page 3 section 1" in text
+
+    @pytest.mark.asyncio
+    async def test_iter_pages_streams_in_order(self, tmp_path):
+        """Test pages are yielded in order with only a few ranges extracted ahead"""
+        pdf_path = make_pdf(str(tmp_path / "paper.pdf"), 9, lines_per_page=3)
+        pool = ExtractionPool(max_workers=0, pages_per_task=2)
+        seen = []
+        pages = []
+        async for page in pool.iter_pages(pdf_path, progress=lambda done, total: seen.append((done, total)), lookahead=2):
+            pages.append(page)
+
+        assert [p.splitlines()[0] for p in pages] == [f"Page {i} section 1" for i in range(1, 10)]
+        assert seen == [(2, 9), (4, 9), (6, 9), (8, 9), (9, 9)]
+
+    def test_text_quality_heuristic(self):
+        """Test empty, garbled, run-together and fragmented text is flagged for the fallback"""
+        good = "Attention mechanisms relate positions of a sequence.\nWe report BLEU scores on WMT 2014."
+        assert not text_looks_wrong(good)
+        assert text_looks_wrong("")
+        assert text_looks_wrong("   \n ")
+        assert text_looks_wrong("\ufffd\ufffd text \ufffd\ufffd with \ufffd\ufffd glyphs")
+        assert text_looks_wrong("Attentionmechanismsrelatepositionsofasequenceandreportscores")
+        assert text_looks_wrong("\n".join("a b c d e f g h i j k l".split()))
+        assert text_looks_wrong("%$#@ 1234 5678 !!?? ---- ==== //// 9999 0000 %%%% ^^^^ &&&&")
+
+    @pytest.mark.asyncio
+    async def test_fast_path_with_fallback(self, tmp_path):
+        """Test pypdf extracts every page and pdfplumber only re-reads the page that looks wrong"""
+        from benchmarks.pdfgen import default_page_lines
+
+        lines = lambda page_no, n: [] if page_no == 2 else default_page_lines(page_no, n)
+        pdf_path = make_pdf(str(tmp_path / "paper.pdf"), 5, lines_per_page=3, page_lines=lines)
+        pool = ExtractionPool(max_workers=0, pages_per_task=5)
+        pages = await pool.extract_pages(pdf_path)
+
+        assert [p.splitlines()[0] if p else "" for p in pages] == [
+            "Page 1 section 1", "Page 2 section 1", "", "Page 4 section 1", "Page 5 section 1"
+        ]
+        stats = pool.stats()
+        assert stats["pypdf"]["pages"] == 5
+        assert stats["pdfplumber"]["pages"] == stats["fallback_pages"] == 1
+        assert stats["fallback_rate"] == 0.2
+
+    @pytest.mark.asyncio
+    async def test_extraction_cache(self, tmp_path):
+        """Test an identical file is served from the cache by content hash"""
+        pdf_path = make_pdf(str(tmp_path / "paper.pdf"), 4, lines_per_page=3)
+        copy_path = str(tmp_path / "copy.pdf")
+        with open(pdf_path, "rb") as src, open(copy_path, "wb") as dst:
+            dst.write(src.read())
+        pool = ExtractionPool(max_workers=0, pages_per_task=3, cache=ExtractionCache(str(tmp_path / "cache.db")))
+
+        first = await pool.extract_text(pdf_path)
+        progress = []
+        again = await pool.extract_text(copy_path, progress=lambda *p: progress.append(p))
+
+        assert again == first
+        assert progress[-1] == (4, 4)
+        stats = pool.stats()
+        assert stats["pypdf"]["pages"] == 4
+        assert stats["cache"]["hits"] == 1
+        assert stats["cache"]["hit_rate"] == 0.5
+
+    def test_extraction_cache_lru_eviction(self, tmp_path):
+        """Test least recently used documents are evicted with their pages"""
+        cache = ExtractionCache(str(tmp_path / "cache.db"), max_documents=2)
+        for name in ("a", "b"):
+            cache.put_pages(name, "auto", 0, [f"{name} page"])
+            cache.complete(name, "auto", 1)
+        assert cache.lookup("a", "auto") == 1
+        cache.put_pages("c", "auto", 0, ["c page"])
+        cache.complete("c", "auto", 1)
+
+        assert cache.lookup("b", "auto") is None
+        assert cache.get_pages("a", "auto", 0, 1) == ["a page"]
+        assert cache.stats()["evictions"] == 1
+
+class TestDocuments:
+    """Test content-addressed uploads and the document registry"""
+
+    def make_service(self, tmp_path):
+        from app.services.documents import DocumentRegistry
+
+        service = IngestionService(registry=DocumentRegistry(str(tmp_path / "documents.db")))
+        service.upload_dir = str(tmp_path)
+        return service
+
+    def upload(self, name, content):
+        import io
+        from fastapi import UploadFile
+
+        return UploadFile(file=io.BytesIO(content), filename=name)
+
+    @pytest.mark.asyncio
+    async def test_same_name_does_not_overwrite(self, tmp_path):
+        """Test different files with the same name become separate documents"""
+        service = self.make_service(tmp_path)
+        first = await service.register_upload(self.upload("paper.pdf", b"version one"))
+        second = await service.register_upload(self.upload("paper.pdf", b"version two"))
+
+        assert first["id"] != second["id"]
+        assert first["file_path"] != second["file_path"]
+        assert open(first["file_path"], "rb").read() == b"version one"
+
+    @pytest.mark.asyncio
+    async def test_identical_upload_reuses_document(self, tmp_path):
+        """Test re-uploading identical content maps to the same document"""
+        service = self.make_service(tmp_path)
+        first = await service.register_upload(self.upload("paper.pdf", b"same bytes"))
+        again = await service.register_upload(self.upload("copy.pdf", b"same bytes"))
+        assert again["id"] == first["id"]
+        assert len(service.registry.list()) == 1
+
+    @pytest.mark.asyncio
+    async def test_replace_keeps_id_and_drops_old_file(self, tmp_path):
+        """Test replacing a document keeps its id and removes the old file"""
+        service = self.make_service(tmp_path)
+        original = await service.register_upload(self.upload("paper.pdf", b"version one"))
+        replaced = await service.replace_document(original["id"], self.upload("paper.pdf", b"version two"))
+
+        assert replaced["id"] == original["id"]
+        assert replaced["content_hash"] != original["content_hash"]
+        assert not os.path.exists(original["file_path"])
+        assert await service.replace_document("missing", self.upload("x.pdf", b"x")) is None
+
+    @pytest.mark.asyncio
+    async def test_index_file_streams_pages(self, tmp_path, monkeypatch):
+        """Test a PDF is extracted, chunked and embedded page by page with progress reported"""
+        import app.services.ingestion as ingestion_module
+        import app.services.rag as rag_module
+        from app.services.embedding_scheduler import EmbeddingScheduler
+        from app.services.fakes import FakeEmbeddings
+        from app.services.rag import RAGService
+        from app.services.vectorstores import make_vector_store
+
+        rag = RAGService(embeddings=FakeEmbeddings(), data_dir=str(tmp_path),
+                         scheduler=EmbeddingScheduler(batch_size=8),
+                         vector_store=make_vector_store("numpy", str(tmp_path)))
+        monkeypatch.setattr(rag_module, "_rag_service", rag)
+        monkeypatch.setattr(ingestion_module, "extraction_pool", ExtractionPool(max_workers=0, pages_per_task=5))
+
+        service = self.make_service(tmp_path)
+        pdf_path = make_pdf(str(tmp_path / "paper.pdf"), 30)
+        with open(pdf_path, "rb") as f:
+            document = await service.register_upload(self.upload("paper.pdf", f.read()))
+        pages, chunks = [], []
+        result = await service.index_file(document["id"], page_progress=lambda *p: pages.append(p),
+                                          progress=lambda *c: chunks.append(c))
+
+        assert result["status"] == "ingested_and_indexed"
+        assert result["chunks"] == result["chunks_added"] == rag.vector_store.count() > 30
+        # The "Page N section M" running header is stripped from every page
+        assert result["header_lines_stripped"] == 30
+        assert result["preview"].startswith("1. Attention")
+        assert pages[-1] == (30, 30)
+        assert chunks[-1] == (result["chunks"], result["chunks"])
+        assert not any("section" in d.page_content for d in rag.lexical_search("Page section", k=50))
+        assert service.registry.get(document["id"])["chunk_count"] == result["chunks"]
+
+    def test_repeated_line_stripper(self):
+        """Test running headers and footers are removed while body lines and one-off titles stay"""
+        from app.services.dedup import RepeatedLineStripper
+
+        pages = [
+            f"Journal of Testing, Vol. 3\nResult {chr(96 + i) * 3} holds.\nBody text {i} {'x' * i}\n{i} of 12"
+            for i in range(1, 13)
+        ]
+        pages[0] = "A Paper Title\n" + pages[0]
+        stripper = RepeatedLineStripper(warmup=4)
+        out = []
+        for page in pages:
+            out += stripper.feed(page)
+        out += stripper.finish()
+
+        assert len(out) == len(pages)
+        assert out[0].startswith("A Paper Title")
+        assert all("Journal of Testing" not in page and " of 12" not in page for page in out[1:])
+        assert all(f"Result {chr(96 + i) * 3} holds." in page for i, page in enumerate(out, 1))
+        assert stripper.lines_stripped == 2 * 12 - 1
+
+    @pytest.mark.asyncio
+    async def test_registry_filters_and_names(self, tmp_path):
+        """Test documents resolve by source, tag, upload time and by name mentioned in a query"""
+        service = self.make_service(tmp_path)
+        bert = await service.register_upload(self.upload("bert_base.pdf", b"bert"), tags=["NLP", "encoders"])
+        gpt = await service.register_upload(self.upload("GPT-3.pdf", b"gpt"), tags=["nlp"])
+        resnet = await service.register_upload(self.upload("resnet.pdf", b"resnet"))
+        again = await service.register_upload(self.upload("resnet-copy.pdf", b"resnet"), tags=["vision"])
+        registry = service.registry
+
+        assert again["id"] == resnet["id"] and again["tags"] == ["vision"]
+        assert [d["id"] for d in registry.find(tags=["nlp"])] == [bert["id"], gpt["id"]]
+        assert [d["id"] for d in registry.find(tags=["nlp"], sources=["GPT-3.pdf"])] == [gpt["id"]]
+        assert [d["id"] for d in registry.find(uploaded_after=gpt["created_at"])] == [gpt["id"], resnet["id"]]
+        assert registry.find(doc_ids=[]) == [] and registry.find(tags=["missing"]) == []
+        assert [d["id"] for d in registry.named_in("Compare ResNet with BERT base, please")] == [resnet["id"], bert["id"]]
+        assert [d["id"] for d in registry.named_in("how does gpt-3.pdf scale?")] == [gpt["id"]]
+
+        registry.delete(bert["id"])
+        assert [d["id"] for d in registry.find(tags=["nlp"])] == [gpt["id"]]
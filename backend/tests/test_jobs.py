@@ -0,0 +1,38 @@
+import pytest
+from app.services.jobs import JobManager, JobStore, COMPLETED, STAGE_INDEXED
+
+class FakeIngestion:
+    """Records calls instead of extracting and embedding"""
+
+    def __init__(self):
+        self.streamed = []
+
+    async def index_file(self, doc_id, page_progress=None, progress=None):
+        self.streamed.append(doc_id)
+        page_progress(2, 4)
+        progress(3, 3)
+        page_progress(4, 4)
+        progress(5, 5)
+        return {"doc_id": doc_id, "status": "ingested_and_indexed"}
+
+class TestJobs:
+    """Test the background ingestion job queue"""
+
+    @pytest.mark.asyncio
+    async def test_job_runs_all_stages(self, tmp_path):
+        """Test a submitted job reports progress and completes"""
+        ingestion = FakeIngestion()
+        manager = JobManager(JobStore(str(tmp_path / "jobs.db")), workers=2, ingestion=ingestion)
+        job = await manager.submit({"id": "doc1", "filename": "paper.pdf", "file_path": "/uploads/paper.pdf"})
+        assert job["status"] == "queued"
+
+        await manager.join()
+        await manager.stop()
+
+        job = manager.get(job["id"])
+        assert job["status"] == COMPLETED
+        assert job["stage"] == STAGE_INDEXED
+        assert (job["pages_extracted"], job["pages_total"]) == (4, 4)
+        assert (job["chunks_embedded"], job["chunks_total"]) == (5, 5)
+        assert job["result"]["status"] == "ingested_and_indexed"
+        assert ingestion.streamed == ["doc1"]
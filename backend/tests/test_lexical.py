@@ -0,0 +1,93 @@
+import pytest
+from app.services.lexical import BM25Index, tokenize
+from app.services.rag import reciprocal_rank_fusion
+from langchain_core.documents import Document
+
+CHUNKS = {
+    "c1": "Our model achieves a BLEU score of 28.4 on the WMT 2014 English-to-German task.",
+    "c2": "The Transformer relies entirely on attention mechanisms.",
+    "c3": "We evaluate on ImageNet and report top-1 accuracy.",
+    "c4": "Attention is computed with scaled dot products; attention heads run in parallel.",
+}
+
+
+def make_index(path):
+    index = BM25Index(str(path / "lexical.db"))
+    ids = list(CHUNKS)
+    index.add(ids, [CHUNKS[i] for i in ids], [{"doc_id": "d1" if i < "c3" else "d2"} for i in ids])
+    return index
+
+
+class TestBM25Index:
+    """Test the BM25 inverted index"""
+
+    def test_tokenize_keeps_numbers_and_drops_stopwords(self):
+        """Test decimals stay whole and stopwords are removed"""
+        assert tokenize("The BLEU score is 28.4 on WMT-2014") == ["bleu", "score", "28.4", "wmt", "2014"]
+
+    def test_exact_terms_rank_first(self, tmp_path):
+        """Test exact-term queries find the chunk that contains the terms"""
+        index = make_index(tmp_path)
+        hits = index.search("BLEU score on WMT 2014", k=2)
+        assert hits[0][0].id == "c1"
+        assert [doc.id for doc, _ in index.search("attention", k=4)] == ["c4", "c2"]
+        assert index.search("graph neural networks") == []
+
+    def test_filters_delete_and_reload(self, tmp_path):
+        """Test filters apply, deleted chunks disappear and the index reloads from disk"""
+        index = make_index(tmp_path)
+        assert [doc.id for doc, _ in index.search("attention", where={"doc_id": "d1"})] == ["c2"]
+
+        index.delete(["c4", "missing"])
+        assert index.stats()["dead_postings"] > 0
+        assert [doc.id for doc, _ in index.search("attention")] == ["c2"]
+
+        index.delete(["c2", "c3"])
+        assert index.count() == 1
+        assert index.stats()["dead_postings"] == 0  # mostly dead: postings compacted
+        assert index.search("attention") == []
+
+        reloaded = BM25Index(str(tmp_path / "lexical.db"))
+        assert reloaded.get_ids() == ["c1"]
+        assert reloaded.search("BLEU")[0][0].metadata == {"doc_id": "d1"}
+
+    def test_deleted_last_row_is_not_reused(self, tmp_path):
+        """Test a chunk added after deleting the last row does not match the deleted chunk's terms"""
+        index = BM25Index(str(tmp_path / "lexical.db"))
+        index.add(["a", "b"], ["alpha beta", "gamma zebra"], [{}, {}])
+        index.delete(["b"])
+        index.add(["c"], ["delta epsilon"], [{}])
+        assert index.search("zebra") == []
+        assert [doc.id for doc, _ in index.search("delta")] == ["c"]
+
+    def test_arrays_follow_live_chunks(self, tmp_path):
+        """Test re-ingesting and deleting documents does not grow the per-row arrays searches copy"""
+        index = make_index(tmp_path)
+        for version in range(50):
+            ids = [f"v{version}-{i}" for i in range(10)]
+            index.add(ids, [f"revision {version} chunk {i} attention" for i in range(10)], [{"doc_id": "d3"}] * 10)
+            index.delete(ids)
+        assert len(index.lengths) <= 2 * (index.count() + 10)
+        assert [doc.id for doc, _ in index.search("attention", k=4)] == ["c4", "c2"]
+        assert [doc.id for doc, _ in index.search("attention", where={"doc_id": "d2"})] == ["c4"]
+        assert index.get_ids(where={"doc_id": "d3"}) == []
+
+        reloaded = BM25Index(str(tmp_path / "lexical.db"))
+        assert reloaded.get_ids() == index.get_ids() == list(CHUNKS)
+
+    def test_add_skips_known_ids(self, tmp_path):
+        """Test re-adding content-addressed ids is a no-op"""
+        index = make_index(tmp_path)
+        index.add(["c1"], [CHUNKS["c1"]], [{"doc_id": "d1"}])
+        assert index.count() == 4
+        assert index.missing(["c1", "c9"]) == ["c9"]
+
+
+class TestReciprocalRankFusion:
+    """Test rank fusion of result lists"""
+
+    def test_documents_in_both_lists_rise(self):
+        """Test a document ranked by both retrievers beats single-list leaders"""
+        a, b, c = (Document(id=i, page_content=i) for i in "abc")
+        fused = reciprocal_rank_fusion([[a, b], [c, b]])
+        assert [doc.id for doc in fused] == ["b", "a", "c"]
@@ -48,3 +48,261 @@ class TestRAGService:
         results = rag.similarity_search("test query")
         # Results might be empty or contain previous test data
         assert isinstance(results, list)
+
+class TestRAGServiceOffline:
+    """Test RAG service against the local fake embedding backend"""
+
+    def test_indexing_survives_rate_limits(self, sample_text, tmp_path):
+        """Test injected 429s are retried and the document is still indexed"""
+        from app.services.embedding_scheduler import EmbeddingScheduler
+        from app.services.fakes import FakeEmbeddings
+
+        fake = FakeEmbeddings(fail_first=2)
+        scheduler = EmbeddingScheduler(batch_size=1, max_in_flight=2, base_delay=0.001, max_delay=0.01)
+        rag = RAGService(embeddings=fake, data_dir=str(tmp_path), scheduler=scheduler)
+
+        rag.add_document(sample_text * 3, {"source": "test_paper.pdf"})
+
+        assert fake.rate_limited == 2
+        results = rag.similarity_search("BLEU score WMT 2014", k=2)
+        assert any("BLEU" in doc.page_content for doc in results)
+
+    def make_rag(self, tmp_path, backend="chroma", dedup=False):
+        from app.services.embedding_scheduler import EmbeddingScheduler
+        from app.services.fakes import FakeEmbeddings
+        from app.services.vectorstores import make_vector_store
+
+        return RAGService(embeddings=FakeEmbeddings(), data_dir=str(tmp_path),
+                          scheduler=EmbeddingScheduler(batch_size=4),
+                          vector_store=make_vector_store(backend, str(tmp_path)), dedup=dedup)
+
+    @pytest.mark.parametrize("backend", ["chroma", "numpy"])
+    def test_reingest_is_idempotent(self, sample_text, tmp_path, backend):
+        """Test re-adding the same document adds no duplicate chunks"""
+        rag = self.make_rag(tmp_path, backend)
+        metadata = {"source": "test_paper.pdf", "doc_id": "doc1", "content_hash": "a" * 64}
+
+        first = rag.add_document(sample_text * 3, metadata)
+        second = rag.add_document(sample_text * 3, metadata)
+
+        assert first["added"] == first["chunks"] > 1
+        assert second == {"chunks": first["chunks"], "added": 0, "removed": 0, "duplicates": 0}
+        assert rag.vector_store.count() == first["chunks"]
+
+    def test_near_duplicate_chunks_are_linked_not_embedded(self, sample_text, tmp_path):
+        """Test repeated text is embedded once and a duplicate takes over when its original is deleted"""
+        rag = self.make_rag(tmp_path, "numpy", dedup=True)
+        first = rag.add_document(sample_text * 3, {"source": "a.pdf", "doc_id": "doc1", "content_hash": "a" * 64})
+        assert first["duplicates"] > 0
+        assert first["added"] + first["duplicates"] == first["chunks"]
+        assert rag.vector_store.count() == rag.lexical_index.count() == first["added"]
+
+        again = rag.add_document(sample_text * 3, {"source": "a.pdf", "doc_id": "doc1", "content_hash": "a" * 64})
+        assert again == dict(first, added=0)
+
+        copy = rag.add_document(sample_text * 3, {"source": "b.pdf", "doc_id": "doc2", "content_hash": "b" * 64})
+        assert copy["added"] == 0 and copy["duplicates"] == copy["chunks"]
+        assert rag.dedup_index.stats()["duplicate_chunks"] == first["duplicates"] + copy["chunks"]
+
+        rag.delete_document("doc1")
+        promoted = rag._document_chunk_ids("doc2")
+        assert len(promoted) == first["added"]
+        assert rag.lexical_index.count() == first["added"]
+        assert any("BLEU" in d.page_content for d in rag.similarity_search("BLEU score WMT 2014", k=2))
+
+        rag.delete_document("doc2")
+        assert rag.vector_store.count() == rag.lexical_index.count() == 0
+        assert rag.dedup_index.stats()["canonical_chunks"] == rag.dedup_index.stats()["duplicate_chunks"] == 0
+
+    def test_filters_find_chunks_linked_to_another_document(self, sample_text, tmp_path):
+        """Test a revision whose chunks all duplicate its original's is still searchable on its own"""
+        rag = self.make_rag(tmp_path, "numpy", dedup=True)
+        # Numbered words keep the chunks of one paper distinct from each other.
+        text = " ".join(f"{word} w{i}" for i, word in enumerate((sample_text * 3).split()))
+        rag.add_document(text, {"source": "a.pdf", "doc_id": "A", "content_hash": "a" * 64})
+        revision = rag.add_document(text + " Revised.", {"source": "b.pdf", "doc_id": "B", "content_hash": "b" * 64})
+        assert revision["duplicates"] == revision["chunks"] and rag._document_chunk_ids("B") == []
+
+        query = "BLEU score WMT 2014"
+        for mode in ("vector", "lexical", "hybrid"):
+            found = rag.similarity_search(query, k=2, where={"doc_id": ["B"]}, mode=mode)
+            assert len(found) == 2 and {d.metadata["doc_id"] for d in found} == {"B"}
+            assert any("BLEU" in d.page_content for d in found)
+            spread = rag.search_per_document(query, ["A", "B"], k=6, mode=mode)
+            assert [d.metadata["doc_id"] for d in spread].count("B") == 3
+        assert len(rag.document_chunks("B")) == revision["chunks"]
+
+    @pytest.mark.parametrize("dedup", [False, True])
+    def test_documents_with_the_same_file_keep_their_chunks(self, sample_text, tmp_path, dedup):
+        """Test a second document with the same content hash neither takes over nor deletes the first's chunks"""
+        rag = self.make_rag(tmp_path, "numpy", dedup=dedup)
+        first = rag.add_document(sample_text * 3, {"source": "a.pdf", "doc_id": "A", "content_hash": "a" * 64})
+        vector_ids = rag._document_chunk_ids("A")
+        lexical_ids = rag._document_lexical_ids("A")
+        assert len(vector_ids) == len(lexical_ids) == first["added"] > 0
+
+        rag.add_document(sample_text * 3, {"source": "b.pdf", "doc_id": "B", "content_hash": "a" * 64})
+        assert rag._document_chunk_ids("A") == vector_ids
+
+        rag.delete_document("B")
+        assert rag._document_chunk_ids("A") == vector_ids
+        assert rag._document_lexical_ids("A") == lexical_ids
+        assert rag.vector_store.count() == rag.lexical_index.count() == first["added"]
+
+    @pytest.mark.parametrize("backend", ["chroma", "numpy"])
+    def test_replace_removes_stale_chunks_and_delete(self, sample_text, tmp_path, backend):
+        """Test a new version replaces old chunks and deletion empties the index"""
+        rag = self.make_rag(tmp_path, backend)
+        rag.add_document(sample_text * 3, {"source": "v1.pdf", "doc_id": "doc1", "content_hash": "a" * 64})
+        rag.add_document("Unrelated paper about graphs.", {"source": "other.pdf", "doc_id": "doc2"})
+
+        replaced = rag.add_document(sample_text, {"source": "v2.pdf", "doc_id": "doc1", "content_hash": "b" * 64})
+        assert replaced["removed"] > 0
+        assert rag.vector_store.count() == replaced["chunks"] + 1
+
+        assert rag.delete_document("doc1") == replaced["chunks"]
+        assert rag.vector_store.count() == 1
+
+    def test_lexical_mode_skips_embedding_api(self, sample_text, tmp_path):
+        """Test lexical retrieval answers without embedding the query"""
+        rag = self.make_rag(tmp_path, "numpy")
+        rag.add_document(sample_text * 3, {"source": "test_paper.pdf", "doc_id": "doc1"})
+        calls = rag.embeddings.embeddings.calls
+
+        results = rag.similarity_search("BLEU score WMT 2014", k=2, mode="lexical")
+        assert "BLEU" in results[0].page_content
+        assert rag.embeddings.embeddings.calls == calls
+
+        with pytest.raises(ValueError):
+            rag.similarity_search("BLEU", mode="keyword")
+
+    def test_hybrid_falls_back_to_lexical_on_quota(self, sample_text, tmp_path):
+        """Test hybrid retrieval fuses both sides and degrades to BM25 on a 429"""
+        from app.services.fakes import FakeRateLimitError
+
+        rag = self.make_rag(tmp_path, "numpy")
+        rag.add_document(sample_text * 3, {"source": "test_paper.pdf", "doc_id": "doc1"})
+        hybrid = rag.similarity_search("BLEU score WMT 2014", k=3, mode="hybrid")
+        assert any("BLEU" in doc.page_content for doc in hybrid)
+
+        def exhausted(text):
+            raise FakeRateLimitError()
+
+        rag.embeddings.embed_query = exhausted
+        fallback = rag.similarity_search("BLEU score WMT 2014", k=2, mode="hybrid")
+        assert [d.id for d in fallback] == [d.id for d in rag.similarity_search("BLEU score WMT 2014", k=2, mode="lexical")]
+
+    @pytest.mark.parametrize("backend", ["numpy"])
+    def test_lexical_index_follows_replace_and_delete(self, sample_text, tmp_path, backend):
+        """Test the BM25 index drops stale chunks alongside the vector store"""
+        rag = self.make_rag(tmp_path, backend)
+        rag.add_document(sample_text * 3, {"source": "v1.pdf", "doc_id": "doc1", "content_hash": "a" * 64})
+        replaced = rag.add_document(sample_text, {"source": "v2.pdf", "doc_id": "doc1", "content_hash": "b" * 64})
+        assert rag.lexical_index.count() == replaced["chunks"]
+
+        rag.delete_document("doc1")
+        assert rag.lexical_index.count() == 0
+
+    @pytest.mark.parametrize("backend", ["chroma", "numpy"])
+    def test_similarity_search_many_embeds_in_one_call(self, sample_text, tmp_path, backend):
+        """Test a batch of queries costs one embedding call and matches searching one by one"""
+        rag = self.make_rag(tmp_path, backend)
+        rag.add_document(sample_text * 3, {"source": "test_paper.pdf", "doc_id": "doc1"})
+        queries = ["BLEU score WMT 2014", "attention mechanisms", "recurrent networks", "BLEU score WMT 2014"]
+        fake = rag.embeddings.embeddings
+        calls = fake.calls
+
+        for mode in ("vector", "hybrid"):
+            batch = rag.similarity_search_many(queries, k=3, mode=mode)
+            assert len(batch) == len(queries)
+            single = [rag.similarity_search(query, k=3, mode=mode) for query in queries]
+            assert [[d.id for d in docs] for docs in batch] == [[d.id for d in docs] for docs in single]
+        # One batched call embedded the three distinct queries; every later lookup hit the cache.
+        assert fake.calls == calls + 1
+        assert rag.similarity_search_many([], k=3) == []
+
+    @pytest.mark.parametrize("backend", ["chroma", "numpy"])
+    def test_search_per_document_spreads_results(self, sample_text, tmp_path, backend):
+        """Test per-document retrieval gives each named paper a share even when one dominates"""
+        rag = self.make_rag(tmp_path, backend)
+        verbose = " ".join(f"Section {i}: we report BLEU score results on WMT 2014." for i in range(200))
+        rag.add_document(verbose, {"source": "verbose.pdf", "doc_id": "verbose"})
+        rag.add_document(sample_text, {"source": "short.pdf", "doc_id": "short"})
+        rag.add_document("Graph networks for molecules.", {"source": "graphs.pdf", "doc_id": "graphs"})
+
+        query = "BLEU score results WMT 2014"
+        assert {d.metadata["doc_id"] for d in rag.similarity_search(query, k=6)} == {"verbose"}
+        for mode in ("vector", "lexical", "hybrid"):
+            spread = rag.search_per_document(query, ["verbose", "short"], k=6, mode=mode)
+            assert [d.metadata["doc_id"] for d in spread[:2]] == ["verbose", "short"]
+            assert {d.metadata["doc_id"] for d in spread} == {"verbose", "short"}
+
+        # "graphs" has one chunk (and no lexical match); the others fill its share
+        spread = rag.search_per_document(query, ["graphs", "short", "verbose"], k=6, mode="vector")
+        assert len(spread) == 6
+        assert [d.metadata["doc_id"] for d in spread].count("graphs") == 1
+        filtered = rag.similarity_search(query, k=3, where={"doc_id": ["short", "graphs"]}, mode="lexical")
+        assert {d.metadata["doc_id"] for d in filtered} == {"short"}
+
+    def test_streaming_chunker_matches_joined_text(self):
+        """Test chunks of page-by-page input carry correct offsets into the joined text, across pages"""
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        from app.services.chunking import StreamingChunker
+
+        splitter = RecursiveCharacterTextSplitter(chunk_size=200, chunk_overlap=40, add_start_index=True)
+        pages = [" ".join(f"p{p}w{i}" for i in range(10)) for p in range(100)] + [""]
+        text = "\n".join(page for page in pages if page)
+        chunker = StreamingChunker(splitter, window=600)
+
+        chunks, buffered = [], 0
+        for page in pages:
+            chunks += chunker.feed(page)
+            buffered = max(buffered, len(chunker._buffer))
+        chunks += chunker.finish()
+
+        assert buffered < 600 + len(pages[0]) + 1
+        assert all(text[start:start + len(chunk)] == chunk for start, chunk in chunks)
+        assert any("p0w" in chunk and "p1w" in chunk for _, chunk in chunks)
+        offsets = [start for start, _ in chunks]
+        assert offsets == sorted(set(offsets))
+        # Consecutive chunks overlap or touch, so no text is lost
+        assert all(b <= a + len(c) + 1 for (a, c), (b, _) in zip(chunks, chunks[1:]))
+        assert chunks[-1][0] + len(chunks[-1][1]) == len(text)
+
+    def test_document_indexer_streams_batches(self, sample_text, tmp_path):
+        """Test chunks become searchable batch by batch and re-streaming the same file adds nothing"""
+        rag = self.make_rag(tmp_path, "numpy")
+        metadata = {"source": "paper.pdf", "doc_id": "doc1", "content_hash": "c" * 64}
+        pages = [f"Page {i}. " + sample_text for i in range(20)]
+
+        indexer = rag.open_document(metadata)
+        indexer.batch_size = 4
+        searchable = []
+        for page in pages:
+            indexer.add_text(page)
+            searchable.append(rag.vector_store.count())
+        first = indexer.close()
+
+        assert 0 < searchable[-1] < first["chunks"]
+        assert first["added"] == first["chunks"] == rag.vector_store.count()
+
+        indexer = rag.open_document(metadata)
+        for page in pages:
+            indexer.add_text(page)
+        assert indexer.close() == {"chunks": first["chunks"], "added": 0, "removed": 0, "duplicates": 0}
+
+    def test_document_indexer_keeps_lexical_index_on_quota(self, sample_text, tmp_path):
+        """Test chunks after an embedding failure still reach the lexical index and close raises"""
+        from app.services.embedding_scheduler import EmbeddingScheduler
+        from app.services.fakes import FakeEmbeddings, FakeRateLimitError
+
+        rag = RAGService(embeddings=FakeEmbeddings(fail_first=100), data_dir=str(tmp_path),
+                         scheduler=EmbeddingScheduler(batch_size=4, max_retries=0, base_delay=0.001), dedup=False)
+        indexer = rag.open_document({"source": "paper.pdf", "doc_id": "doc1", "content_hash": "d" * 64})
+        indexer.batch_size = 2
+        for i in range(10):
+            indexer.add_text(f"Page {i}. " + sample_text)
+        with pytest.raises(FakeRateLimitError):
+            indexer.close()
+        assert rag.lexical_index.count() == len(indexer.ids)
+        assert "Page 9." in " ".join(d.page_content for d in rag.lexical_search("Page 9 BLEU", k=40))
@@ -0,0 +1,77 @@
+import pytest
+from app.agents.router import LocalRouter
+from benchmarks.bench_routing import load_eval_set
+
+class TestLocalRouter:
+    """Test the local routing tiers"""
+
+    def test_obvious_requests_route_locally(self):
+        """Test keyword rules and centroids pick the right agent"""
+        router = LocalRouter()
+        assert router.route("Generate code for the attention layer in PyTorch") == "Code Generator"
+        assert router.route("Compare these two papers") == "Paper Comparator"
+        assert router.route("Suggest charts to visualize the findings") == "Dashboard Planner"
+        assert router.stats()["rule_hits"] == 3
+        # "different" is not a request to compare papers
+        assert router.route("What are the different datasets used?") != "Paper Comparator"
+        assert router.route("How does BERT differ from GPT?") == "Paper Comparator"
+
+    def test_unsure_queries_fall_back_and_are_cached(self):
+        """Test an ambiguous query defers to the LLM and its answer is reused"""
+        router = LocalRouter()
+        query = "Turn this into a wiki page for my team"
+        assert router.route(query) is None
+
+        router.record_llm(query, "Documentation Writer", 1.5)
+        assert router.route("turn this into a WIKI page for my team!") == "Documentation Writer"
+
+        stats = router.stats()
+        assert stats["queries"] == 2
+        assert stats["cache_hits"] == 1
+        assert stats["llm_fallbacks"] == 1
+        assert stats["fallback_rate"] == 0.5
+        assert stats["llm_ms_avg"] == 1500.0
+
+    def test_compound_requests_split_by_agent(self):
+        """Test clauses for different agents become separate tasks and single-agent requests stay whole"""
+        router = LocalRouter()
+        assert router.split("Summarize this paper, list its limitations and give me starter code") == [
+            ("Paper Analyzer", "Summarize this paper"),
+            ("Insight Generator", "list its limitations"),
+            ("Code Generator", "give me starter code"),
+        ]
+        assert router.split("For the BERT paper: summarize it. Then draft a README", max_agents=3) == [
+            ("Paper Analyzer", "For the BERT paper: summarize it"),
+            ("Documentation Writer", "draft a README"),
+        ]
+        assert router.split("Summarize this paper, list its limitations and give me starter code", max_agents=2) == [
+            ("Paper Analyzer", "Summarize this paper"),
+            ("Insight Generator", "list its limitations"),
+        ]
+        assert router.split("Summarize the paper and explain its key findings") == []
+        assert router.split("Compare the two papers and contrast their results") == []
+        assert router.split("What dataset did they use, and how does it compare to ImageNet?") == []
+        assert router.stats()["fanouts"] == 3
+
+    def test_eval_set_accuracy(self):
+        """Test local decisions on the labelled set are almost always right"""
+        router = LocalRouter()
+        rows = load_eval_set()
+        answered = [(row, router.route(row["query"])) for row in rows]
+        answered = [(row, agent) for row, agent in answered if agent]
+        assert len(answered) / len(rows) >= 0.8
+        assert sum(agent == row["agent"] for row, agent in answered) / len(answered) >= 0.95
+
+    @pytest.mark.asyncio
+    async def test_orchestrator_skips_llm_when_confident(self, monkeypatch):
+        """Test route_query answers obvious requests without invoking the LLM"""
+        from app.agents.orchestrator import OrchestratorAgent
+
+        orchestrator = OrchestratorAgent()
+        orchestrator.router = LocalRouter()
+
+        def no_llm(*args, **kwargs):
+            raise AssertionError("LLM router called")
+
+        monkeypatch.setattr(type(orchestrator.llm), "ainvoke", no_llm, raising=False)
+        assert await orchestrator.route_query("Write a README for this project") == "Documentation Writer"
@@ -0,0 +1,161 @@
+import pytest
+from app.services.chunking import SectionChunker, section_heading
+from app.services.rag import RAGService
+
+SECTIONS = {
+    "1 Introduction": "Sequence transduction models rely on recurrent networks that process tokens one by one.",
+    "2 Related Work": "Convolutional encoders reduce sequential computation but still grow with distance.",
+    "3 Method": "The encoder maps the input tokens with stacked multi-head attention and feed-forward layers.",
+    "4 Experiments": "We train on the WMT 2014 English-German dataset with the Adam optimizer and warmup.",
+    "5 Results": "The big model reaches a BLEU score of 28.4, ahead of every published ensemble.",
+    "6 Conclusion": "Attention alone is enough for strong translation quality at a fraction of the cost.",
+    "References": "[1] Bahdanau, Cho and Bengio. Neural machine translation by jointly learning to align. ICLR 2015.",
+}
+TABLE = ["Model BLEU EN-DE BLEU EN-FR Cost"] + [f"Model-{i} {20 + i}.{i} {30 + i}.{i} {i}.0e18" for i in range(12)]
+
+
+def paper_pages(repeat: int = 8):
+    """A paper as pdfplumber would return it, 20 lines per page."""
+    lines = ["Attention Is All You Need", "Ashish Vaswani, Google Brain", "Abstract—We propose the Transformer."]
+    for heading, sentence in SECTIONS.items():
+        lines.append(heading)
+        lines += [f"{sentence} ({heading.split()[-1].lower()} line {i})" for i in range(repeat)]
+        if heading == "5 Results":
+            lines += TABLE
+    return ["\n".join(lines[i:i + 20]) for i in range(0, len(lines), 20)]
+
+
+class TestSectionChunker:
+    """Test section-aligned chunking of research papers"""
+
+    def test_headings_are_recognized(self):
+        """Test numbered, upper-case and inline headings map to canonical sections, subsections do not"""
+        assert section_heading("3 Methodology") == "Method"
+        assert section_heading("IV. EXPERIMENTAL RESULTS") == "Results"
+        assert section_heading("Abstract—We propose a model.") == "Abstract"
+        assert section_heading("Appendix B: Proofs") == "Appendix"
+        assert section_heading("REFERENCES") == "References"
+        assert section_heading("3.1 Method") is None
+        assert section_heading("We describe our method below.") is None
+
+    def test_chunks_stay_inside_sections_and_keep_tables_whole(self):
+        """Test no chunk crosses a heading, tables are one chunk, and streaming matches whole-text chunking"""
+        pages = paper_pages()
+        text = "\n".join(pages)
+        whole = SectionChunker(chunk_size=300, chunk_overlap=80)
+        expected = whole.feed(text) + whole.finish()
+
+        chunker = SectionChunker(chunk_size=300, chunk_overlap=80, window=900)
+        chunks = []
+        for page in pages:
+            chunks += chunker.feed(page)
+        chunks += chunker.finish()
+
+        assert chunks == expected
+        assert all(text[start:start + len(chunk)] == chunk for start, chunk in chunks)
+        for start, chunk in chunks:
+            section = chunker.section_at(start)
+            assert all(section_heading(line) in (None, section) for line in chunk.split("\n"))
+        assert [chunker.section_at(start) for start, _ in chunks][:2] == ["Front matter", "Abstract"]
+        assert "References" in {chunker.section_at(start) for start, _ in chunks}
+        rows = "\n".join(TABLE[1:])
+        assert any(rows in chunk for _, chunk in chunks)
+
+
+class TestSectionRetrieval:
+    """Test the section index and section-scoped retrieval"""
+
+    def make_rag(self, tmp_path, backend="chroma", chunker="sections"):
+        from app.services.embedding_scheduler import EmbeddingScheduler
+        from app.services.fakes import FakeEmbeddings
+        from app.services.vectorstores import make_vector_store
+
+        return RAGService(embeddings=FakeEmbeddings(), data_dir=str(tmp_path),
+                          scheduler=EmbeddingScheduler(batch_size=4),
+                          vector_store=make_vector_store(backend, str(tmp_path)), dedup=False, chunker=chunker)
+
+    @pytest.mark.parametrize("backend", ["chroma", "numpy"])
+    def test_references_are_left_out_unless_asked_for(self, tmp_path, backend):
+        """Test the reference list is out of the default scope in every mode and searchable by section"""
+        rag = self.make_rag(tmp_path, backend)
+        rag.add_document("\n".join(paper_pages()), {"source": "paper.pdf", "doc_id": "paper"})
+
+        sections = rag.document_sections("paper")
+        assert [s["section"] for s in sections] == [
+            "Front matter", "Abstract", "Introduction", "Related Work", "Method", "Experiments", "Results",
+            "Conclusion", "References",
+        ]
+        query = "Bahdanau Cho Bengio neural machine translation jointly learning to align"
+        for mode in ("vector", "lexical", "hybrid"):
+            found = rag.similarity_search(query, k=20, mode=mode)
+            assert found and all(d.metadata["section"] != "References" for d in found)
+            cited = rag.similarity_search(query, k=2, where={"section": "References"}, mode=mode)
+            assert cited and all(d.metadata["section"] == "References" for d in cited)
+
+    def test_agent_searches_its_sections(self, tmp_path, monkeypatch):
+        """Test the Code Generator gets Method chunks, and whole-paper results for papers without sections"""
+        from app.agents.base import retrieve_documents
+        from app.agents.codegen import CodeGeneratorAgent
+
+        rag = self.make_rag(tmp_path)
+        rag.add_document("\n".join(paper_pages()), {"source": "paper.pdf", "doc_id": "paper"})
+        plain = self.make_rag(tmp_path / "plain", chunker="recursive")
+        plain.add_document("\n".join(paper_pages()), {"source": "plain.pdf", "doc_id": "plain"})
+        assert plain.document_sections("plain") == []
+
+        monkeypatch.setattr("app.services.rag._rag_service", rag)
+        agent = CodeGeneratorAgent()
+        query = "Implement the encoder attention layers trained on WMT 2014 with the BLEU results"
+        shared = retrieve_documents(query, 6, {"retrieval_mode": "lexical"}, rag)
+        assert {d.metadata["section"] for d in shared} != {"Method"}
+        docs = agent.retrieve(query, {"retrieval_mode": "lexical", "documents": shared})
+        assert docs and {d.metadata["section"] for d in docs} == {"Method"}
+
+        monkeypatch.setattr("app.services.rag._rag_service", plain)
+        shared = retrieve_documents(query, 6, {"retrieval_mode": "lexical"}, plain)
+        assert agent.retrieve(query, {"retrieval_mode": "lexical", "documents": shared}) == shared[:agent.retrieval_k]
+
+    def test_comparator_keeps_the_sections_filter(self, tmp_path, monkeypatch):
+        """Test comparing two papers restricted to a section searches only that section of each"""
+        from app.agents.comparator import PaperComparisonAgent
+
+        rag = self.make_rag(tmp_path)
+        for doc_id in ("first", "second"):
+            rag.add_document("\n".join(paper_pages()), {"source": f"{doc_id}.pdf", "doc_id": doc_id})
+        monkeypatch.setattr("app.services.rag._rag_service", rag)
+
+        context = {"doc_ids": ["first", "second"], "sections": ["Results"], "retrieval_mode": "lexical"}
+        docs = PaperComparisonAgent().retrieve("Compare the BLEU results of the two models", context)
+        assert {d.metadata["doc_id"] for d in docs} == {"first", "second"}
+        assert {d.metadata["section"] for d in docs} == {"Results"}
+
+    @pytest.mark.asyncio
+    async def test_orchestrator_searches_once_per_agent(self, tmp_path, monkeypatch):
+        """Test a section agent answers from the chunks the orchestrator retrieved for it, without searching again"""
+        from app.agents.orchestrator import OrchestratorAgent
+        from app.services.fakes import FakeChatModel
+
+        rag = self.make_rag(tmp_path)
+        rag.add_document("\n".join(paper_pages()), {"source": "paper.pdf", "doc_id": "paper"})
+        searches = []
+        search = rag.similarity_search
+
+        def counted(query, k=4, **kwargs):
+            searches.append(kwargs.get("where"))
+            return search(query, k=k, **kwargs)
+
+        async def route(query):
+            return "Code Generator"
+
+        monkeypatch.setattr("app.services.rag._rag_service", rag)
+        monkeypatch.setattr(rag, "similarity_search", counted)
+        orchestrator = OrchestratorAgent()
+        monkeypatch.setattr(orchestrator, "route_query", route)
+        orchestrator.agents["Code Generator"].llm = FakeChatModel(tokens=3)
+
+        query = "Implement the encoder attention layers trained on WMT 2014 with the BLEU results"
+        result = await orchestrator.process_query(query, {"retrieval_mode": "lexical", "bypass_cache": True})
+
+        assert result["agent"] == "Code Generator"
+        assert searches == [None, {"section": ["Method"]}]  # shared, then the agent's sections
+        assert set(result["sources"]) == {"paper.pdf"}
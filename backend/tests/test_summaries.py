@@ -0,0 +1,105 @@
+import pytest
+from langchain_core.documents import Document
+from app.services.documents import document_registry
+from app.services.fakes import FakeChatModel
+from app.services.summaries import DocumentSummarizer, SummaryStore, batch_texts, group_sections
+
+class TestSummaries:
+    """Test precomputed map-reduce summaries and how they are served"""
+
+    def index(self, sample_text, filename):
+        from app.services.rag import get_rag_service
+
+        document = document_registry.create(filename, f"/tmp/{filename}", f"{filename}-hash-v1")
+        metadata = {"source": filename, "doc_id": document["id"], "content_hash": document["content_hash"]}
+        # Words unique to the file, so no chunk is linked to a duplicate in another test's paper.
+        stem = filename.split(".")[0]
+        text = " ".join(f"{word} {stem}{i}" for i, word in enumerate((sample_text * 4).split()))
+        get_rag_service().add_document(text, metadata)
+        return document
+
+    def test_sections_send_overlap_once_and_reduce_shrinks(self):
+        """Test chunks are joined without their overlap, split at the budget and at section titles"""
+        text = "".join(f"word{i:03d} " for i in range(300))
+        chunks = [
+            Document(page_content=text[start:start + 1000], metadata={"start_index": start})
+            for start in range(0, len(text), 800)
+        ]
+        chunks[-1].metadata["section"] = "Results"
+        sections = group_sections(chunks, max_tokens=400)
+        assert "".join(section["text"] for section in sections) == text
+        assert all(section["tokens"] <= 400 for section in sections)
+        assert sections[-1]["title"] == "Results" and sections[-1]["chunks"] == 1
+
+        groups = batch_texts(["x" * 4000] * 5, max_tokens=100)
+        assert [len(group) for group in groups] == [2, 2, 1]
+
+    @pytest.mark.asyncio
+    async def test_map_reduce_summary_is_stored_per_version(self, sample_text, tmp_path):
+        """Test a document is summarized section by section, then as a whole, and a replaced version is not served"""
+        document = self.index(sample_text, "summary_paper.pdf")
+        fake = FakeChatModel(tokens=20)
+        summarizer = DocumentSummarizer(SummaryStore(str(tmp_path / "summaries.db")), llm=fake, section_tokens=400)
+
+        await summarizer.schedule(document["id"])
+        summary = summarizer.store.get(document["id"])
+        assert summary["status"] == "ready"
+        assert len(summary["sections"]) > 1
+        # One call per section, the reduce levels, then the paper summary.
+        assert summary["llm_calls"] == fake.calls > len(summary["sections"])
+        assert summary["summary"].endswith("token19")
+
+        answer = summarizer.answer("Summarize the paper", [document["id"]])
+        assert answer["precomputed"] and answer["sources"] == ["summary_paper.pdf"]
+        assert "## Section digests" in answer["response"]
+        assert summarizer.answer("Generate code for the model", [document["id"]]) is None
+        for query in ("Give me a short overview of summary_paper.pdf", "TL;DR of it", "What is the gist of this paper?"):
+            assert summarizer.answer(query, [document["id"]])["precomputed"]
+        # A summary of one topic of the paper is not the summary of the whole paper.
+        for query in ("Summarize the methodology", "Summarize the results in Table 3", "Summarize the limitations"):
+            assert summarizer.answer(query, [document["id"]]) is None
+        chunk = Document(page_content="...", metadata={"doc_id": document["id"], "source": "summary_paper.pdf",
+                                                       "content_hash": document["content_hash"]})
+        assert summarizer.context([chunk])[0].startswith("Summary of summary_paper.pdf:")
+
+        document_registry.update(document["id"], content_hash="summary_paper.pdf-hash-v2")
+        assert summarizer.answer("Summarize the paper", [document["id"]]) is None
+        summarizer.forget(document["id"])
+        assert summarizer.store.get(document["id"]) is None
+
+    @pytest.mark.asyncio
+    async def test_orchestrator_serves_stored_summary(self, sample_text, tmp_path, monkeypatch):
+        """Test a summary request is answered from the stored summary without retrieval or generation"""
+        from app.agents.orchestrator import OrchestratorAgent
+
+        document = self.index(sample_text, "served_paper.pdf")
+        summarizer = DocumentSummarizer(SummaryStore(str(tmp_path / "summaries.db")), llm=FakeChatModel(tokens=5))
+        await summarizer.schedule(document["id"])
+        monkeypatch.setattr("app.agents.orchestrator.document_summarizer", summarizer)
+        monkeypatch.setattr("app.agents.base.document_summarizer", summarizer)
+
+        orchestrator = OrchestratorAgent()
+        routed = orchestrator.router.stats()["queries"]
+        analyzer = FakeChatModel(tokens=5)
+        orchestrator.agents["Paper Analyzer"].llm = analyzer
+        context = {"filters": {"doc_ids": [document["id"]]}, "retrieval_mode": "lexical"}
+
+        result = await orchestrator.process_query("Summarize the served_paper paper", context)
+        assert result["precomputed"] is True and result["agent"] == "Paper Analyzer"
+        assert analyzer.calls == 0
+        # Routed once, not once to check for a summary and again to answer.
+        assert orchestrator.router.stats()["queries"] == routed + 1
+
+        # Other Paper Analyzer requests get the summary as context above the chunks.
+        result = await orchestrator.process_query("Explain the methodology of the attention model", context)
+        assert "precomputed" not in result and analyzer.calls == 1
+        assert orchestrator.router.stats()["queries"] == routed + 2
+        result = await orchestrator.process_query("Summarize the methodology", context)
+        assert "precomputed" not in result and analyzer.calls == 2
+        # A summary request over two documents is generated, and still routed once.
+        two = {"doc_ids": [document["id"], "other-paper"], "retrieval_mode": "lexical"}
+        result = await orchestrator.process_query("Summarize the served_paper paper", two)
+        assert "precomputed" not in result and orchestrator.router.stats()["queries"] == routed + 4
+        docs = orchestrator.agents["Paper Analyzer"].retrieve("attention", {"doc_ids": [document["id"]]})
+        inputs = orchestrator.agents["Paper Analyzer"].prompt_inputs("attention", docs)
+        assert inputs["context"].startswith("Summary of served_paper.pdf:")
@@ -0,0 +1,64 @@
+import pytest
+import time
+from app.core.profiler import SamplingProfiler
+from app.core.telemetry import Metrics, end_request, server_timing, span, start_request
+
+class TestTelemetry:
+    """Test timing spans, Prometheus rendering and the sampling profiler"""
+
+    def test_spans_collect_per_request(self):
+        """Test spans inside a request are summed per stage into the Server-Timing value"""
+        token = start_request()
+        for stage in ("retrieve", "embed", "embed"):
+            with span(stage):
+                pass
+        timings = end_request(token)
+
+        assert [stage for stage, _ in timings] == ["retrieve", "embed", "embed"]
+        header = server_timing(timings, total=0.25)
+        assert header.startswith("retrieve;dur=")
+        assert 'embed;dur=' in header and 'desc="2x"' in header
+        assert header.endswith("total;dur=250.0")
+        with span("route"):
+            pass  # outside a request: histogram only
+        assert end_request(start_request()) == []
+
+    def test_prometheus_rendering(self):
+        """Test counters, collected samples and cumulative histogram buckets"""
+        metrics = Metrics()
+        metrics.describe("demo_seconds", "histogram", "Demo latency.")
+        for value in (0.002, 0.02, 0.02, 3.0):
+            metrics.observe("demo_seconds", value, stage="embed")
+        metrics.inc("demo_errors_total", source="agent")
+        metrics.inc("demo_errors_total", 2, source="agent")
+        metrics.add_collector(lambda: [("demo_errors_total", {"source": "embedding"}, 5)])
+        text = metrics.render()
+
+        assert "# TYPE demo_seconds histogram" in text
+        assert 'demo_seconds_bucket{stage="embed",le="0.005"} 1' in text
+        assert 'demo_seconds_bucket{stage="embed",le="0.025"} 3' in text
+        assert 'demo_seconds_bucket{stage="embed",le="+Inf"} 4' in text
+        assert 'demo_seconds_count{stage="embed"} 4' in text
+        assert text.count("# TYPE demo_errors_total counter") == 1
+        assert 'demo_errors_total{source="agent"} 3' in text
+        assert 'demo_errors_total{source="embedding"} 5' in text
+        assert metrics.value("demo_errors_total", source="agent") == 3
+
+    def test_profiler_dumps_collapsed_stacks(self, tmp_path):
+        """Test a recording captures the busy thread's stack in flame-graph format"""
+        profiler = SamplingProfiler(interval=0.001, output_dir=str(tmp_path))
+        recording = profiler.start()
+
+        def busy_loop():
+            deadline = time.perf_counter() + 0.1
+            while time.perf_counter() < deadline:
+                pass
+
+        busy_loop()
+        profiler.stop(recording)
+        path = profiler.dump(recording, "POST /api/v1/query")
+
+        assert path.endswith("POST_api_v1_query.folded")
+        lines = open(path).read().splitlines()
+        assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+        assert any("busy_loop (test_telemetry.py" in line for line in lines)
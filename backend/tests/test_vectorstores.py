@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+from app.services.vectorstores import ChromaVectorStore, Int8VectorStore, NumpyVectorStore, quantize
+
+def random_rows(n, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(n, dim)).astype(np.float32)
+    ids = [f"c{i}" for i in range(n)]
+    texts = [f"chunk {i}" for i in range(n)]
+    metadatas = [{"doc_id": f"d{i % 3}", "source": f"paper{i % 3}.pdf", "page": i} for i in range(n)]
+    return ids, texts, vectors, metadatas
+
+class TestNumpyVectorStore:
+    """Test the in-process exact vector index"""
+
+    def test_search_matches_brute_force(self, tmp_path):
+        """Test batched top-k equals exact cosine ranking"""
+        ids, texts, vectors, metadatas = random_rows(200)
+        store = NumpyVectorStore(str(tmp_path))
+        store.add(ids[:120], texts[:120], vectors[:120].tolist(), metadatas[:120])
+        store.add(ids[120:], texts[120:], vectors[120:].tolist(), metadatas[120:])
+
+        queries = np.random.default_rng(1).normal(size=(5, 16))
+        results = store.search(queries, k=7)
+
+        unit = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        for query, hits in zip(queries, results):
+            expected = np.argsort(-(unit @ (query / np.linalg.norm(query))))[:7]
+            assert [doc.id for doc, _ in hits] == [ids[i] for i in expected]
+            assert hits[0][1] >= hits[-1][1]
+
+    def test_upsert_delete_and_filters(self, tmp_path):
+        """Test replaced and deleted rows disappear and filters apply"""
+        ids, texts, vectors, metadatas = random_rows(9)
+        store = NumpyVectorStore(str(tmp_path))
+        store.add(ids, texts, vectors.tolist(), metadatas)
+        store.add(["c0"], ["chunk 0 v2"], [vectors[0].tolist()], [metadatas[0]])
+        store.delete(["c1"])
+
+        assert store.count() == 8
+        assert sorted(store.get_ids({"doc_id": "d0"})) == ["c0", "c3", "c6"]
+        assert store.get_ids({"doc_id": "d1"}) == ["c4", "c7"]
+
+        hits = store.search([vectors[0]], k=3, where={"source": ["paper0.pdf", "paper2.pdf"], "page": 0})[0]
+        assert [(doc.id, doc.page_content) for doc, _ in hits] == [("c0", "chunk 0 v2")]
+
+    def test_persistence_and_compaction(self, tmp_path):
+        """Test the index reloads from disk before and after compaction"""
+        ids, texts, vectors, metadatas = random_rows(30)
+        store = NumpyVectorStore(str(tmp_path))
+        store.add(ids, texts, vectors.tolist(), metadatas)
+        store.delete(ids[:10])
+
+        reloaded = NumpyVectorStore(str(tmp_path))
+        assert reloaded.count() == 20
+        assert isinstance(reloaded.matrix, np.memmap)
+        before = [doc.id for doc, _ in reloaded.search([vectors[15]], k=5)[0]]
+
+        reloaded.compact()
+        assert len(reloaded.ids) == 20
+        assert [doc.id for doc, _ in NumpyVectorStore(str(tmp_path)).search([vectors[15]], k=5)[0]] == before
+
+    def test_empty_index(self, tmp_path):
+        """Test searching an empty index returns no hits"""
+        assert NumpyVectorStore(str(tmp_path)).search([[1.0, 0.0]], k=3) == [[]]
+
+    def test_agrees_with_chroma(self, tmp_path):
+        """Test the exact backend returns Chroma's top hits on a small index"""
+        ids, texts, vectors, metadatas = random_rows(50)
+        numpy_store = NumpyVectorStore(str(tmp_path / "numpy"))
+        chroma_store = ChromaVectorStore(str(tmp_path / "chroma"))
+        for store in (numpy_store, chroma_store):
+            store.add(ids, texts, (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).tolist(), metadatas)
+
+        query = [vectors[7].tolist()]
+        numpy_hits = numpy_store.search(query, k=3, where={"doc_id": "d1"})[0]
+        chroma_hits = chroma_store.search(query, k=3, where={"doc_id": "d1"})[0]
+        assert [d.id for d, _ in numpy_hits] == [d.id for d, _ in chroma_hits]
+        assert numpy_hits[0][1] == pytest.approx(chroma_hits[0][1], abs=1e-4)
+
+
+class TestInt8VectorStore:
+    """Test the int8-quantized index with exact re-ranking"""
+
+    def test_quantization_error_is_small(self):
+        """Test int8 codes reconstruct vectors to within half a quantization step"""
+        _, _, vectors, _ = random_rows(20)
+        codes, scales = quantize(vectors)
+        assert codes.dtype == np.int8 and scales.dtype == np.float32
+        assert (np.abs(codes * scales[:, None] - vectors).max(axis=1) <= scales * 0.5 + 1e-6).all()
+
+    def test_rerank_matches_exact_search(self, tmp_path):
+        """Test re-ranked results and scores equal the float32 exact index"""
+        ids, texts, vectors, metadatas = random_rows(300, dim=32)
+        exact = NumpyVectorStore(str(tmp_path / "exact"))
+        quantized = Int8VectorStore(str(tmp_path / "int8"), rerank_factor=4)
+        for store in (exact, quantized):
+            store.add(ids, texts, vectors.tolist(), metadatas)
+            store.delete(["c5", "c6"])
+
+        queries = np.random.default_rng(2).normal(size=(10, 32))
+        for where in (None, {"doc_id": "d2"}):
+            for want, got in zip(exact.search(queries, k=5, where=where), quantized.search(queries, k=5, where=where)):
+                assert [d.id for d, _ in got] == [d.id for d, _ in want]
+                assert [s for _, s in got] == pytest.approx([s for _, s in want], abs=1e-5)
+
+    def test_codes_persist_and_rebuild(self, tmp_path):
+        """Test codes survive reloads and compaction, and are rebuilt for a float32-only index"""
+        ids, texts, vectors, metadatas = random_rows(40)
+        NumpyVectorStore(str(tmp_path)).add(ids[:20], texts[:20], vectors[:20].tolist(), metadatas[:20])
+
+        store = Int8VectorStore(str(tmp_path))
+        assert len(store.codes) == 20
+        store.add(ids[20:], texts[20:], vectors[20:].tolist(), metadatas[20:])
+        store.delete(ids[:10])
+        store.compact()
+
+        reloaded = Int8VectorStore(str(tmp_path))
+        assert isinstance(reloaded.codes, np.memmap) and len(reloaded.codes) == 30
+        hits = reloaded.search([vectors[25]], k=1)[0]
+        assert hits[0][0].id == "c25"
+        assert hits[0][1] == pytest.approx(1.0, abs=1e-5)
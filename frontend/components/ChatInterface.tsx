@@ -1,6 +1,6 @@
 "use client";
 
-import { queryAgent } from '@/lib/api';
+import { streamQuery } from '@/lib/api';
 import { AnimatePresence, motion } from 'framer-motion';
 import { Bot, Send, Sparkles, User } from 'lucide-react';
 import { useEffect, useRef, useState } from 'react';
@@ -34,14 +34,21 @@ export default function ChatInterface() {
         setQuery('');
         setIsLoading(true);
 
+        // Tokens are appended to the last (assistant) message as they stream in.
+        const updateReply = (update: (msg: Message) => Message) =>
+            setMessages(prev => [...prev.slice(0, -1), update(prev[prev.length - 1])]);
+
         try {
-            const data = await queryAgent(userMsg.content);
-            const botMsg: Message = {
-                role: 'assistant',
-                content: data.response,
-                agent: data.agent
-            };
-            setMessages(prev => [...prev, botMsg]);
+            await streamQuery(userMsg.content, (event, data) => {
+                if (event === 'route') {
+                    setIsLoading(false);
+                    setMessages(prev => [...prev, { role: 'assistant', content: '', agent: data.agent }]);
+                } else if (event === 'token') {
+                    updateReply(msg => ({ ...msg, content: msg.content + data }));
+                } else if (event === 'error') {
+                    updateReply(msg => ({ ...msg, content: data.answer }));
+                }
+            });
         } catch (error) {
             console.error("Query failed", error);
             setMessages(prev => [...prev, { role: 'assistant', content: "Sorry, I encountered an error processing your request." }]);
@@ -9,7 +9,13 @@ export const api = axios.create({
   },
 });
 
-export const uploadFile = async (file: File) => {
+export const getJob = async (jobId: string) => {
+  const response = await api.get(`/jobs/${jobId}`);
+  return response.data;
+};
+
+// Uploads return an ingestion job straight away; poll it until the document is indexed.
+export const uploadFile = async (file: File, onProgress?: (job: any) => void) => {
   const formData = new FormData();
   formData.append('file', file);
   const response = await api.post('/upload', formData, {
@@ -17,10 +23,47 @@ export const uploadFile = async (file: File) => {
       'Content-Type': 'multipart/form-data',
     },
   });
-  return response.data;
+  let job = response.data;
+  while (job.status === 'queued' || job.status === 'running') {
+    onProgress?.(job);
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+    job = await getJob(job.job_id);
+  }
+  if (job.status === 'failed') {
+    throw new Error(job.error || 'Ingestion failed');
+  }
+  return job.result;
 };
 
 export const queryAgent = async (query: string) => {
   const response = await api.post('/query', { query });
   return response.data;
 };
+
+// Streams the answer from the SSE endpoint; onEvent gets route, sources, token and done/error events.
+export const streamQuery = async (query: string, onEvent: (event: string, data: any) => void) => {
+  const response = await fetch(`${API_URL}/query/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ query }),
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Query failed with status ${response.status}`);
+  }
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let end;
+    while ((end = buffer.indexOf('\n\n')) !== -1) {
+      const block = buffer.slice(0, end);
+      buffer = buffer.slice(end + 2);
+      const event = block.match(/^event: (.*)$/m)?.[1] ?? 'message';
+      const data = block.match(/^data: (.*)$/m)?.[1];
+      onEvent(event, data ? JSON.parse(data) : null);
+    }
+  }
+};